@@ -0,0 +1,94 @@
+"""Measures the throughput of requests authenticated by an API key.
+
+Serves a minimal APIKeyProtectedHandler, so that the authentication dominates
+the cost of a request, and fires concurrent requests at it, with and without
+the cache of verified API keys.
+
+  python -m benchmarks.api_key_auth --requests=2000 --concurrency=20
+"""
+import tornado.httpclient
+import tornado.httpserver
+import tornado.ioloop
+import tornado.netutil
+import tornado.web
+from absl import app
+from absl import flags
+from absl import logging
+from sqlalchemy import create_engine
+
+from benchmarks import load
+from icubam import config
+from icubam.db import store
+from icubam.www.handlers import base
+
+flags.DEFINE_string("config", "resources/test.toml", "Config file.")
+flags.DEFINE_integer("requests", 1000, "Number of requests per run.")
+flags.DEFINE_integer("concurrency", 10, "Number of concurrent requests.")
+flags.DEFINE_integer("regions", 10, "Number of regions of the client.")
+FLAGS = flags.FLAGS
+
+
+class WhoAmIHandler(base.APIKeyProtectedHandler):
+  ROUTE = '/whoami'
+  ACCESS = [store.AccessTypes.MAP, store.AccessTypes.ALL]
+
+  @tornado.web.authenticated
+  def get(self):
+    self.write({'name': self.current_user.name, 'regions': self.region_ids})
+
+
+def make_factory(cache_ttl):
+  factory = store.StoreFactory(
+    create_engine("sqlite:///:memory:"), client_cache_ttl=cache_ttl
+  )
+  db = factory.create()
+  admin_id = db.add_default_admin()
+  client_id, access_key = db.add_external_client(
+    admin_id,
+    store.ExternalClient(name='bench', access_type=store.AccessTypes.ALL)
+  )
+  for i in range(FLAGS.regions):
+    region_id = db.add_region(admin_id, store.Region(name=f'region{i}'))
+    db.assign_external_client_to_region(admin_id, client_id, region_id)
+  return factory, access_key.key
+
+
+async def run(cfg, cache_ttl):
+  factory, key = make_factory(cache_ttl)
+  application = tornado.web.Application([(
+    WhoAmIHandler.ROUTE, WhoAmIHandler, {
+      'config': cfg,
+      'db_factory': factory
+    }
+  )])
+  sockets = tornado.netutil.bind_sockets(0, '127.0.0.1')
+  port = sockets[0].getsockname()[1]
+  server = tornado.httpserver.HTTPServer(application)
+  server.add_sockets(sockets)
+
+  url = f'http://127.0.0.1:{port}{WhoAmIHandler.ROUTE}?API_KEY={key}'
+  requests = [
+    tornado.httpclient.HTTPRequest(url) for _ in range(FLAGS.requests)
+  ]
+  result = await load.run(requests, FLAGS.concurrency)
+  server.stop()
+  result['cache_ttl'] = cache_ttl
+  result['cache_hit_ratio'] = factory.client_cache.hit_ratio
+  return result
+
+
+def main(unused_argv):
+  logging.set_verbosity(logging.WARNING)
+  cfg = config.Config(FLAGS.config)
+  io_loop = tornado.ioloop.IOLoop.current()
+  for cache_ttl in [0, store.StoreFactory.CLIENT_CACHE_TTL]:
+    result = io_loop.run_sync(lambda: run(cfg, cache_ttl))
+    print(
+      'cache_ttl={cache_ttl}: {requests_per_sec:.1f} req/s, '
+      'p50={p50_ms:.2f}ms, p99={p99_ms:.2f}ms, '
+      'hit ratio={cache_hit_ratio:.2f}'.format(**result)
+    )
+
+
+if __name__ == '__main__':
+  app.run(main)
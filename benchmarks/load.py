@@ -0,0 +1,63 @@
+"""A local asynchronous HTTP load generator, shared by the benchmarks."""
+import time
+from typing import Dict, List, Sequence
+
+import tornado.gen
+import tornado.httpclient
+
+
+def percentile(latencies: Sequence[float], q: float) -> float:
+  """Returns the q-th percentile of the sorted latencies, by nearest rank."""
+  if not latencies:
+    return 0.0
+  return latencies[min(int(len(latencies) * q / 100), len(latencies) - 1)]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict:
+  """Returns the throughput and the latency percentiles, in milliseconds."""
+  latencies = sorted(latencies)
+  return {
+    'requests': len(latencies),
+    'errors': errors,
+    'requests_per_sec': len(latencies) / elapsed if elapsed > 0 else 0.0,
+    'p50_ms': 1000 * percentile(latencies, 50),
+    'p90_ms': 1000 * percentile(latencies, 90),
+    'p99_ms': 1000 * percentile(latencies, 99),
+    'max_ms': 1000 * latencies[-1] if latencies else 0.0,
+  }
+
+
+async def run(
+  requests: Sequence[tornado.httpclient.HTTPRequest],
+  concurrency: int = 10
+) -> Dict:
+  """Fires the requests from `concurrency` concurrent clients.
+
+  Redirections are not followed, and any response with a code of 400 or more
+  (or a connection error) is counted as an error.
+
+  Returns:
+   The summary of the run, see summarize.
+  """
+  client = tornado.httpclient.AsyncHTTPClient(
+    force_instance=True, max_clients=concurrency
+  )
+  remaining = list(reversed(requests))
+  latencies = []
+  errors = 0
+
+  async def worker():
+    nonlocal errors
+    while remaining:
+      request = remaining.pop()
+      request.follow_redirects = False
+      start = time.perf_counter()
+      response = await client.fetch(request, raise_error=False)
+      latencies.append(time.perf_counter() - start)
+      errors += response.code >= 400
+
+  start = time.perf_counter()
+  await tornado.gen.multi([worker() for _ in range(concurrency)])
+  elapsed = time.perf_counter() - start
+  client.close()
+  return summarize(latencies, errors, elapsed)
@@ -0,0 +1,56 @@
+"""Compares the rendering of messages by the templates and by the formatter.
+
+  python -m benchmarks.message_formatter --messages=50000
+"""
+import time
+
+import tornado.locale
+from absl import app
+from absl import flags
+
+from icubam.messaging import message
+from icubam.messaging import message_formatter
+
+flags.DEFINE_integer("messages", 50000, "Number of messages to format.")
+FLAGS = flags.FLAGS
+
+
+class FakeObject:
+  def __init__(self, **kwargs):
+    self.__dict__.update(kwargs)
+
+
+def make_messages(num_messages):
+  result = []
+  for i in range(num_messages):
+    icu = FakeObject(icu_id=i % 100, name=f'ICU {i % 100}')
+    user = FakeObject(user_id=i, name=f'User {i}', telephone=f'{i}')
+    result.append(message.Message(icu, user, url=f'http://icubam/{i}'))
+  return result
+
+
+def format_with_templates(formatter, msgs):
+  for msg in msgs:
+    locale = tornado.locale.get(msg.locale_code)
+    html = formatter.html_template.generate(msg=msg, _=locale.translate)
+    msg.html = html.decode()
+    text = formatter.text_template.generate(msg=msg, _=locale.translate)
+    msg.text = text.decode()
+
+
+def main(unused_argv):
+  formatter = message_formatter.MessageFormatter()
+  msgs = make_messages(FLAGS.messages)
+  for name, fn in [('templates', format_with_templates),
+                   ('format_many', type(formatter).format_many)]:
+    start = time.perf_counter()
+    fn(formatter, msgs)
+    elapsed = time.perf_counter() - start
+    print(
+      f'{name}: {len(msgs)} messages in {elapsed:.2f}s '
+      f'({len(msgs) / elapsed:.0f} msgs/s)'
+    )
+
+
+if __name__ == '__main__':
+  app.run(main)
@@ -0,0 +1,130 @@
+"""Measures the throughput of the Sender with slow fake channels.
+
+The fake senders sleep to simulate the latency of the SMS providers, of the
+SMTP server and of the Telegram API. Users are spread over the three channels.
+With --smtp, emails are sent to a local SMTP server instead.
+
+  python -m benchmarks.sender --messages=300 --latency=0.05
+"""
+import time
+
+import tornado.gen
+import tornado.ioloop
+import tornado.queues
+from absl import app
+from absl import flags
+from absl import logging
+from sqlalchemy import create_engine
+
+from icubam import config
+from icubam.db import store
+from icubam.messaging import email_sender
+from icubam.messaging import message
+from icubam.messaging import mock_smtp
+from icubam.messaging import sender
+
+flags.DEFINE_string("config", "resources/test.toml", "Config file.")
+flags.DEFINE_integer("messages", 300, "Number of messages to send.")
+flags.DEFINE_float("latency", 0.05, "Latency of a sending, in seconds.")
+flags.DEFINE_integer(
+  "workers", None, "Number of workers per channel, defaults to the config."
+)
+flags.DEFINE_bool("smtp", False, "Sends the emails to a local SMTP server.")
+FLAGS = flags.FLAGS
+
+
+class SlowSender(email_sender.EmailSender):
+  """Blocking fake SMS or email sender."""
+  def __init__(self, latency):
+    self.latency = latency
+    self.count = 0
+
+  def send(self, *args):
+    time.sleep(self.latency)
+    self.count += 1
+
+
+class CountingSMTPEmailSender(email_sender.SMTPEmailSender):
+  def __init__(self, config):
+    super().__init__(config)
+    self.count = 0
+
+  def _sendmail(self, *args):
+    super()._sendmail(*args)
+    self.count += 1
+
+
+class SlowBot:
+  """Asynchronous fake Telegram bot."""
+  def __init__(self, latency):
+    self.latency = latency
+    self.count = 0
+
+  async def send(self, chat_id, text):
+    await tornado.gen.sleep(self.latency)
+    self.count += 1
+    return True
+
+
+def make_messages(db, num_messages):
+  admin_id = db.add_default_admin()
+  icu_id = db.add_icu(admin_id, store.ICU(name='icu'))
+  icu = db.get_icu(icu_id)
+  result = []
+  for i in range(num_messages):
+    user = store.User(name=f'user{i}', telephone=f'{i}')
+    if i % 3 == 1:
+      user.email = f'user{i}@example.com'
+    elif i % 3 == 2:
+      user.telegram_chat_id = f'{i}'
+    user_id = db.add_user_to_icu(admin_id, icu_id, user)
+    result.append(message.Message(icu, db.get_user(user_id), url='url'))
+  return result
+
+
+async def run(cfg):
+  db = store.StoreFactory(create_engine("sqlite:///:memory:")).create()
+  msgs = make_messages(db, FLAGS.messages)
+  queue = tornado.queues.Queue()
+  if FLAGS.workers is not None:
+    for channel in sender.Sender.CHANNELS:
+      cfg.messaging[f'{channel}_workers'] = FLAGS.workers
+  msg_sender = sender.Sender(cfg, db, queue)
+  msg_sender.sms_sender = SlowSender(FLAGS.latency)
+  if FLAGS.smtp:
+    smtp_server = mock_smtp.MockSMTPServer().start()
+    cfg.env['SMTP_HOST'] = smtp_server.host
+    cfg.env['EMAIL_FROM'] = cfg.EMAIL_FROM or 'icubam@localhost'
+    cfg.email.use_ssl = False
+    msg_sender.email_sender = CountingSMTPEmailSender(cfg)
+  else:
+    msg_sender.email_sender = SlowSender(FLAGS.latency)
+  msg_sender.telegram_bot = SlowBot(FLAGS.latency)
+
+  tornado.ioloop.IOLoop.current().spawn_callback(msg_sender.process)
+  start = time.perf_counter()
+  for msg in msgs:
+    await queue.put(msg)
+  await msg_sender.join()
+  elapsed = time.perf_counter() - start
+  sent = (
+    msg_sender.sms_sender.count + msg_sender.email_sender.count +
+    msg_sender.telegram_bot.count
+  )
+  return sent, elapsed, msg_sender.workers
+
+
+def main(unused_argv):
+  logging.set_verbosity(logging.ERROR)
+  cfg = config.Config(FLAGS.config)
+  sent, elapsed, workers = tornado.ioloop.IOLoop.current(
+  ).run_sync(lambda: run(cfg))
+  print(
+    f'{sent} messages in {elapsed:.2f}s: {sent / elapsed:.1f} msgs/s '
+    f'(latency={FLAGS.latency}s, workers={workers}, '
+    f'sequential bound={1 / FLAGS.latency:.1f} msgs/s)'
+  )
+
+
+if __name__ == '__main__':
+  app.run(main)
@@ -0,0 +1,291 @@
+"""Load tests the www, analytics, backoffice and messaging servers.
+
+Generates a national-scale database (see db.fake.populate_store_national),
+serves each server in process on a local port, fires concurrent requests at
+its main routes and reports the throughput and latency percentiles of each
+scenario as JSON. A generated database is kept with --db, to be reused by
+later runs, and a previous report given by --baseline is compared against:
+the run fails if the p50 latency of a scenario regressed beyond --tolerance.
+
+  python -m benchmarks.servers --regions=13 --days=30 --output=bench.json
+"""
+import json
+import os.path
+import random
+import sys
+import tempfile
+from typing import Dict, List
+from urllib.parse import urlencode
+
+import tornado.escape
+import tornado.httpclient
+import tornado.httpserver
+import tornado.ioloop
+import tornado.netutil
+import tornado.web
+from absl import app
+from absl import flags
+from absl import logging
+
+from benchmarks import load
+from icubam import config
+from icubam.analytics import dataset
+from icubam.analytics import server as analytics_server
+from icubam.backoffice import server as backoffice_server
+from icubam.backoffice.handlers import base as backoffice_base
+from icubam.backoffice.handlers import bedcounts, icus, regions, tokens, users
+from icubam.db import fake
+from icubam.db import store
+from icubam.messaging import server as messaging_server
+from icubam.messaging.handlers import onoff, schedule
+from icubam.www import server as www_server
+from icubam.www import token
+from icubam.www.handlers import base as www_base
+from icubam.www.handlers import home, update
+
+SERVERS = ('www', 'analytics', 'backoffice', 'messaging')
+SECRET = 'benchmark'
+
+flags.DEFINE_string("config", "resources/test.toml", "Config file.")
+flags.DEFINE_string(
+  "db", None, "SQLite database, generated if empty. Defaults to a temp file."
+)
+flags.DEFINE_list("servers", list(SERVERS), "Servers to load test.")
+flags.DEFINE_integer("regions", 13, "Number of regions.")
+flags.DEFINE_integer("icus_per_region", 20, "Number of ICUs per region.")
+flags.DEFINE_integer("users_per_icu", 2, "Number of users per ICU.")
+flags.DEFINE_integer("days", 30, "Number of days of bed counts.")
+flags.DEFINE_integer("counts_per_day", 2, "Number of bed counts per day.")
+flags.DEFINE_integer("seed", 0, "Seed of the generated data and requests.")
+flags.DEFINE_integer("requests", 200, "Number of requests per scenario.")
+flags.DEFINE_integer("concurrency", 10, "Number of concurrent requests.")
+flags.DEFINE_string("output", None, "JSON file to write the report to.")
+flags.DEFINE_string("baseline", None, "JSON report to compare against.")
+flags.DEFINE_float(
+  "tolerance", 0.2, "Accepted relative increase of the p50 latencies."
+)
+FLAGS = flags.FLAGS
+
+
+def cookie(name: str, value) -> Dict[str, str]:
+  signed = tornado.web.create_signed_value(SECRET, name, value).decode()
+  return {'Cookie': f'{name}={signed}'}
+
+
+class Bench:
+  """Builds the requests of the scenarios of each server against a database.
+  """
+  def __init__(self, cfg, db):
+    self.config = cfg
+    self.db = db
+    self.rng = random.Random(FLAGS.seed)
+    self.admin_id = next(iter(db.get_admins())).user_id
+    self.user_icus = [(user, icu)
+                      for user in db.get_users()
+                      for icu in user.icus]
+    _, access_key = db.add_external_client(
+      self.admin_id,
+      store.ExternalClient(name='bench', access_type=store.AccessTypes.ALL)
+    )
+    self.api_key = access_key.key
+    self.encoder = token.TokenEncoder(cfg)
+
+  def requests(self, url, count=None, **kwargs):
+    count = FLAGS.requests if count is None else count
+    return [
+      tornado.httpclient.HTTPRequest(url, **kwargs) for _ in range(count)
+    ]
+
+  def random_tokens(self) -> List[str]:
+    return [
+      self.encoder.encode_data(*self.rng.choice(self.user_icus))
+      for _ in range(FLAGS.requests)
+    ]
+
+  def www(self, base_url):
+    jwts = self.random_tokens()
+    form = urlencode({
+      'n_covid_occ': 3,
+      'n_covid_free': 5,
+      'n_covid_deaths': 1
+    })
+    update_counts = [
+      tornado.httpclient.HTTPRequest(
+        base_url + update.UpdateBedCountsHandler.ROUTE,
+        method='POST',
+        body=form,
+        headers=cookie(www_base.BaseHandler.COOKIE, jwt)
+      ) for jwt in jwts
+    ]
+    headers = cookie(www_base.BaseHandler.COOKIE, jwts[0])
+    return {
+      'www/update': [
+        tornado.httpclient.
+        HTTPRequest(f'{base_url}{update.UpdateHandler.ROUTE}?id={jwt}')
+        for jwt in jwts
+      ],
+      'www/update_counts':
+      update_counts,
+      'www/home':
+      self.requests(base_url + home.HomeHandler.ROUTE, headers=headers),
+      'www/map_data':
+      self.requests(base_url + home.MapDataHandler.ROUTE, headers=headers),
+    }
+
+  def analytics(self, base_url):
+    return {
+      f'analytics/db/{collection}': self.requests(
+        f'{base_url}/db/{collection}?format=csv&API_KEY={self.api_key}'
+      )
+      for collection in dataset.Dataset.COLLECTIONS
+    }
+
+  def backoffice(self, base_url):
+    handlers = [
+      users.ListUsersDataHandler,
+      icus.ListICUsDataHandler,
+      regions.ListRegionsDataHandler,
+      tokens.ListTokensDataHandler,
+      bedcounts.ListBedCountsDataHandler,
+    ]
+    args = urlencode({
+      'draw': 1,
+      'start': 0,
+      'length': 25,
+      'order[0][column]': 0
+    })
+    root = f'{base_url}/{self.config.backoffice.root}/'
+    headers = cookie(
+      backoffice_base.BaseHandler.COOKIE,
+      tornado.escape.json_encode(self.admin_id)
+    )
+    return {
+      f'backoffice/{handler.ROUTE}':
+      self.requests(f'{root}{handler.ROUTE}?{args}', headers=headers)
+      for handler in handlers
+    }
+
+  def messaging(self, base_url):
+    # Each bulk request turns on the messages of the users of a few ICUs.
+    bulks = []
+    for _ in range(FLAGS.requests):
+      pairs = [self.rng.choice(self.user_icus) for _ in range(10)]
+      bulk = onoff.BulkOnOffRequest([
+        onoff.OnOffRequest(user.user_id, [icu.icu_id]) for user, icu in pairs
+      ])
+      bulks.append(bulk.to_json())
+    page = schedule.ScheduleRequest(self.admin_id, limit=25).to_json()
+    return {
+      'messaging/onoff_bulk': [
+        tornado.httpclient.HTTPRequest(
+          base_url + onoff.BulkOnOffHandler.ROUTE, method='POST', body=body
+        ) for body in bulks
+      ],
+      'messaging/schedule':
+      self.requests(
+        base_url + schedule.ScheduleHandler.ROUTE, method='POST', body=page
+      ),
+    }
+
+
+def make_server(cfg, name):
+  """Returns the server and its application."""
+  if name == 'www':
+    server = www_server.WWWServer(cfg, port=0, workers=1)
+    return server, server.make_app(cookie_secret=SECRET)
+  if name == 'backoffice':
+    server = backoffice_server.BackOfficeServer(cfg, port=0)
+    return server, server.make_app(cookie_secret=SECRET)
+  if name == 'analytics':
+    server = analytics_server.AnalyticsServer(cfg, port=0)
+  else:
+    server = messaging_server.MessageServer(cfg, port=0)
+  return server, server.make_app()
+
+
+async def run_server(cfg, bench, name) -> Dict[str, Dict]:
+  server, application = make_server(cfg, name)
+  if name == 'www':
+    # Writes the bed counts received by /update_counts.
+    for callback in server.callbacks:
+      tornado.ioloop.IOLoop.current().spawn_callback(callback)
+  sockets = tornado.netutil.bind_sockets(0, '127.0.0.1')
+  port = sockets[0].getsockname()[1]
+  http_server = tornado.httpserver.HTTPServer(application)
+  http_server.add_sockets(sockets)
+
+  results = {}
+  scenarios = getattr(bench, name)(f'http://127.0.0.1:{port}')
+  for scenario, requests in scenarios.items():
+    results[scenario] = await load.run(requests, FLAGS.concurrency)
+    logging.info(f'{scenario}: {results[scenario]}')
+  http_server.stop()
+  return results
+
+
+def regressions(results, baseline, tolerance) -> List[str]:
+  """Returns the scenarios whose p50 latency regressed beyond tolerance."""
+  regressed = []
+  for scenario, result in results.items():
+    reference = baseline.get(scenario, None)
+    if reference is None:
+      continue
+    if result['p50_ms'] > reference['p50_ms'] * (1 + tolerance):
+      regressed.append(scenario)
+  return regressed
+
+
+def main(unused_argv):
+  logging.set_verbosity(logging.WARNING)
+  cfg = config.Config(FLAGS.config)
+  cfg.env['JWT_SECRET'] = cfg.JWT_SECRET or SECRET
+  folder = tempfile.TemporaryDirectory()
+  cfg.db.sqlite_path = FLAGS.db or os.path.join(folder.name, 'bench.db')
+  db = store.create_store_factory_for_sqlite_db(cfg).create()
+  if not db.get_icus():
+    fake.populate_store_national(
+      db,
+      num_regions=FLAGS.regions,
+      icus_per_region=FLAGS.icus_per_region,
+      users_per_icu=FLAGS.users_per_icu,
+      days=FLAGS.days,
+      counts_per_day=FLAGS.counts_per_day,
+      seed=FLAGS.seed
+    )
+  bench = Bench(cfg, db)
+
+  results = {}
+  io_loop = tornado.ioloop.IOLoop.current()
+  for name in FLAGS.servers:
+    if name not in SERVERS:
+      raise ValueError(f'Unknown server {name}, expected one of {SERVERS}')
+    results.update(io_loop.run_sync(lambda: run_server(cfg, bench, name)))
+
+  report = {
+    'params': {
+      key: getattr(FLAGS, key)
+      for key in [
+        'regions', 'icus_per_region', 'users_per_icu', 'days',
+        'counts_per_day', 'seed', 'requests', 'concurrency'
+      ]
+    },
+    'results': results,
+  }
+  output = json.dumps(report, indent=2)
+  print(output)
+  if FLAGS.output is not None:
+    with open(FLAGS.output, 'w') as fp:
+      fp.write(output)
+  folder.cleanup()
+
+  if FLAGS.baseline is not None:
+    with open(FLAGS.baseline) as fp:
+      baseline = json.load(fp)['results']
+    regressed = regressions(results, baseline, FLAGS.tolerance)
+    if regressed:
+      logging.error(f'Regressed scenarios: {", ".join(regressed)}')
+      sys.exit(1)
+
+
+if __name__ == '__main__':
+  app.run(main)
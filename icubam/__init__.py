@@ -1,8 +1,17 @@
-# pkg_resources is installed with setuptools
-from pkg_resources import get_distribution, DistributionNotFound
+try:
+  from importlib.metadata import PackageNotFoundError, version
+except ImportError:
+  # Python < 3.8: pkg_resources is installed with setuptools, but is slow to
+  # import.
+  from pkg_resources import DistributionNotFound as PackageNotFoundError
+  from pkg_resources import get_distribution
+
+  def version(name):
+    return get_distribution(name).version
+
 
 try:
-  __version__ = get_distribution(__name__).version
-except DistributionNotFound:
+  __version__ = version(__name__)
+except PackageNotFoundError:
   # package is not installed
   pass
@@ -3,9 +3,12 @@ import functools
 import inspect
 import time
 from pathlib import Path
+from typing import List
 
+import pandas as pd
 from absl import logging  # noqa: F401
 
+from icubam import time_utils
 from icubam.analytics import preprocessing
 from icubam.db import store
 
@@ -28,6 +31,10 @@ ALL_COLUMNS = ([
   "icu_name", "date", "datetime", "department", "region_id", "region",
   "create_date"
 ] + CUM_COLUMNS + NCUM_COLUMNS)
+ROLLUP_KEYS = ["date", "region_id", "region", "department"]
+# The filters of the preprocessing are centered: a new bed count changes the
+# days before it, which are computed again from as much before them.
+ROLLUP_CONTEXT = datetime.timedelta(days=7)
 
 
 def cached(func):
@@ -65,19 +72,48 @@ def cached(func):
   return wrapper
 
 
+def make_rollups(bedcounts) -> List[store.DailyRollup]:
+  """Sums the preprocessed bed counts per date, region and department."""
+  sums = bedcounts.groupby(["date", "region_id", "department"],
+                           dropna=False)[BEDCOUNT_COLUMNS].sum()
+  result = []
+  for (date, region_id, dept), row in sums.iterrows():
+    result.append(
+      store.DailyRollup(
+        date=date,
+        region_id=None if pd.isna(region_id) else int(region_id),
+        dept=None if pd.isna(dept) else dept,
+        **{col: float(row[col])
+           for col in BEDCOUNT_COLUMNS}
+      )
+    )
+  return result
+
+
+def to_frame(bed_counts):
+  """Returns the bed counts as a dataframe, without their relationships."""
+  result = store.to_pandas(bed_counts, max_depth=2)
+  to_drop = set(result.columns
+                ).intersection(['icu_bed_counts', 'icu_users', 'icu_managers'])
+  return result.drop(columns=to_drop)
+
+
 class Dataset:
-  """A class to manipulate the bedcounts data. With caching support."""
-  COLLECTIONS = ['icus', 'regions', 'bedcounts', 'all_bedcounts']
+  """A class to manipulate the bedcounts data. With caching support.
+
+  The daily rollups of the bed counts are read and updated with the writer
+  store, if any, since they are written there.
+  """
+  COLLECTIONS = ['icus', 'regions', 'bedcounts', 'all_bedcounts', 'rollups']
 
-  def __init__(self, db, ttl: int = 0):
+  def __init__(self, db, ttl: int = 0, writer=None):
     self.db = db
     self.ttl = ttl
+    self.writer = writer
 
   @cached
   def get_bedcounts(self, max_ts=None, latest=False, preprocess=True):
-    if isinstance(max_ts, str) and max_ts.isnumeric():
-      max_ts = datetime.datetime.fromtimestamp(int(max_ts))
-
+    max_ts = time_utils.parse_ts(max_ts)
     result = None
     if latest:
       result = self.db.get_visible_bed_counts_for_user(
@@ -86,22 +122,91 @@ class Dataset:
     else:
       result = self.db.get_bed_counts(max_date=max_ts)
 
-    result = store.to_pandas(result, max_depth=2)
+    result = to_frame(result)
     if result.shape[0] == 0:
       return result
 
-    to_drop = set(result.columns).intersection([
-      'icu_bed_counts', 'icu_users', 'icu_managers'
-    ])
-    result = result.drop(columns=to_drop)
     if preprocess:
       result = preprocessing.preprocess_bedcounts(result)
 
     result = result.sort_values(by=["create_date", "icu_name"])
     return result
 
+  def update_rollups(self) -> int:
+    """Updates the daily rollups with the bed counts added since last time.
+
+    Only the dates from ROLLUP_CONTEXT before the oldest new bed count on are
+    computed again. The bed counts are preprocessed from ROLLUP_CONTEXT before
+    those dates, along with the previous bed count of each ICU, which the
+    missing days are filled from, and the maxima of the cumulative counts of
+    the earlier history, which they cannot go below. Those maxima are derived
+    from a light read of the counts only.
+
+    Returns:
+      The number of rollups inserted, updated or deleted.
+    """
+    start = time.time()
+    last_rowid = self.writer.get_rollups_rowid()
+    oldest, max_rowid = self.writer.get_bed_counts_after(last_rowid)
+    if max_rowid is None:
+      return 0
+
+    since, cum_floor = None, None
+    if last_rowid:
+      since = oldest.date() - ROLLUP_CONTEXT
+      min_date = datetime.datetime.combine(
+        since - ROLLUP_CONTEXT, datetime.time()
+      )
+      bed_counts = self.writer.get_latest_bed_counts(max_date=min_date)
+      bed_counts += self.writer.get_bed_counts(min_date=min_date)
+      columns, rows = self.writer.get_bed_count_rows(
+        max_date=datetime.datetime.combine(since, datetime.time())
+      )
+      if rows:
+        cum_floor = preprocessing.cumulative_maxima(
+          pd.DataFrame.from_records(rows, columns=columns), min_date
+        )
+    else:
+      bed_counts = self.writer.get_bed_counts()
+
+    rollups = []
+    df = to_frame(bed_counts)
+    if df.shape[0] > 0:
+      df = preprocessing.preprocess_bedcounts(df, cum_floor=cum_floor)
+      if since is not None:
+        df = df[df['date'] >= since]
+      rollups = make_rollups(df)
+    count = self.writer.update_daily_rollups(rollups, max_rowid)
+    logging.info(
+      f'{count} daily rollups updated since {since} in '
+      f'{time.time() - start:.2f}s'
+    )
+    return count
+
+  def get_rollups(self, max_ts=None):
+    """Returns the daily rollups, shaped as the preprocessed bed counts."""
+    max_ts = time_utils.parse_ts(max_ts)
+    db = self.writer if self.writer is not None else self.db
+    rows = []
+    for rollup in db.get_daily_rollups():
+      row = {col: getattr(rollup, col) for col in BEDCOUNT_COLUMNS}
+      row.update(
+        date=rollup.date,
+        region_id=rollup.region_id,
+        region=rollup.region.name if rollup.region is not None else None,
+        department=rollup.dept
+      )
+      rows.append(row)
+    result = pd.DataFrame(rows, columns=ROLLUP_KEYS + BEDCOUNT_COLUMNS)
+    if max_ts is not None:
+      result = result[result['date'] <= max_ts.date()]
+    return result
+
   def get(self, collection='bedcounts', max_ts=None, preprocess=None):
     """Returns the proper pandas dataframe."""
+    if collection == 'rollups':
+      return self.get_rollups(max_ts)
+
     if collection in ['bedcounts', 'all_bedcounts']:
       latest = collection == 'bedcounts'
       preprocess = not latest if preprocess is None else preprocess
@@ -1,8 +1,6 @@
 import pathlib
 from absl import logging  # noqa: F401
 
-from icubam.analytics import plots
-
 
 class PlotGenerator:
   """Generates all the plots periodically."""
@@ -31,7 +29,15 @@ class PlotGenerator:
     return self.frequency is not None and self.folder is not None
 
   async def run(self, names=None):
-    df = self.dataset.get_bedcounts(latest=False)
+    # matplotlib, seaborn and scipy are only loaded to generate the plots.
+    from icubam.analytics import plots
+
+    # The plots only need the daily rollups, which are updated incrementally.
+    if self.dataset.writer is not None:
+      self.dataset.update_rollups()
+      df = self.dataset.get('rollups')
+    else:
+      df = self.dataset.get_bedcounts(latest=False)
     logging.info('[periodic callback] Starting plots generation with predicu')
     plots.generate_plots(
       plots=self.DEFAULT if names is None else names,
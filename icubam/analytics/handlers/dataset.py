@@ -4,7 +4,8 @@ import os
 
 from absl import logging  # noqa: F401
 import tornado.web
-from icubam.db import store, synchronizer
+from icubam import time_utils
+from icubam.db import store
 from icubam.www.handlers import base
 
 
@@ -27,6 +28,12 @@ class DatasetHandler(base.APIKeyProtectedHandler):
   def get(self, collection):
     file_format = self.get_query_argument('format', default=None)
     max_ts = self.get_query_argument('max_ts', default=None)
+    try:
+      max_ts = time_utils.parse_ts(max_ts)
+    except ValueError:
+      logging.info(f"API called with an invalid max_ts: {max_ts}.")
+      self.set_status(400)
+      return
     df = self.dataset.get(collection, max_ts)
     if df is None:
       logging.info("API called with incorrect endpoint: {collection}.")
@@ -52,6 +59,9 @@ class DatasetHandler(base.APIKeyProtectedHandler):
 
     # Send to the correct endpoint:
     if collection == 'bedcounts':
+      # Loads pandas on the first upload only.
+      from icubam.db import synchronizer
+
       csvp = synchronizer.CSVPreprocessor(self.db)
 
       # Get the file object and format request:
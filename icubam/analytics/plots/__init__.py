@@ -12,6 +12,7 @@ import pandas as pd
 import scipy
 import seaborn
 
+from icubam import metrics
 from icubam.analytics import dataset
 from icubam.analytics.image_url_mapper import ImageURLMapper
 
@@ -168,13 +169,14 @@ def generate_plots(
     )
   for name in sorted(plots):
     logging.info("generating plot %s in %s" % (name, output_dir))
-    plot(
-      plot_name=name,
-      plot_data=data,
-      output_type=output_type,
-      output_dir=output_dir,
-      figsize=(10, 6)
-    )
+    with metrics.PLOT_SECONDS.time(plot=name):
+      plot(
+        plot_name=name,
+        plot_data=data,
+        output_type=output_type,
+        output_dir=output_dir,
+        figsize=(10, 6)
+      )
 
 
 def plot_each_region(data, gen_plot, fig_name, **kwargs):
@@ -188,7 +190,7 @@ def plot_each_region(data, gen_plot, fig_name, **kwargs):
   data = data.fillna(0)
 
   if kwargs.get('days_ago', None):
-    data = data[data['create_date'] >=
+    data = data[data['date'] >=
                 (datetime.now() -
                  pd.Timedelta(f"{kwargs['days_ago']}D")).date()]
 
@@ -27,6 +27,7 @@ def preprocess_bedcounts(
   d: pd.DataFrame,
   spread_cum_jump_correction: bool = False,
   max_date: bool = None,
+  cum_floor: pd.DataFrame = None,
 ) -> pd.DataFrame:
   """This will process the bedcounts data to make analysis easier.
 
@@ -50,25 +51,16 @@ def preprocess_bedcounts(
   Args:
     spread_cum_jump_correction : Whether to apply step 4) to the data.
     max_date : Only return data up to this date.
+    cum_floor : The cumulative counts the ones of each ICU cannot go below in
+      step 3), indexed by icu_name, e.g. the maxima of an earlier history
+      (see cumulative_maxima).
   """
-  # Extract useful columns and recast date properly:
-  d = format_data(d)
-  d = d.fillna(0)
-
-  if "Mulhouse-Chir" in d.icu_name.unique():
-    d.loc[d.icu_name == "Mulhouse-Chir", "n_covid_healed"] = np.clip(
-      (
-        d.loc[d.icu_name == "Mulhouse-Chir", "n_covid_healed"] -
-        d.loc[d.icu_name == "Mulhouse-Chir", "n_covid_transfered"]
-      ).values,
-      a_min=0,
-      a_max=None,
-    )
+  d = clean_data(d)
   icu_to_first_input_date = dict(
     d.groupby("icu_name")[["date"]].min().itertuples(name=None)
   )
   # Apply steps 1) 2) & 3)
-  d = aggregate_multiple_inputs(d, "15Min")
+  d = aggregate_multiple_inputs(d, "15Min", cum_floor)
   # Step 3)
   d = fill_in_missing_days(d, "3D")
   d = enforce_daily_values_for_all_icus(d)
@@ -84,11 +76,41 @@ def preprocess_bedcounts(
   return d
 
 
-def aggregate_multiple_inputs(d, agg_time_delta="15Min"):
+def clean_data(d: pd.DataFrame) -> pd.DataFrame:
+  """Extracts the useful columns, recasts the dates and fixes known errors."""
+  d = format_data(d)
+  d = d.fillna(0)
+
+  if "Mulhouse-Chir" in d.icu_name.unique():
+    d.loc[d.icu_name == "Mulhouse-Chir", "n_covid_healed"] = np.clip(
+      (
+        d.loc[d.icu_name == "Mulhouse-Chir", "n_covid_healed"] -
+        d.loc[d.icu_name == "Mulhouse-Chir", "n_covid_transfered"]
+      ).values,
+      a_min=0,
+      a_max=None,
+    )
+  return d
+
+
+def cumulative_maxima(d: pd.DataFrame, max_date) -> pd.DataFrame:
+  """Returns the maxima of the cumulative counts of each ICU before max_date.
+
+  They are the ones preprocess_bedcounts carries forward from that history,
+  after the low-pass filters, indexed by icu_name. The bed counts up to some
+  time after max_date should be given, as the filters are centered.
+  """
+  d = aggregate_multiple_inputs(clean_data(d), "15Min")
+  d = d[d["datetime"] < pd.to_datetime(max_date)]
+  return d.groupby("icu_name")[dataset.CUM_COLUMNS].max()
+
+
+def aggregate_multiple_inputs(d, agg_time_delta="15Min", cum_floor=None):
   """Aggregate the timeseries into time bins.
 
   This will aggregate the timeseries into regular time intervals, and use the
-  most recent update prior to time t to populate the bin at time t.
+  most recent update prior to time t to populate the bin at time t. The
+  cumulative counts of the ICUs in cum_floor, if any, do not go below it.
   """
   res_dfs = []
   for icu_name, dg in d.groupby("icu_name"):
@@ -116,8 +138,11 @@ def aggregate_multiple_inputs(d, agg_time_delta="15Min"):
 
     # Force cumulative columns to be monotonic by bringing any decreases in
     # the value up to their previous values i.e. x_t = max(x_t, x_{t-1}):
-    dg[dataset.CUM_COLUMNS
-       ] = np.maximum.accumulate(dg[dataset.CUM_COLUMNS].values, axis=0)
+    values = dg[dataset.CUM_COLUMNS].values
+    if cum_floor is not None and icu_name in cum_floor.index:
+      floor = cum_floor.loc[icu_name, dataset.CUM_COLUMNS].values
+      values = np.maximum(values, floor.astype(values.dtype))
+    dg[dataset.CUM_COLUMNS] = np.maximum.accumulate(values, axis=0)
 
     res_dfs.append(dg.reset_index())
   return pd.concat(res_dfs)
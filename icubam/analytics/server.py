@@ -1,7 +1,7 @@
 import numbers
 import tornado.ioloop
 
-from icubam import base_server, sentry
+from icubam import base_server, metrics, profiling, sentry
 from icubam.analytics import generator, dataset
 from icubam.analytics.handlers import dataset as dataset_handler
 
@@ -11,14 +11,18 @@ class AnalyticsServer(base_server.BaseServer):
   def __init__(self, config, port):
     super().__init__(config, port)
     self.port = port if port is not None else self.config.analytics.port
-    self.db = self.db_factory.create()
+    # The analytics server only reads: use the read engine if any.
+    self.db = self.db_factory.create_reader()
     sentry.maybe_init_sentry(config, server_name='analytics')
 
     # Periodic data generation and cache have the same frequency.
     frequency = config.analytics.generate_plots_every
     if not isinstance(frequency, numbers.Number) or frequency <= 0:
       frequency = None
-    self.dataset = dataset.Dataset(self.db, ttl=frequency - 1)
+    # The daily rollups are the only writes, on the main engine.
+    self.dataset = dataset.Dataset(
+      self.db, ttl=frequency - 1, writer=self.db_factory.create()
+    )
     self.generator = generator.PlotGenerator(
       self.config, self.db, self.dataset, frequency
     )
@@ -33,4 +37,8 @@ class AnalyticsServer(base_server.BaseServer):
       upload_path=self.config.server.upload_dir,
     )
     # Only accepts request from same host
-    return tornado.web.Application(self.routes)
+    return tornado.web.Application(
+      self.routes,
+      log_function=metrics.log_request,
+      profiler=profiling.make_profiler(self.config, 'analytics')
+    )
@@ -61,3 +61,22 @@ class TestAnalyticsServer(tornado.testing.AsyncHTTPTestCase):
     # CSV with preprocessing
     response = self.fetch(f'{route}&preprocess=true', method="GET")
     check_response_csv(self, response)
+
+  def test_db_rollups_max_ts(self):
+    access_all = store.ExternalClient(
+      name='all-access', access_type=store.AccessTypes.ALL
+    )
+    _, access_key = self.db.add_external_client(self.admin_id, access_all)
+    self.server.dataset.update_rollups()
+    route = f'/db/rollups?format=csv&API_KEY={access_key.key}'
+
+    response = self.fetch(f'{route}&max_ts=2020-04-01', method="GET")
+    self.assertEqual(response.code, 200)
+    df = pd.read_csv(StringIO(response.body.decode('utf-8')))
+    self.assertEqual(df.shape[0], 0)
+    response = self.fetch(f'{route}&max_ts=2100-01-01', method="GET")
+    df = pd.read_csv(StringIO(response.body.decode('utf-8')))
+    self.assertGreater(df.shape[0], 0)
+
+    response = self.fetch(f'{route}&max_ts=yesterday', method="GET")
+    self.assertEqual(response.code, 400)
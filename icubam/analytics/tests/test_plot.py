@@ -1,5 +1,8 @@
+import datetime
 from pathlib import Path
+from unittest import mock
 
+import pandas as pd
 import pytest
 import sqlalchemy
 
@@ -7,7 +10,7 @@ import icubam.db.store as db_store
 from icubam.analytics import dataset
 from icubam.analytics.image_url_mapper import ImageURLMapper
 from icubam.analytics.plots import PLOTS, generate_plots
-from icubam.db.fake import populate_store_fake
+from icubam.db.fake import populate_store_fake, populate_store_national
 
 
 @pytest.fixture
@@ -62,6 +65,88 @@ def test_fake_generate_plots(name, tmpdir, fake_db):
     ).exists()
 
 
+def test_rollups(tmpdir, fake_db):
+  ds = dataset.Dataset(fake_db, writer=fake_db)
+  assert ds.get('rollups').empty
+  assert ds.update_rollups() > 0
+  bedcounts = ds.get_bedcounts()
+  rollups = ds.get('rollups')
+  assert set(rollups.columns
+             ) == set(dataset.ROLLUP_KEYS + dataset.BEDCOUNT_COLUMNS)
+  expected = bedcounts.groupby('date')[dataset.BEDCOUNT_COLUMNS].sum()
+  actual = rollups.groupby('date')[dataset.BEDCOUNT_COLUMNS].sum()
+  pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+  # No new bed counts since: nothing is written.
+  assert ds.update_rollups() == 0
+
+  output_dir = str(tmpdir.mkdir("out"))
+  generate_plots(
+    plots=PLOTS, output_dir=output_dir, data={'bedcounts': rollups}
+  )
+  img_map = ImageURLMapper()
+  assert (Path(output_dir) / img_map.make_path('CUM_FLOW_14D')).exists()
+
+
+def test_rollups_incremental():
+  db = db_store.StoreFactory(sqlalchemy.create_engine("sqlite:///:memory:")
+                             ).create()
+  now = datetime.datetime(2020, 4, 30)
+  data = populate_store_national(
+    db, num_regions=2, icus_per_region=3, users_per_icu=1, days=30, now=now
+  )
+  # The cumulative counts of an ICU corrected downward, long before the
+  # bed counts added below.
+  correction = now - datetime.timedelta(days=20)
+  before = [b for b in db.get_bed_counts() if b.create_date < correction]
+  icu_id = max(before, key=lambda b: b.n_covid_deaths).icu_id
+  db._session.execute(
+    sqlalchemy.update(
+      db_store.BedCount.__table__
+    ).where(db_store.BedCount.icu_id == icu_id
+            ).where(db_store.BedCount.create_date >= correction
+                    ).values(n_covid_deaths=0, n_covid_healed=0)
+  )
+  db._session.commit()
+  ds = dataset.Dataset(db, writer=db)
+  ds.update_rollups()
+
+  # New bed counts over the next days, and a late one of a few days ago.
+  rows = []
+  for bed_count in db.get_latest_bed_counts():
+    for days in range(1, 4):
+      rows.append((
+        bed_count.icu_id, now + datetime.timedelta(days=days),
+        bed_count.n_covid_occ + days, bed_count.n_covid_deaths + days
+      ))
+  rows.append((bed_count.icu_id, now - datetime.timedelta(days=3), 0, 0))
+  db.add_bed_counts(
+    data.admin_user_id,
+    ['icu_id', 'create_date', 'n_covid_occ', 'n_covid_deaths'], rows
+  )
+  with mock.patch.object(
+    db, 'get_bed_counts', wraps=db.get_bed_counts
+  ) as get_bed_counts:
+    assert ds.update_rollups() > 0
+  min_date = get_bed_counts.call_args[1]['min_date']
+  expected = now - datetime.timedelta(days=3) - 2 * dataset.ROLLUP_CONTEXT
+  assert min_date == expected
+
+  def by_key(df):
+    keys = ['date', 'region_id', 'department']
+    return df[keys + dataset.BEDCOUNT_COLUMNS].sort_values(keys).reset_index(
+      drop=True
+    )
+
+  # The same as the rollups of the whole history.
+  expected = dataset.Dataset(db, writer=None).get_bedcounts()
+  expected = expected.groupby(['date', 'region_id', 'department'],
+                              as_index=False)[dataset.BEDCOUNT_COLUMNS].sum()
+  pd.testing.assert_frame_equal(
+    by_key(ds.get('rollups')), by_key(expected), check_dtype=False
+  )
+  assert len(ds.get('rollups', max_ts='2020-04-15')) < len(ds.get('rollups'))
+
+
 @pytest.mark.integration
 @pytest.mark.parametrize("name", PLOTS)
 def test_integration_generate_plots(name, integration_config, tmpdir):
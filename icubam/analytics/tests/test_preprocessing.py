@@ -78,3 +78,18 @@ def test_enforce_daily_values_for_all_icus():
     df.loc[df['icu_name'] == 'B', dataset.NCUM_COLUMNS[0]].values,
     [0, 3, 3, 3]
   )
+
+
+def test_cum_floor(fake_db):
+  ds = dataset.Dataset(fake_db)
+  data = ds.get_bedcounts(preprocess=False)
+  max_date = pd.to_datetime(data['create_date']).max() + pd.Timedelta('1D')
+  maxima = preprocessing.cumulative_maxima(data, max_date)
+  assert set(maxima.index) == set(data['icu_name'])
+  assert list(maxima.columns) == dataset.CUM_COLUMNS
+
+  floor = maxima + 100
+  preprocessed = preprocessing.preprocess_bedcounts(data, cum_floor=floor)
+  for icu_name, dg in preprocessed.groupby('icu_name'):
+    for col in dataset.CUM_COLUMNS:
+      assert np.all(dg[col].values >= floor.loc[icu_name, col])
@@ -1,17 +1,46 @@
 from absl import logging
+import dataclasses
 import datetime
 import numbers
-from typing import Optional, Tuple, Union
+from typing import Dict, Iterable, Optional, Tuple, Union
 from icubam.db import store
 from icubam.www import token
 
 
+@dataclasses.dataclass
+class CachedAuth:
+  """What we keep in cache of a successful authentication."""
+  user_id: int
+  icu_id: int
+  user: Dict
+  icu: Dict
+
+  @classmethod
+  def from_objects(cls, user: store.User, icu: store.ICU):
+    return cls(
+      user.user_id, icu.icu_id, user.to_dict(include_relationships=False),
+      icu.to_dict(include_relationships=False)
+    )
+
+  def to_objects(self) -> Tuple[store.User, store.ICU]:
+    """Returns (unattached) copies of the authenticated user and icu."""
+    return store.User(**self.user), store.ICU(**self.icu)
+
+
 class Authenticator:
-  """Authenticates a user/icu based on available information."""
+  """Authenticates a user/icu based on available information.
+
+  Successful authentications are cached for a short time in the cache shared
+  by the stores (see store.StoreFactory), so that authenticating again the
+  same token does not hit the database. The stores invalidate the cache when
+  a user, an ICU, a token or a user/ICU assignment changes, in all the
+  processes (see store.Store.sync_cache).
+  """
   def __init__(self, config, db):
     self.config = config
     self.db = db
     self.token_encoder = token.TokenEncoder(self.config)
+    self.cache = self.db.auth_cache
 
     # Reads token validation from the config.
     self.validity = self.config.messaging.token_validity_days
@@ -57,8 +86,32 @@ class Authenticator:
 
     return token_obj.token
 
-  def authenticate(self, token_str: str) -> Optional[Tuple]:
-    """Decodes the token and check that the data is valid."""
+  def get_or_new_tokens(
+    self,
+    user_icu_ids: Iterable[Tuple[int, int]],
+    update=False
+  ) -> Dict[Tuple[int, int], str]:
+    """Same as get_or_new_token for many (user_id, icu_id) pairs at once."""
+    renew_before = None
+    if self.validity is not None and update:
+      renew_before = datetime.datetime.utcnow() - datetime.timedelta(
+        days=self.validity
+      )
+    return self.db.get_or_new_tokens(user_icu_ids, renew_before=renew_before)
+
+  def authenticate(self, token_str: Union[str, bytes]) -> Optional[Tuple]:
+    """Decodes the token and check that the data is valid.
+
+    If the authentication comes from the cache, the returned user and icu are
+    not attached to the database session: their relationships are not loaded.
+    """
+    token_str = token_str.decode(
+    ) if isinstance(token_str, bytes) else token_str
+    self.db.sync_auth_cache()
+    cached = self.cache.get(token_str)
+    if cached is not None:
+      return cached.to_objects()
+
     user_icu = self.decode(token_str)
     if user_icu is None:
       logging.warning(f"Cannot authenticate {token_str}")
@@ -77,6 +130,7 @@ class Authenticator:
       logging.warning(f"User {user.user_id} does not belong ICU {icu.icu_id}.")
       return None
 
+    self.cache.put(token_str, CachedAuth.from_objects(user, icu))
     return user, icu
 
   def decode(self, token_str: Union[str, bytes]) -> Optional[Tuple]:
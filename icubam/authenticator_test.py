@@ -1,5 +1,8 @@
 from absl.testing import absltest
 import datetime
+import os.path
+import tempfile
+from unittest import mock
 from icubam import authenticator
 from icubam import config
 from icubam.db import store
@@ -118,6 +121,106 @@ class AuthenticatorTest(absltest.TestCase):
     self.assertIsNotNone(self.authenticator.validity)
     self.assertNotEqual(token_str, token_str3)
 
+  def test_get_or_new_tokens(self):
+    icu_id2 = self.db.add_icu(self.admin_id, store.ICU(name='other'))
+    self.db.assign_user_to_icu(self.admin_id, self.user_id, icu_id2)
+    token_str = self.authenticator.get_or_new_token(self.user_id, self.icu_id)
+    pairs = [(self.user_id, self.icu_id), (self.user_id, icu_id2)]
+    tokens = self.authenticator.get_or_new_tokens(pairs)
+    self.assertEqual(tokens[pairs[0]], token_str)
+    self.assertEqual(
+      tokens[pairs[1]],
+      self.db.get_token_from_ids(*pairs[1]).token
+    )
+
+    # Only the stale tokens are renewed.
+    old_date = datetime.datetime.utcnow() - datetime.timedelta(
+      days=self.config.messaging.token_validity_days + 1
+    )
+    token_obj = self.db.get_token(token_str)
+    self.db.update_token(
+      None, token_obj.token_id, dict(last_modified=old_date)
+    )
+    self.assertEqual(self.authenticator.get_or_new_tokens(pairs), tokens)
+    renewed = self.authenticator.get_or_new_tokens(pairs, update=True)
+    self.assertNotEqual(renewed[pairs[0]], tokens[pairs[0]])
+    self.assertEqual(renewed[pairs[1]], tokens[pairs[1]])
+    self.assertIsNone(self.authenticator.authenticate(tokens[pairs[0]]))
+    self.assertIsNotNone(self.authenticator.authenticate(renewed[pairs[0]]))
+
+  def test_cached(self):
+    token = self.db.add_token(
+      self.admin_id,
+      store.UserICUToken(user_id=self.user_id, icu_id=self.icu_id)
+    )
+    self.assertIsNotNone(self.authenticator.authenticate(token))
+    with mock.patch.object(self.db, 'get_token') as m:
+      user, icu = self.authenticator.authenticate(token)
+      m.assert_not_called()
+    self.assertEqual(user.user_id, self.user_id)
+    self.assertEqual(icu.icu_id, self.icu_id)
+    self.assertEqual(user.name, 'michel')
+
+  def test_cache_invalidation(self):
+    def add_token():
+      return self.db.add_token(
+        self.admin_id,
+        store.UserICUToken(user_id=self.user_id, icu_id=self.icu_id)
+      )
+
+    token = add_token()
+    self.assertIsNotNone(self.authenticator.authenticate(token))
+    self.db.update_user(self.admin_id, self.user_id, dict(consent=False))
+    self.assertIsNone(self.authenticator.authenticate(token))
+    self.db.update_user(self.admin_id, self.user_id, dict(consent=True))
+
+    self.assertIsNotNone(self.authenticator.authenticate(token))
+    self.db.disable_icu(self.admin_id, self.icu_id)
+    self.assertIsNone(self.authenticator.authenticate(token))
+    self.db.enable_icu(self.admin_id, self.icu_id)
+
+    self.assertIsNotNone(self.authenticator.authenticate(token))
+    new_token = self.db.renew_token(self.admin_id, self.user_id, self.icu_id)
+    self.assertIsNone(self.authenticator.authenticate(token))
+    self.assertIsNotNone(self.authenticator.authenticate(new_token))
+
+    self.db.remove_user_from_icu(self.admin_id, self.user_id, self.icu_id)
+    self.assertIsNone(self.authenticator.authenticate(new_token))
+
+  def test_cache_is_shared(self):
+    factory = store.StoreFactory(self.db._session.get_bind())
+    db = factory.create()
+    token = db.add_token(
+      self.admin_id,
+      store.UserICUToken(user_id=self.user_id, icu_id=self.icu_id)
+    )
+    self.assertIsNotNone(
+      authenticator.Authenticator(self.config, db).authenticate(token)
+    )
+    other = authenticator.Authenticator(self.config, factory.create())
+    self.assertIn(token, other.cache)
+
+  @mock.patch.object(store.StoreFactory, 'STAMP_CHECK_PERIOD', 0)
+  def test_cache_invalidation_across_processes(self):
+    directory = tempfile.TemporaryDirectory()
+    self.addCleanup(directory.cleanup)
+    self.config.db.sqlite_path = os.path.join(directory.name, 'icubam.db')
+    # Two factories on the same database, as in two processes.
+    db = store.create_store_factory_for_sqlite_db(self.config).create()
+    other_db = store.create_store_factory_for_sqlite_db(self.config).create()
+    admin_id = db.add_default_admin()
+    icu_id = db.add_icu(admin_id, store.ICU(name='hospital'))
+    user_id = db.add_user_to_icu(admin_id, icu_id, store.User(name='michel'))
+    token = db.add_token(
+      admin_id, store.UserICUToken(user_id=user_id, icu_id=icu_id)
+    )
+
+    other = authenticator.Authenticator(self.config, other_db)
+    self.assertIsNotNone(other.authenticate(token))
+    self.assertIn(token, other.cache)
+    db.update_user(admin_id, user_id, dict(is_active=False))
+    self.assertIsNone(other.authenticate(token))
+
 
 if __name__ == '__main__':
-  absltest.main()
\ No newline at end of file
+  absltest.main()
@@ -5,6 +5,9 @@ import tornado.web
 from enum import Enum, unique
 from typing import List, Dict, Union, Optional
 
+from icubam import compression, profiling
+from icubam.db import store
+
 
 @unique
 class ObjType(Enum):
@@ -14,6 +17,7 @@ class ObjType(Enum):
   REGIONS = 4
   USERS = 5
   TOKENS = 6
+  PROFILES = 7
 
   def __str__(self):
     return {
@@ -23,10 +27,11 @@ class ObjType(Enum):
       self.REGIONS: "Regions",
       self.USERS: "Users",
       self.TOKENS: "Access Tokens",
+      self.PROFILES: "Profiles",
     }[self]
 
 
-class BaseHandler(tornado.web.RequestHandler):
+class BaseHandler(profiling.ProfilingMixin, tornado.web.RequestHandler):
   """A base class for handlers."""
 
   COOKIE = 'user'
@@ -35,29 +40,54 @@ class BaseHandler(tornado.web.RequestHandler):
   def initialize(self):
     self.config = self.application.config
     self.db = self.application.db_factory.create()
+    # Heavy read-only queries (maps, dashboards) go to the read engine.
+    self.read_db = self.application.db_factory.create_reader()
     if self.application.root:
       root = self.application.root.strip('/')
       self.root_path = '/{}/'.format(root)
     else:
       self.root_path = '/'
 
-  def render(self, path, **kwargs):
+  def render_string(self, path, **kwargs):
     # This dictionary is updated by a PeriodicCallback in the
     # BackofficeApplication
     status = self.application.server_status
-    super().render(path, root=self.root_path, server_status=status, **kwargs)
+    return super().render_string(
+      path, root=self.root_path, server_status=status, **kwargs
+    )
 
   def render_list(
-    self, data, objtype, create_handler=None, upload=False, **kwargs
+    self,
+    data,
+    objtype,
+    create_handler=None,
+    upload=False,
+    data_handler=None,
+    **kwargs
   ):
+    """Renders a table of objects.
+
+    The rows are either all in data, or fetched page by page from the
+    data_handler, a ListDataMixin listing the same objects.
+    """
     route = None if create_handler is None else create_handler.ROUTE
     upload_type = objtype.name if upload else None
-    item = data[0] if data else []
-    columns = json.dumps([x['key'] for x in item])
+    if data_handler is None:
+      item = data[0] if data else []
+      keys = [x['key'] for x in item]
+      orderable = [True for _ in keys]
+      data_route = None
+    else:
+      keys = list(data_handler.COLUMNS)
+      orderable = [c is not None for c in data_handler.COLUMNS.values()]
+      data_route = data_handler.ROUTE
     return self.render(
       "list.html",
       data=data,
-      columns=columns,
+      keys=keys,
+      columns=json.dumps(keys),
+      orderable=json.dumps(orderable),
+      data_route=data_route,
       objtype=str(objtype),
       create_route=route,
       upload_type=upload_type,
@@ -67,6 +97,16 @@ class BaseHandler(tornado.web.RequestHandler):
   def get_template_path(self):
     return os.path.join(self.PATH, 'templates/')
 
+  def static_url(self, path, include_host=None, **kwargs):
+    """Returns the url of a static file, hashed so that it is cached long."""
+    folders = {
+      'dist/': os.path.join(self.PATH, 'static/dist'),
+      'plugins/': os.path.join(self.PATH, 'static/plugins'),
+      'static/': os.path.join(self.PATH, 'static'),
+      'www/static/': os.path.join(os.path.dirname(self.PATH), 'www/static'),
+    }
+    return compression.static_url(folders, path)
+
   # Tornado's @tornado.web.authenticated decorator will put the result of this
   # function in the `current_user` field of the handler
   # See https://www.tornadoweb.org/en/stable/guide/security.html#user-authentication
@@ -111,6 +151,10 @@ class BaseHandler(tornado.web.RequestHandler):
         result[col] = value
     return result
 
+  def prepare_rows(self, items: List) -> List[List[Dict]]:
+    """Formats a page of objects into the rows of a list."""
+    return [self.prepare_for_table(item) for item in items]
+
   def format_list_item(self, item: Union[Dict, List]) -> Union[Dict, List]:
     """Prepare a dictionary representing a row of a table for display."""
     # TODO(olivier) improve this, too hard coded
@@ -134,3 +178,71 @@ class AdminHandler(BaseHandler):
       return None
     else:
       return user
+
+
+class ListDataMixin:
+  """Serves the rows of a list page by page, as JSON.
+
+  It follows the server-side processing protocol of DataTables: the rows are
+  paged by the `start` and `length` arguments, sorted by the
+  `order[0][column]` column in the `order[0][dir]` direction and searched for
+  `search[value]`.
+
+  The handler it is mixed with must define the COLUMNS of the list, mapping
+  their keys to the name of the column to sort them by or None, a get_page
+  method returning a store.Page of objects for a store.PageRequest, and a
+  prepare_for_table method formatting an object into a row, unless it
+  overrides prepare_rows to format the whole page at once. The mixin comes
+  first in the bases of the data handlers: it must not define prepare_rows,
+  which would shadow the override of the list handler.
+  """
+
+  COLUMNS: Dict[str, Optional[str]]
+  MAX_LENGTH = 1000
+
+  def get_page_request(self) -> store.PageRequest:
+    request = store.PageRequest()
+    request.offset = int(self.get_query_argument('start', 0))
+    length = int(self.get_query_argument('length', -1))
+    if length < 0 or length > self.MAX_LENGTH:
+      length = self.MAX_LENGTH
+    request.limit = length
+    request.search = self.get_query_argument('search[value]', None) or None
+    column = self.get_query_argument('order[0][column]', None)
+    if column is not None:
+      request.order_by = list(self.COLUMNS.values())[int(column)]
+      request.descending = self.get_query_argument(
+        'order[0][dir]', ''
+      ) == 'desc'
+    return request
+
+  @staticmethod
+  def serialize(row: List[Dict]) -> List[Dict]:
+    """Makes the values of a row JSON serializable."""
+    result = []
+    for item in row:
+      item = dict(item)
+      if not isinstance(item['value'], bool):
+        item['value'] = str(item['value'])
+      item.pop('sort_value', None)
+      result.append(item)
+    return result
+
+  @tornado.web.authenticated
+  def get(self):
+    try:
+      draw = int(self.get_query_argument('draw', 0))
+      request = self.get_page_request()
+    except (ValueError, IndexError):
+      raise tornado.web.HTTPError(400)
+
+    page = self.get_page(request)
+    self.write({
+      'draw':
+      draw,
+      'recordsTotal':
+      page.total,
+      'recordsFiltered':
+      page.filtered,
+      'data': [self.serialize(row) for row in self.prepare_rows(page.items)],
+    })
@@ -1,27 +1,38 @@
 import tornado.escape
 import tornado.web
+from typing import List, Optional
 
 from icubam import time_utils
 from icubam.backoffice.handlers import base
 from icubam.www import updater
 from icubam.db import store
 
+# The fields of the bed counts that are not listed.
+HIDDEN_FIELDS = [
+  'rowid', 'icu_id', 'message', 'create_date', 'last_modified', 'icu'
+]
+
 
 class ListBedCountsHandler(base.BaseHandler):
   ROUTE = 'bedcounts'
+  COLUMNS = {'ICU (update link)': 'name', 'since_update': None}
+  COLUMNS.update({
+    field: None
+    for field in store.BedCount.get_column_names()
+    if field not in HIDDEN_FIELDS
+  })
 
   def initialize(self):
     super().initialize()
-    self.link_fn = updater.Updater(self.config, self.db).get_url
+    self.updater = updater.Updater(self.config, self.db)
 
-  def prepare_data(self, icu, locale) -> list:
-    link = {'key': 'ICU (update link)', 'value': icu.name}
-    link['link'] = self.link_fn(
-      icu.users[0].user_id, icu.icu_id
-    ) if icu.users else None
-    result = [link]
+  def prepare_data(
+    self, icu, bed_count: Optional[store.BedCount], url: Optional[str], locale
+  ) -> list:
+    """Formats the row of an ICU, its latest bed count and its update url."""
+    result = [{'key': 'ICU (update link)', 'value': icu.name, 'link': url}]
 
-    bed_count = icu.bed_counts[-1] if icu.bed_counts else store.BedCount()
+    bed_count = bed_count if bed_count is not None else store.BedCount()
     bed_count_dict = bed_count.to_dict(max_depth=0)
     last = bed_count_dict.pop('create_date', None)
     last = None if last is None else last.timestamp()
@@ -36,22 +47,35 @@ class ListBedCountsHandler(base.BaseHandler):
       'sort_value': 0 if last is None else last,
       'link': False,
     })
-    to_pop = [
-      'rowid', 'icu_id', 'message', 'create_date', 'last_modified', 'icu'
-    ]
-    for key in to_pop:
+    for key in HIDDEN_FIELDS:
       bed_count_dict.pop(key, None)
     result.extend(self.format_list_item(bed_count_dict))
     return result
 
+  def prepare_rows(self, items) -> List[list]:
+    """Formats the (icu, bed_count, user_id) of a page of the overview."""
+    urls = self.updater.get_urls((user_id, icu.icu_id)
+                                 for icu, _, user_id in items
+                                 if user_id is not None)
+    return [
+      self.prepare_data(
+        icu, bed_count, urls.get((user_id, icu.icu_id), None), self.locale
+      ) for icu, bed_count, user_id in items
+    ]
+
+  def get_page(self, request: store.PageRequest) -> store.Page:
+    return self.db.get_bed_count_overview(self.current_user.user_id, request)
+
   @tornado.web.authenticated
   def get(self):
-    locale = self.get_user_locale()
-    icus = self.db.get_managed_icus(self.current_user.user_id)
-    data = [self.prepare_data(icu, locale) for icu in icus if icu.is_active]
     return self.render_list(
-      data=data,
+      data=[],
       objtype=base.ObjType.BEDCOUNTS,
       create_handler=None,
-      upload=True
+      upload=True,
+      data_handler=ListBedCountsDataHandler
     )
+
+
+class ListBedCountsDataHandler(base.ListDataMixin, ListBedCountsHandler):
+  ROUTE = 'bedcounts/data'
@@ -1,3 +1,4 @@
+import datetime
 import tornado.testing
 import tornado.web
 import tornado.httpserver
@@ -21,12 +22,12 @@ class TestListBedCountsHandler(tornado.testing.AsyncTestCase):
     self.app = self.server.make_app()
     self.request = tornado.httpserver.HTTPRequest(
       method='GET',
-      uri=bedcounts.ListBedCountsHandler.ROUTE,
+      uri=bedcounts.ListBedCountsDataHandler.ROUTE,
       headers=None,
       body=None
     )
     self.request.connection = MockConnection()
-    self.handler = bedcounts.ListBedCountsHandler(self.app, self.request)
+    self.handler = bedcounts.ListBedCountsDataHandler(self.app, self.request)
     self.handler.initialize()
 
     self.admin_id = self.handler.db.add_default_admin()
@@ -45,8 +46,40 @@ class TestListBedCountsHandler(tornado.testing.AsyncTestCase):
     self.handler.db.update_bed_count_for_icu(self.admin_id, bedcount)
     icu = self.handler.db.get_icu(self.icuid)
     locale = self.handler.get_user_locale()
-    data = self.handler.prepare_data(icu, locale)
+    data = self.handler.prepare_data(icu, bedcount, 'url', locale)
     self.assertIsInstance(data, list)
     self.assertGreater(len(data), 0)
     for k in ['key', 'value', 'link']:
       self.assertIn(k, data[0])
+
+  def test_prepare_rows(self):
+    db = self.handler.db
+    self.handler.current_user = db.get_user(self.admin_id)
+    self.handler.locale = self.handler.get_user_locale()
+    user_id = db.add_user_to_icu(
+      self.admin_id, self.icuid, store.User(name='user')
+    )
+    other_id = db.add_icu(self.admin_id, store.ICU(name='icu2'))
+    now = datetime.datetime.utcnow()
+    for n_covid_occ, days_ago in [(5, 1), (3, 2)]:
+      db.update_bed_count_for_icu(
+        self.admin_id,
+        store.BedCount(
+          icu_id=self.icuid,
+          n_covid_occ=n_covid_occ,
+          create_date=now - datetime.timedelta(days=days_ago)
+        )
+      )
+    db.update_bed_count_for_icu(
+      self.admin_id, store.BedCount(icu_id=other_id, n_covid_occ=1)
+    )
+
+    page = self.handler.get_page(store.PageRequest(order_by='name'))
+    rows = self.handler.prepare_rows(page.items)
+    self.assertEqual(len(rows), 2)
+    by_name = {row[0]['value']: row for row in rows}
+    token = db.get_token_from_ids(user_id, self.icuid).token
+    self.assertTrue(by_name['iuc1'][0]['link'].endswith(f'id={token}'))
+    self.assertIsNone(by_name['icu2'][0]['link'])
+    values = {item['key']: item['value'] for item in by_name['iuc1']}
+    self.assertEqual(values['n_covid_occ'], 5)
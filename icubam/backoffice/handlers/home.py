@@ -1,7 +1,7 @@
 from icubam.backoffice.handlers.base import BaseHandler
 
 import tornado.web
-from icubam import icu_tree
+from icubam import icu_tree, metrics
 
 
 def make_info(count, label, icon, color):
@@ -40,4 +40,8 @@ class HomeHandler(BaseHandler):
       self.db.get_icus(), self.db.get_latest_bed_counts(),
       len(self.db.get_users())
     )
-    return self.render("home.html", data=data)
+    # The metrics of the servers, as last pinged, and of the backoffice.
+    own_metrics = {}
+    if self.current_user.is_admin:
+      own_metrics = metrics.summarize(metrics.REGISTRY.render())
+    return self.render("home.html", data=data, own_metrics=own_metrics)
@@ -10,6 +10,15 @@ from icubam.db import store
 
 class ListICUsHandler(base.BaseHandler):
   ROUTE = "list_icus"
+  COLUMNS = {
+    'name': 'name',
+    'city': 'city',
+    'dept': 'dept',
+    'region': None,
+    'active': 'is_active',
+    'users': None,
+    'managers': None,
+  }
 
   def prepare_for_table(self, icu):
     result = [{
@@ -27,22 +36,24 @@ class ListICUsHandler(base.BaseHandler):
     result.extend(self.format_list_item(icu_dict))
     return result
 
+  def get_page(self, request: store.PageRequest) -> store.Page:
+    return self.db.get_icus_page(self.current_user.user_id, request)
+
   @tornado.web.authenticated
   def get(self):
-    if self.current_user.is_admin:
-      icus = self.db.get_icus()
-    else:
-      icus = self.db.get_managed_icus(self.current_user.user_id)
-
-    data = [self.prepare_for_table(icu) for icu in icus]
     return self.render_list(
-      data=data,
+      data=[],
       objtype=base.ObjType.ICUS,
       create_handler=ICUHandler,
-      upload=True
+      upload=True,
+      data_handler=ListICUsDataHandler
     )
 
 
+class ListICUsDataHandler(base.ListDataMixin, ListICUsHandler):
+  ROUTE = "list_icus/data"
+
+
 class ICUHandler(base.BaseHandler):
   ROUTE = "icu"
 
@@ -1,6 +1,7 @@
+import tornado.escape
 import tornado.web
 import icubam
-from icubam import map_builder
+from icubam import icu_tree, map_builder, page_cache
 from icubam.backoffice.handlers import base
 
 
@@ -9,14 +10,62 @@ class MapsHandler(base.BaseHandler):
 
   @tornado.web.authenticated
   def get(self):
-    locale = self.get_user_locale()
-    builder = map_builder.MapBuilder(self.config, self.db, locale)
-    level = self.get_query_argument('level', 'dept')
-    data, center = builder.prepare_jsons(None, None, level=level)
+    """The data of the map is then fetched from the MapDataHandler."""
+    query = self.request.query
     return self.render(
       'map.html',
       API_KEY=self.config.GOOGLE_API_KEY,
-      center=center,
-      data=data,
+      data_url=f'{MapDataHandler.ROUTE}?{query}',
+      popup_route=MapPopupHandler.PREFIX,
+      query=query,
       version=icubam.__version__
     )
+
+
+class MapDataHandler(page_cache.CachedPageMixin, base.BaseHandler):
+  """Serves the clusters of the map."""
+  ROUTE = "map/data.json"
+
+  def get_level(self):
+    level = self.get_query_argument('level', 'dept')
+    if level not in icu_tree.ICUTree.LEVELS:
+      raise tornado.web.HTTPError(400, f'Unknown level {level}')
+    return level
+
+  def get_builder(self):
+    return map_builder.MapBuilder(self.config, self.read_db, self.locale)
+
+  def render_data(self, level) -> bytes:
+    data = self.get_builder().prepare_data(level=level)
+    return tornado.escape.json_encode(data).encode()
+
+  @tornado.web.authenticated
+  def get(self):
+    level = self.get_level()
+    self.set_header('Content-Type', 'application/json')
+    return self.serve_cached(
+      self.read_db.get_data_version(), lambda: self.render_data(level)
+    )
+
+
+class MapPopupHandler(MapDataHandler):
+  """Renders the popup of a single cluster of the map."""
+  PREFIX = "map/popup/"
+  ROUTE = PREFIX + r"([^/]+)"
+
+  def render_popup(self, cluster_id, level) -> bytes:
+    covid = self.get_query_argument('covid', '1') != '0'
+    popup = self.get_builder().prepare_popup(
+      cluster_id, covid=covid, level=level
+    )
+    if popup is None:
+      raise tornado.web.HTTPError(404, f'Unknown cluster {cluster_id}')
+    return popup
+
+  @tornado.web.authenticated
+  def get(self, cluster_id):
+    level = self.get_level()
+    return self.serve_cached(
+      self.read_db.get_data_version(),
+      lambda: self.render_popup(cluster_id, level)
+    )
@@ -48,18 +48,35 @@ class ListMessagesHandler(base.AdminHandler):
     result.append({'key': 'url', 'value': 'link', 'link': msg['url']})
     return result
 
+  def get_int_arguments(self, name):
+    return [int(x) for x in self.get_query_arguments(name)] or None
+
   @tornado.web.authenticated
   async def get(self):
+    """Lists the scheduled messages.
+
+    The messages can be filtered by the `icu` and `region` query arguments,
+    and paged by the `offset` and `limit` ones.
+    """
+    try:
+      icu_ids = self.get_int_arguments('icu')
+      region_ids = self.get_int_arguments('region')
+      offset = int(self.get_query_argument('offset', 0))
+      limit = self.get_query_argument('limit', None)
+      limit = int(limit) if limit is not None else None
+    except ValueError:
+      raise tornado.web.HTTPError(400)
+
     try:
-      messages = await self.client.get_scheduled_messages(
-        self.current_user.user_id
+      response = await self.client.get_scheduled_messages(
+        self.current_user.user_id, icu_ids, region_ids, offset, limit
       )
     except Exception as e:
       logging.error(f'Cannot contact message server: {e}')
       return self.redirect(self.root_path)
 
     locale = self.get_user_locale()
-    data = [self.prepare_for_table(msg, locale) for msg in messages]
+    data = [self.prepare_for_table(msg, locale) for msg in response.messages]
     self.render_list(
       data=data, objtype=base.ObjType.MESSAGES, create_handler=None
     )
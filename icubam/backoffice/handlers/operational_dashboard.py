@@ -1,21 +1,31 @@
 import tornado.web
+from icubam import page_cache
 from icubam.backoffice.handlers import base
-from icubam.analytics import operational_dashboard
 
 
-class OperationalDashHandler(base.AdminHandler):
+class OperationalDashHandler(page_cache.CachedPageMixin, base.AdminHandler):
   ROUTE = 'operational-dashboard'
 
   @tornado.web.authenticated
   def get(self):
     """Serves a page with a table gathering current bedcount data with some extra information."""
+    # The visible ICUs depend on the user.
+    return self.serve_cached(
+      self.read_db.get_data_version(),
+      self.render_dashboard,
+      variant=self.current_user.user_id
+    )
+
+  def render_dashboard(self) -> bytes:
+    # Loads bokeh and pandas on the first dashboard only.
+    from icubam.analytics import operational_dashboard
+
     arg_region = self.get_query_argument('region', default=None)
-    locale = self.get_user_locale()
     kwargs = operational_dashboard.make(
-      self.current_user.user_id, self.db, arg_region, locale,
+      self.current_user.user_id, self.read_db, arg_region, self.locale,
       self.config.analytics.extra_plots_dir
     )
-    return self.render(
+    return self.render_string(
       "operational-dashboard.html",
       backoffice_root=self.root_path,
       api_key=None,
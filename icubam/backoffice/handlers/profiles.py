@@ -0,0 +1,52 @@
+"""Listing and download of the profiles of the requests."""
+import os.path
+import tornado.web
+
+from icubam import profiling
+from icubam.backoffice.handlers import base
+
+
+class ListProfilesHandler(base.AdminHandler):
+  ROUTE = "list_profiles"
+
+  def get_directory(self) -> str:
+    return profiling.get_setting(self.config, 'dir', profiling.DIR)
+
+  def prepare_for_table(self, profile: profiling.ProfileFile):
+    result = [{
+      'key': 'profile',
+      'value': profile.name,
+      'link': f'{DownloadProfileHandler.ROUTE}?name={profile.name}'
+    }]
+    result.extend(
+      self.format_list_item({
+        'server': profile.server,
+        'route': profile.route,
+        'created': profile.created,
+        'duration (ms)': profile.duration_ms,
+        'size (kB)': round(profile.size / 1024),
+      })
+    )
+    return result
+
+  @tornado.web.authenticated
+  def get(self):
+    profiles = profiling.list_profiles(self.get_directory())
+    data = [self.prepare_for_table(profile) for profile in profiles]
+    return self.render_list(data=data, objtype=base.ObjType.PROFILES)
+
+
+class DownloadProfileHandler(ListProfilesHandler):
+  ROUTE = "list_profiles/download"
+
+  @tornado.web.authenticated
+  def get(self):
+    name = self.get_query_argument('name', '')
+    names = {p.name for p in profiling.list_profiles(self.get_directory())}
+    if name not in names:
+      raise tornado.web.HTTPError(404)
+
+    self.set_header('Content-Type', 'application/octet-stream')
+    self.set_header('Content-Disposition', f'attachment; filename="{name}"')
+    with open(os.path.join(self.get_directory(), name), 'rb') as fp:
+      return self.finish(fp.read())
@@ -9,6 +9,7 @@ from icubam.db import store
 
 class ListRegionsHandler(base.AdminHandler):
   ROUTE = "list_regions"
+  COLUMNS = {'name': 'name', 'icus': None, 'created': 'create_date'}
 
   def prepare_for_table(self, region):
     result = [{
@@ -22,15 +23,23 @@ class ListRegionsHandler(base.AdminHandler):
     result.extend(self.format_list_item(region_dict))
     return result
 
+  def get_page(self, request: store.PageRequest) -> store.Page:
+    return self.db.get_regions_page(request)
+
   @tornado.web.authenticated
   def get(self):
-    regions = self.db.get_regions()
-    data = [self.prepare_for_table(region) for region in regions]
     return self.render_list(
-      data=data, objtype=base.ObjType.REGIONS, create_handler=RegionHandler
+      data=[],
+      objtype=base.ObjType.REGIONS,
+      create_handler=RegionHandler,
+      data_handler=ListRegionsDataHandler
     )
 
 
+class ListRegionsDataHandler(base.ListDataMixin, ListRegionsHandler):
+  ROUTE = "list_regions/data"
+
+
 class RegionHandler(base.AdminHandler):
   ROUTE = "region"
 
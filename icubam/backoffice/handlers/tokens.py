@@ -11,9 +11,33 @@ from icubam.analytics.handlers import dataset as www_db
 from icubam.db import store
 
 
+def _api_route(handler) -> str:
+  route = handler.ROUTE.strip('/').split('/')[0]
+  if handler == www_db.DatasetHandler:
+    route += '/bedcounts'
+  return route
+
+
+# The routes accessible with an access key, linked from the list.
+API_ROUTES = [
+  _api_route(handler)
+  for handler in [www_home.MapByAPIHandler, www_db.DatasetHandler]
+]
+
+
 class ListTokensHandler(base.AdminHandler):
 
   ROUTE = "list_tokens"
+  COLUMNS = {
+    'name': 'name',
+    'access_key': 'access_key',
+    'is_active': 'is_active',
+    'expiration_date': 'expiration_date',
+    'access_type': 'access_type',
+    'regions': None,
+    **{route: None
+       for route in API_ROUTES}
+  }
 
   def prepare_for_table(self, client):
     result = [{
@@ -29,24 +53,30 @@ class ListTokensHandler(base.AdminHandler):
     )
     client_dict['regions'] = ', '.join([r.name for r in client.regions])
     result.extend(self.format_list_item(client_dict))
-    for handler in [www_home.MapByAPIHandler, www_db.DatasetHandler]:
-      route = handler.ROUTE.strip('/').split('/')[0]
-      if handler == www_db.DatasetHandler:
-        route += '/bedcounts'
+    for route in API_ROUTES:
       args = f'?API_KEY={client.access_key}'
       url = os.path.join(self.config.server.base_url, route + args)
       result.append({'key': route, 'value': 'link', 'link': url})
     return result
 
+  def get_page(self, request: store.PageRequest) -> store.Page:
+    return self.db.get_external_clients_page(request)
+
   @tornado.web.authenticated
   def get(self):
-    clients = self.db.get_external_clients()
-    data = [self.prepare_for_table(client) for client in clients]
     self.render_list(
-      data=data, objtype=base.ObjType.TOKENS, create_handler=TokenHandler
+      data=[],
+      objtype=base.ObjType.TOKENS,
+      create_handler=TokenHandler,
+      data_handler=ListTokensDataHandler
     )
 
 
+class ListTokensDataHandler(base.ListDataMixin, ListTokensHandler):
+
+  ROUTE = "list_tokens/data"
+
+
 class TokenHandler(base.AdminHandler):
 
   ROUTE = 'token'
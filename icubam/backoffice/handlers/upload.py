@@ -5,19 +5,23 @@ import json
 import tornado.web
 
 from icubam.backoffice.handlers import base
-from icubam.db import synchronizer
+from icubam.messaging import client
 from typing import Dict, Callable
 
 
 class UploadHandler(base.BaseHandler):
   ROUTE = "upload"
 
+  def initialize(self):
+    super().initialize()
+    self.message_client = client.MessageServerClient(self.config)
+
   def answer(self, msg, error=False) -> None:
     logging.error(msg)
     self.write(json.dumps({'msg': msg, 'error': error}))
 
   @tornado.web.authenticated
-  def post(self) -> None:
+  async def post(self) -> None:
     try:
       data = json.loads(self.request.body.decode())
     except Exception as e:
@@ -27,6 +31,9 @@ class UploadHandler(base.BaseHandler):
     if content is None:
       return self.answer('No CSV content', error=True)
 
+    # Loads pandas on the first upload only.
+    from icubam.db import synchronizer
+
     sync = synchronizer.CSVSynchronizer(self.db)
     sync_fns: Dict[base.ObjType, Callable[..., int]] = {
       base.ObjType.USERS: sync.sync_users_from_csv,
@@ -44,6 +51,16 @@ class UploadHandler(base.BaseHandler):
 
     try:
       num_updates = sync_fn(io.StringIO(content), force_update=True)
-      return self.answer(f'Updated {num_updates} {objtype}')
     except Exception as e:
       return self.answer(f'Failing while syncing csv content: {e}', error=True)
+
+    if sync.assigned_icus:
+      try:
+        await self.message_client.notify_many(
+          sync.assigned_icus.items(),
+          on=True,
+          delay=self.config.scheduler.new_user_delay
+        )
+      except Exception as e:
+        logging.error(f'Cannot notify MessageServer {e}')
+    return self.answer(f'Updated {num_updates} {objtype}')
@@ -12,9 +12,17 @@ from icubam.db import store
 
 class ListUsersHandler(base.BaseHandler):
   ROUTE = "list_users"
+  COLUMNS = {
+    'name': 'name',
+    'admin': 'is_admin',
+    'active': 'is_active',
+    'created': 'create_date',
+    'icus': None,
+    'manages': None,
+  }
 
   # No need to send info such as the password of the user.
-  def _cleanUser(self, user):
+  def prepare_for_table(self, user):
     result = [{
       'key': 'name',
       'value': user.name,
@@ -29,22 +37,24 @@ class ListUsersHandler(base.BaseHandler):
     result.extend(self.format_list_item(user_dict))
     return result
 
+  def get_page(self, request: store.PageRequest) -> store.Page:
+    return self.db.get_users_page(self.current_user.user_id, request)
+
   @tornado.web.authenticated
   def get(self):
-    if self.current_user.is_admin:
-      users = self.db.get_users()
-    else:
-      users = self.db.get_managed_users(self.current_user.user_id)
-
-    data = [self._cleanUser(user) for user in users]
     return self.render_list(
-      data=data,
+      data=[],
       objtype=base.ObjType.USERS,
       create_handler=UserHandler,
-      upload=True
+      upload=True,
+      data_handler=ListUsersDataHandler
     )
 
 
+class ListUsersDataHandler(base.ListDataMixin, ListUsersHandler):
+  ROUTE = "list_users/data"
+
+
 class ProfileHandler(base.BaseHandler):
   ROUTE = "profile"
 
@@ -2,17 +2,19 @@ import collections
 import dataclasses
 import datetime
 import os.path
-from typing import Optional
+from typing import Dict, Optional
 
 import tornado.ioloop
 import tornado.locale
 import tornado.web
 from absl import logging  # noqa: F401
 
-from icubam import base_server, sentry
+from icubam import (
+  base_server, compression, metrics, page_cache, profiling, sentry
+)
 from icubam.backoffice.handlers import (
   bedcounts, consent, home, icus, login, logout, maps, messages,
-  operational_dashboard, regions, tokens, upload, users
+  operational_dashboard, profiles, regions, tokens, upload, users
 )
 
 
@@ -22,6 +24,8 @@ class ServerStatus:
   up: Optional[bool] = None
   started: Optional[str] = None
   last_ping: Optional[datetime.datetime] = None
+  # A summary of the metrics of the server, see metrics.summarize.
+  metrics: Dict[str, str] = dataclasses.field(default_factory=dict)
 
 
 class BackofficeApplication(tornado.web.Application):
@@ -32,7 +36,9 @@ class BackofficeApplication(tornado.web.Application):
     self.server_status = collections.defaultdict(ServerStatus)
     self.client = tornado.httpclient.AsyncHTTPClient()
     sentry.maybe_init_sentry(config, server_name='backoffice')
-    super().__init__(routes, **settings)
+    super().__init__(
+      routes, transforms=compression.get_transforms(config), **settings
+    )
 
     repeat_every = self.config.backoffice.ping_every * 1000
     pings = tornado.ioloop.PeriodicCallback(self.ping, repeat_every)
@@ -40,6 +46,9 @@ class BackofficeApplication(tornado.web.Application):
 
   async def ping(self):
     servers = {'server': 'www', 'messaging': 'sms', 'analytics': 'analytics'}
+    headers = {}
+    if self.config.METRICS_TOKEN:
+      headers['Authorization'] = f'Bearer {self.config.METRICS_TOKEN}'
     for server, name in servers.items():
       url = self.config[server].base_url + 'health'
       status = self.server_status[server]
@@ -55,6 +64,19 @@ class BackofficeApplication(tornado.web.Application):
         status.up = False
         continue
 
+      try:
+        resp = await self.client.fetch(
+          tornado.httpclient.HTTPRequest(
+            url=self.config[server].base_url + 'metrics',
+            headers=headers,
+            request_timeout=1
+          )
+        )
+        status.metrics = metrics.summarize(resp.body.decode())
+      except Exception as e:
+        logging.warning(f'Cannot get the metrics of {server}: {e}')
+        status.metrics = {}
+
 
 class BackOfficeServer(base_server.BaseServer):
   """Serves and manipulates the Backoffice ICUBAM."""
@@ -67,18 +89,27 @@ class BackOfficeServer(base_server.BaseServer):
     self.add_handler(login.LoginHandler)
     self.add_handler(logout.LogoutHandler)
     self.add_handler(users.ListUsersHandler)
+    self.add_handler(users.ListUsersDataHandler)
     self.add_handler(users.UserHandler)
     self.add_handler(users.ProfileHandler)
     self.add_handler(tokens.TokenHandler)
     self.add_handler(tokens.ListTokensHandler)
+    self.add_handler(tokens.ListTokensDataHandler)
     self.add_handler(icus.ListICUsHandler)
+    self.add_handler(icus.ListICUsDataHandler)
     self.add_handler(icus.ICUHandler)
     self.add_handler(regions.ListRegionsHandler)
+    self.add_handler(regions.ListRegionsDataHandler)
     self.add_handler(regions.RegionHandler)
     self.add_handler(bedcounts.ListBedCountsHandler)
+    self.add_handler(bedcounts.ListBedCountsDataHandler)
     self.add_handler(operational_dashboard.OperationalDashHandler)
     self.add_handler(messages.ListMessagesHandler)
+    self.add_handler(profiles.ListProfilesHandler)
+    self.add_handler(profiles.DownloadProfileHandler)
     self.add_handler(maps.MapsHandler)
+    self.add_handler(maps.MapDataHandler)
+    self.add_handler(maps.MapPopupHandler)
     self.add_handler(upload.UploadHandler)
     self.add_handler(consent.ConsentResetHandler)
 
@@ -94,7 +125,7 @@ class BackOfficeServer(base_server.BaseServer):
       route = os.path.join("/", self.root, folder, r'(.*)')
       folder = '' if folder == 'static' else folder
       self.routes.append((
-        route, tornado.web.StaticFileHandler, {
+        route, compression.StaticFileHandler, {
           'path': os.path.join(path, 'static', folder)
         }
       ))
@@ -102,7 +133,7 @@ class BackOfficeServer(base_server.BaseServer):
     route_pattern = os.path.join("/", self.root, r'www/static/(.*)')
     for route in [r'/(favicon.icon)', route_pattern]:
       self.routes.append((
-        route, tornado.web.StaticFileHandler, {
+        route, compression.StaticFileHandler, {
           'path': os.path.join(path, '../www/static')
         }
       ))
@@ -114,6 +145,9 @@ class BackOfficeServer(base_server.BaseServer):
     settings = {
       'cookie_secret': cookie_secret,
       'login_url': 'login',
+      'page_cache': page_cache.make_cache(self.config),
+      'profiler': profiling.make_profiler(self.config, 'backoffice'),
+      'log_function': metrics.log_request,
     }
     tornado.locale.load_translations(os.path.join(path, 'translations'))
     self.make_routes(path)
@@ -1,14 +1,17 @@
+import cProfile
 import json
+import tempfile
 import tornado.testing
 from unittest import mock
 from urllib.parse import urlencode
 
-from icubam import config
+from icubam import config, profiling
 from icubam.backoffice import server
 from icubam.backoffice.handlers import (
   base, home, login, logout, users, tokens, icus, bedcounts,
-  operational_dashboard, regions, maps, consent, upload
+  operational_dashboard, regions, maps, consent, upload, profiles
 )
+from icubam.db import store
 
 
 class ServerTestCase(tornado.testing.AsyncHTTPTestCase):
@@ -73,6 +76,86 @@ class ServerTestCase(tornado.testing.AsyncHTTPTestCase):
         response = self.fetch(handler.ROUTE, method='GET')
         self.assertEqual(response.code, 200, msg=handler.__name__)
 
+  def test_list_data(self):
+    region_id = self.db.add_region(self.admin_id, store.Region(name='region'))
+    icu_id = self.db.add_icu(
+      self.admin_id, store.ICU(name='icu', region_id=region_id)
+    )
+    self.db.update_bed_count_for_icu(
+      self.admin_id, store.BedCount(icu_id=icu_id, n_covid_occ=1)
+    )
+    handlers = [
+      icus.ListICUsDataHandler,
+      users.ListUsersDataHandler,
+      tokens.ListTokensDataHandler,
+      regions.ListRegionsDataHandler,
+      bedcounts.ListBedCountsDataHandler,
+    ]
+    args = {'draw': 3, 'start': 0, 'length': 10, 'order[0][column]': 0}
+    for handler in handlers:
+      with mock.patch.object(base.BaseHandler, 'get_current_user') as m:
+        m.return_value = self.user
+        response = self.fetch(f'{handler.ROUTE}?{urlencode(args)}')
+      self.assertEqual(response.code, 200, msg=handler.__name__)
+      data = json.loads(response.body)
+      self.assertEqual(data['draw'], 3)
+      self.assertEqual(len(data['data']), data['recordsFiltered'])
+      for row in data['data']:
+        self.assertEqual(len(row), len(handler.COLUMNS), msg=handler.__name__)
+
+  def test_list_bed_counts_data(self):
+    icu_id = self.db.add_icu(self.admin_id, store.ICU(name='icu'))
+    self.db.update_bed_count_for_icu(
+      self.admin_id, store.BedCount(icu_id=icu_id, n_covid_occ=7)
+    )
+    handler = bedcounts.ListBedCountsDataHandler
+    args = {'draw': 1, 'start': 0, 'length': 10}
+    with mock.patch.object(base.BaseHandler, 'get_current_user') as m:
+      m.return_value = self.admin
+      response = self.fetch(f'{handler.ROUTE}?{urlencode(args)}')
+    self.assertEqual(response.code, 200)
+    data = json.loads(response.body)
+    self.assertEqual(len(data['data']), 1)
+    values = {item['key']: item['value'] for item in data['data'][0]}
+    self.assertEqual(values['ICU (update link)'], 'icu')
+    self.assertEqual(values['n_covid_occ'], '7')
+
+  def test_list_users_data(self):
+    for name in ['bob', 'alice', 'carol']:
+      self.db.add_user(store.User(name=name))
+    args = {
+      'draw': 1,
+      'start': 1,
+      'length': 2,
+      'order[0][column]': 0,
+      'order[0][dir]': 'desc',
+      'search[value]': '',
+    }
+    handler = users.ListUsersDataHandler
+    with mock.patch.object(base.BaseHandler, 'get_current_user') as m:
+      m.return_value = self.admin
+      response = self.fetch(f'{handler.ROUTE}?{urlencode(args)}')
+      self.assertEqual(response.code, 200)
+      data = json.loads(response.body)
+      self.assertEqual(data['recordsTotal'], 4)
+      self.assertEqual([row[0]['value'] for row in data['data']],
+                       ['bob', 'alice'])
+      self.assertIs(data['data'][0][1]['value'], False)
+
+      args['search[value]'] = 'CAR'
+      response = self.fetch(f'{handler.ROUTE}?{urlencode(args)}')
+      data = json.loads(response.body)
+      self.assertEqual(data['recordsFiltered'], 1)
+      self.assertEqual(data['data'], [])
+
+      # The icus column cannot be sorted.
+      args['order[0][column]'] = 4
+      response = self.fetch(f'{handler.ROUTE}?{urlencode(args)}')
+      self.assertEqual(response.code, 200)
+      args['order[0][column]'] = 40
+      response = self.fetch(f'{handler.ROUTE}?{urlencode(args)}')
+      self.assertEqual(response.code, 400)
+
   def test_operational_dashboard(self):
     handler = operational_dashboard.OperationalDashHandler
     with mock.patch.object(base.BaseHandler, 'get_current_user') as m:
@@ -80,6 +163,19 @@ class ServerTestCase(tornado.testing.AsyncHTTPTestCase):
       response = self.fetch(handler.ROUTE + '?region=1', method='GET')
       self.assertEqual(response.code, 200, msg=handler.__name__)
 
+  def test_map_not_modified(self):
+    handler = maps.MapDataHandler
+    with mock.patch.object(base.BaseHandler, 'get_current_user') as m:
+      m.return_value = self.user
+      response = self.fetch(handler.ROUTE)
+      self.assertEqual(response.code, 200)
+      headers = {'If-None-Match': response.headers['Etag']}
+      response = self.fetch(handler.ROUTE, headers=headers)
+      self.assertEqual(response.code, 304)
+      # Another level is another page.
+      response = self.fetch(handler.ROUTE + '?level=region', headers=headers)
+      self.assertEqual(response.code, 200)
+
   def test_consent_reset(self):
     handler = consent.ConsentResetHandler
     with mock.patch.object(base.BaseHandler, 'get_current_user') as m:
@@ -199,3 +295,29 @@ class ServerTestCase(tornado.testing.AsyncHTTPTestCase):
       # redirect to ListUserHandler
       self.assertEqual(response.code, 302)
       self.assertIsNotNone(self.db.get_user_by_email(data['email']))
+
+  def test_profiles(self):
+    directory = tempfile.TemporaryDirectory()
+    self.addCleanup(directory.cleanup)
+    self.config.profiling.dir = directory.name
+    profiler = profiling.Profiler(directory.name, 'www', sample_rate=100)
+    profiler.save(cProfile.Profile(), '/update', 0.2)
+    name = profiling.list_profiles(directory.name)[0].name
+
+    with mock.patch.object(base.BaseHandler, 'get_current_user') as m:
+      m.return_value = self.admin
+      response = self.fetch(profiles.ListProfilesHandler.ROUTE)
+      self.assertEqual(response.code, 200)
+      self.assertIn(name, response.body.decode())
+
+      response = self.fetch(
+        f'{profiles.DownloadProfileHandler.ROUTE}?name={name}'
+      )
+      self.assertEqual(response.code, 200)
+      self.assertIn('attachment', response.headers['Content-Disposition'])
+      self.assertGreater(len(response.body), 0)
+
+      response = self.fetch(
+        f'{profiles.DownloadProfileHandler.ROUTE}?name=../{name}'
+      )
+      self.assertEqual(response.code, 404)
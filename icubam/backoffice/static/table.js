@@ -29,3 +29,50 @@ function setDatatable (table_id, columns, language_url) {
     }
   })
 }
+
+
+function escapeHtml (text) {
+  return $('<div>').text(text).html()
+}
+
+
+// Renders an item of a row the same way list.html does.
+function renderItem (item) {
+  if (item.link) {
+    return `<a href="${escapeHtml(item.link)}">${escapeHtml(item.value)}</a>`
+  }
+  if (item.value === true) {
+    return '<i class="fas fa-check text-success"></i>'
+  }
+  if (item.value === false) {
+    return '<i class="fas fa-times text-danger"></i>'
+  }
+  let result = escapeHtml(item.value)
+  if (item.warning) {
+    result += " <i class='fas fa-exclamation-triangle text-danger'></i>"
+  }
+  return result
+}
+
+
+// The rows are fetched page by page from the data_route, which sorts and
+// searches them.
+function setServerDatatable (table_id, orderable, language_url, data_route) {
+  let table = $(table_id).DataTable({
+    responsive: true,
+    autoWidth: false,
+    serverSide: true,
+    processing: true,
+    searchDelay: 400,
+    ajax: data_route,
+    order: [[0, 'asc']],
+    columns: orderable.map((x, i) => ({
+      data: i,
+      orderable: x,
+      render: (data, type) => type == 'display' ? renderItem(data) : data.value
+    })),
+    language: {
+      url: language_url
+    }
+  })
+}
@@ -1,9 +1,11 @@
 from absl import logging
 import datetime
+import hmac
 import os.path
 import tornado.ioloop
 import tornado.web
-from icubam.db import store
+from icubam import metrics
+from icubam.db import snapshot, store
 
 
 class HealthHandler(tornado.web.RequestHandler):
@@ -16,6 +18,40 @@ class HealthHandler(tornado.web.RequestHandler):
     return self.write("{0:%Y/%m/%d %H:%M:%S}".format(self.start_time))
 
 
+class MetricsHandler(tornado.web.RequestHandler):
+  """Exports the metrics of the process, in the Prometheus text format.
+
+  Only local requests, or the ones bearing the METRICS_TOKEN when it is set,
+  may read them.
+  """
+  ROUTE = '/metrics'
+  # Behind a reverse proxy on the same host, all the requests come from
+  # these: the ones it forwards, with one of PROXY_HEADERS, are not local.
+  LOCAL_IPS = ('127.0.0.1', '::1')
+  PROXY_HEADERS = ('X-Forwarded-For', 'X-Real-Ip')
+
+  def initialize(self, token=None):
+    self.token = token
+
+  def is_local(self):
+    headers = self.request.headers
+    return self.request.remote_ip in self.LOCAL_IPS and not any(
+      header in headers for header in self.PROXY_HEADERS
+    )
+
+  def has_token(self):
+    authorization = self.request.headers.get('Authorization', '')
+    return bool(self.token) and hmac.compare_digest(
+      authorization.encode(), f'Bearer {self.token}'.encode()
+    )
+
+  def get(self):
+    if not self.is_local() and not self.has_token():
+      raise tornado.web.HTTPError(403)
+    self.set_header('Content-Type', metrics.CONTENT_TYPE)
+    return self.write(metrics.REGISTRY.render())
+
+
 class BaseServer:
   """Base class for ICUBAM servers."""
   def __init__(self, config, port, root=''):
@@ -24,9 +60,15 @@ class BaseServer:
     self.root = root
     self.routes = []
     self.db_factory = store.create_store_factory_for_sqlite_db(self.config)
+    self.snapshot = snapshot.SnapshotRefresher(self.config)
     self.routes = []
     self.start_time = datetime.datetime.utcnow()
     self.add_handler(HealthHandler, start_time=self.start_time)
+    self.add_handler(MetricsHandler, token=config.METRICS_TOKEN)
+    metrics.START_TIME.set(
+      self.start_time.replace(tzinfo=datetime.timezone.utc).timestamp(),
+      server=self.__class__.__name__
+    )
     self.callbacks = []
 
   def add_handler(self, handler, **kwargs):
@@ -39,7 +81,9 @@ class BaseServer:
     )
 
   def make_app(self) -> tornado.web.Application:
-    return tornado.web.Application(self.routes)
+    return tornado.web.Application(
+      self.routes, log_function=metrics.log_request
+    )
 
   def run(self):
     logging.info(
@@ -47,6 +91,7 @@ class BaseServer:
     )
     app = self.make_app()
     app.listen(self.port)
+    self.snapshot.register(tornado.ioloop)
     io_loop = tornado.ioloop.IOLoop.current()
     for callback_obj in self.callbacks:
       io_loop.spawn_callback(callback_obj)
@@ -0,0 +1,80 @@
+import collections
+import time
+from typing import Any, Callable, Hashable, Optional
+
+
+class TTLCache:
+  """A small in-memory cache whose entries expire after ttl seconds.
+
+  If max_size is set, the least recently used entries are evicted first.
+  The cache also counts its hits and misses for monitoring purposes, and
+  keeps the version of the data it caches, see sync.
+  """
+  def __init__(self, ttl: float, max_size: Optional[int] = None):
+    self.ttl = ttl
+    self.max_size = max_size
+    self.hits = 0
+    self.misses = 0
+    self.version: Optional[Hashable] = None
+    # Timestamp of the last sync.
+    self.synced = 0.0
+    # Keys: the cache keys, values: tuples (value, insertion timestamp).
+    self._data: collections.OrderedDict = collections.OrderedDict()
+
+  def __len__(self):
+    return len(self._data)
+
+  def __contains__(self, key: Hashable) -> bool:
+    return self.get(key, count=False) is not None
+
+  @property
+  def is_on(self) -> bool:
+    return self.ttl is not None and self.ttl > 0
+
+  @property
+  def hit_ratio(self) -> float:
+    total = self.hits + self.misses
+    return self.hits / total if total > 0 else 0.0
+
+  def get(self, key: Hashable, count: bool = True) -> Optional[Any]:
+    """Returns the value for the key or None if missing or expired."""
+    entry = self._data.get(key, None)
+    if entry is not None and time.time() - entry[1] > self.ttl:
+      self._data.pop(key, None)
+      entry = None
+
+    if entry is None:
+      self.misses += int(count)
+      return None
+
+    self.hits += int(count)
+    self._data.move_to_end(key)
+    return entry[0]
+
+  def put(self, key: Hashable, value: Any):
+    if not self.is_on:
+      return
+    self._data[key] = (value, time.time())
+    self._data.move_to_end(key)
+    if self.max_size is not None:
+      while len(self._data) > self.max_size:
+        self._data.popitem(last=False)
+
+  def pop(self, key: Hashable):
+    self._data.pop(key, None)
+
+  def invalidate(self, predicate: Callable[[Any], bool]):
+    """Removes all the entries whose value matches the predicate."""
+    to_remove = [k for k, (v, _) in self._data.items() if predicate(v)]
+    for key in to_remove:
+      self._data.pop(key, None)
+
+  def clear(self):
+    self._data.clear()
+
+  def sync(self, version: Hashable, now: Optional[float] = None):
+    """Clears the cache if the data it caches is now at another version."""
+    if version != self.version:
+      self.clear()
+      self.version = version
+    self.synced = time.time() if now is None else now
@@ -0,0 +1,62 @@
+from absl.testing import absltest
+from unittest import mock
+
+from icubam import cache
+
+
+class TTLCacheTest(absltest.TestCase):
+  @mock.patch('time.time')
+  def test_expiration(self, now):
+    now.return_value = 1000
+    ttl_cache = cache.TTLCache(ttl=10)
+    ttl_cache.put('a', 1)
+    self.assertEqual(ttl_cache.get('a'), 1)
+    now.return_value = 1011
+    self.assertIsNone(ttl_cache.get('a'))
+    self.assertEqual(len(ttl_cache), 0)
+    self.assertEqual(ttl_cache.hits, 1)
+    self.assertEqual(ttl_cache.misses, 1)
+    self.assertEqual(ttl_cache.hit_ratio, 0.5)
+
+  def test_max_size(self):
+    ttl_cache = cache.TTLCache(ttl=10, max_size=2)
+    ttl_cache.put('a', 1)
+    ttl_cache.put('b', 2)
+    # Reading a makes b the least recently used.
+    ttl_cache.get('a')
+    ttl_cache.put('c', 3)
+    self.assertIn('a', ttl_cache)
+    self.assertNotIn('b', ttl_cache)
+    self.assertIn('c', ttl_cache)
+
+  def test_invalidate(self):
+    ttl_cache = cache.TTLCache(ttl=10)
+    for i in range(5):
+      ttl_cache.put(i, i)
+    ttl_cache.invalidate(lambda v: v % 2 == 0)
+    self.assertEqual(len(ttl_cache), 2)
+    ttl_cache.pop(1)
+    self.assertNotIn(1, ttl_cache)
+    ttl_cache.clear()
+    self.assertEqual(len(ttl_cache), 0)
+
+  def test_sync(self):
+    ttl_cache = cache.TTLCache(ttl=10)
+    ttl_cache.sync(1, now=5)
+    ttl_cache.put('a', 1)
+    ttl_cache.sync(1)
+    self.assertIn('a', ttl_cache)
+    self.assertGreater(ttl_cache.synced, 5)
+    ttl_cache.sync(2)
+    self.assertNotIn('a', ttl_cache)
+    self.assertEqual(ttl_cache.version, 2)
+
+  def test_off(self):
+    ttl_cache = cache.TTLCache(ttl=0)
+    self.assertFalse(ttl_cache.is_on)
+    ttl_cache.put('a', 1)
+    self.assertIsNone(ttl_cache.get('a'))
+
+
+if __name__ == '__main__':
+  absltest.main()
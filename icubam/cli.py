@@ -1,37 +1,45 @@
 from absl import logging
+import importlib
 import multiprocessing as mp
 
-from icubam.analytics import server as analytics_server
-from icubam.backoffice import server as backoffice_server
-from icubam.messaging import server as msg_server
-from icubam.www import server as www_server
+# The servers are only imported when run, so that each process loads the
+# dependencies of its own server only.
+SERVERS = {
+  'www': ('icubam.www.server', 'WWWServer'),
+  'message': ('icubam.messaging.server', 'MessageServer'),
+  'backoffice': ('icubam.backoffice.server', 'BackOfficeServer'),
+  'analytics': ('icubam.analytics.server', 'AnalyticsServer'),
+}
 
 
-def run_one_server(cls, cfg, port=None):
+def get_server_class(server: str):
+  module, name = SERVERS[server]
+  return getattr(importlib.import_module(module), name)
+
+
+def run_one_server(server, cfg, port=None, **kwargs):
   logging.set_verbosity(logging.INFO)
-  cls(cfg, port).run()
+  get_server_class(server)(cfg, port, **kwargs).run()
 
 
-def run_server(cfg, server="www", port=None):
+def run_server(cfg, server="www", port=None, workers=None):
   """Start ICUBAM web-services
-  
+
+  Args:
+    workers: number of processes serving the www server, see WWWServer.
+
   Returns:
     list of started processes if server=="all", None otherwise
-  
+
   """
-  servers = {
-    'www': www_server.WWWServer,
-    'message': msg_server.MessageServer,
-    'backoffice': backoffice_server.BackOfficeServer,
-    'analytics': analytics_server.AnalyticsServer,
-  }
-  service = servers.get(server, None)
-  if service is not None:
-    run_one_server(service, cfg, port)
+  kwargs = {name: {} for name in SERVERS}
+  kwargs['www'] = {'workers': workers}
+  if server in SERVERS:
+    run_one_server(server, cfg, port, **kwargs[server])
   elif server == 'all':
     processes = [
-      mp.Process(target=run_one_server, args=(cls, cfg))
-      for cls in servers.values()
+      mp.Process(target=run_one_server, args=(name, cfg), kwargs=kwargs[name])
+      for name in SERVERS
     ]
     for p in processes:
       p.start()
@@ -0,0 +1,207 @@
+"""Compression of the responses and caching of the static files."""
+import gzip
+import mimetypes
+import os.path
+from typing import Dict, Iterable, List, Optional, Set
+
+import tornado.web
+from absl import logging
+
+# The precompressed variants of the static files, by order of preference.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+# Static files which are worth compressing.
+EXTENSIONS = ('.css', '.js', '.html', '.json', '.svg', '.map', '.txt')
+MIN_SIZE = 1024  # in bytes, smaller files are not compressed.
+
+
+def get_brotli():
+  """Returns the brotli module if installed, None otherwise."""
+  try:
+    import brotli
+    return brotli
+  except ImportError:
+    return None
+
+
+def accepted_encodings(request) -> Set[str]:
+  header = request.headers.get('Accept-Encoding', '')
+  return {e.split(';')[0].strip().lower() for e in header.split(',')}
+
+
+class ContentEncoding(tornado.web.GZipContentEncoding):
+  """Compresses the responses with brotli if accepted and installed, or gzip.
+
+  The brotli compression only happens if the brotli package is installed,
+  otherwise this is the usual tornado gzip compression.
+  """
+
+  BROTLI_QUALITY = 5
+
+  def __init__(self, request):
+    super().__init__(request)
+    brotli = get_brotli() if 'br' in accepted_encodings(request) else None
+    self._brotli = brotli
+    self._brotli_on = False
+
+  def transform_first_chunk(self, status_code, headers, chunk, finishing):
+    if self._brotli is None:
+      return super().transform_first_chunk(
+        status_code, headers, chunk, finishing
+      )
+
+    if 'Vary' in headers:
+      headers['Vary'] += ', Accept-Encoding'
+    else:
+      headers['Vary'] = 'Accept-Encoding'
+    ctype = headers.get('Content-Type', '').split(';')[0]
+    self._brotli_on = (
+      self._compressible_type(ctype) and
+      (not finishing or len(chunk) >= self.MIN_LENGTH) and
+      ('Content-Encoding' not in headers)
+    )
+    if self._brotli_on:
+      headers['Content-Encoding'] = 'br'
+      self._compressor = self._brotli.Compressor(quality=self.BROTLI_QUALITY)
+      chunk = self.transform_chunk(chunk, finishing)
+      if 'Content-Length' in headers:
+        if finishing:
+          headers['Content-Length'] = str(len(chunk))
+        else:
+          del headers['Content-Length']
+    return status_code, headers, chunk
+
+  def transform_chunk(self, chunk, finishing):
+    if self._brotli is None:
+      return super().transform_chunk(chunk, finishing)
+    if not self._brotli_on:
+      return chunk
+    result = self._compressor.process(chunk)
+    if finishing:
+      return result + self._compressor.finish()
+    return result + self._compressor.flush()
+
+
+def get_transforms(config) -> List:
+  """Returns the transforms of the applications, set by the config."""
+  if config.server.get('compress_response', True):
+    return [ContentEncoding]
+  return []
+
+
+class StaticFileHandler(tornado.web.StaticFileHandler):
+  """Serves the static files, precompressed if possible.
+
+  The .br or .gz variant of a file is served instead of it if it exists, is
+  not older than the file and the client accepts its encoding. Files
+  requested with a hash of their content (see static_url) never change, so
+  they are cached for a year. Others are revalidated on each use.
+  """
+
+  CACHE_TIME = 365 * 24 * 3600  # in seconds.
+
+  def initialize(self, path: str, default_filename: str = None) -> None:
+    super().initialize(path, default_filename=default_filename)
+    self.encoding = None
+
+  @property
+  def is_hashed(self) -> bool:
+    return 'v' in self.request.arguments
+
+  def validate_absolute_path(self, root: str,
+                             absolute_path: str) -> Optional[str]:
+    accepted = accepted_encodings(self.request)
+    for encoding, suffix in ENCODINGS:
+      if encoding in accepted and self.is_fresh(absolute_path, suffix):
+        self.encoding = encoding
+        absolute_path += suffix
+        break
+    return super().validate_absolute_path(root, absolute_path)
+
+  @staticmethod
+  def is_fresh(absolute_path: str, suffix: str) -> bool:
+    """Whether the variant of the file exists and is not older than it."""
+    try:
+      source = os.path.getmtime(absolute_path)
+      variant = os.path.getmtime(absolute_path + suffix)
+    except OSError:
+      return False
+    return variant >= source
+
+  def get_content_type(self) -> str:
+    if self.encoding is None:
+      return super().get_content_type()
+    path = os.path.splitext(self.absolute_path)[0]
+    mime_type, _ = mimetypes.guess_type(path)
+    return mime_type or 'application/octet-stream'
+
+  def get_cache_time(self, path, modified, mime_type) -> int:
+    return self.CACHE_TIME if self.is_hashed else 0
+
+  def set_extra_headers(self, path):
+    self.set_header('Vary', 'Accept-Encoding')
+    if self.encoding is not None:
+      self.set_header('Content-Encoding', self.encoding)
+    if self.is_hashed:
+      self.set_header(
+        'Cache-Control', f'public, max-age={self.CACHE_TIME}, immutable'
+      )
+    else:
+      self.set_header('Cache-Control', 'no-cache')
+
+
+def static_url(folders: Dict[str, str], url: str) -> str:
+  """Returns the url of a static file with a hash of its content.
+
+  Args:
+   folders: the folders of the static files, by the prefix of their url.
+   url: the url of the static file, starting with one of those prefixes.
+  """
+  for prefix, folder in folders.items():
+    if url.startswith(prefix):
+      settings = {'static_path': folder, 'static_url_prefix': prefix}
+      return StaticFileHandler.make_static_url(settings, url[len(prefix):])
+  raise ValueError(f'No static folder for {url}')
+
+
+def precompress(
+  folder: str,
+  extensions: Iterable[str] = EXTENSIONS,
+  min_size: int = MIN_SIZE
+) -> int:
+  """Writes the .gz (and .br) variants of the static files of the folder.
+
+  Variants newer than their file are kept as is. Returns the number of
+  variants written.
+  """
+  brotli = get_brotli()
+  if brotli is None:
+    logging.warning('brotli is not installed, only writing .gz files.')
+  written = 0
+  for dirpath, _, filenames in os.walk(folder):
+    for filename in filenames:
+      path = os.path.join(dirpath, filename)
+      if (
+        not filename.endswith(tuple(extensions)) or
+        os.path.getsize(path) < min_size
+      ):
+        continue
+      with open(path, 'rb') as fp:
+        content = None
+        for encoding, suffix in ENCODINGS:
+          if encoding == 'br' and brotli is None:
+            continue
+          target = path + suffix
+          if (
+            os.path.exists(target) and
+            os.path.getmtime(target) >= os.path.getmtime(path)
+          ):
+            continue
+          content = fp.read() if content is None else content
+          if encoding == 'br':
+            compressed = brotli.compress(content)
+          else:
+            compressed = gzip.compress(content, mtime=0)
+          with open(target, 'wb') as out:
+            out.write(compressed)
+          written += 1
+  return written
@@ -0,0 +1,108 @@
+import gzip
+import os.path
+import tempfile
+
+import tornado.testing
+import tornado.web
+from absl.testing import absltest
+
+from icubam import compression
+
+CONTENT = 'function f() { return 1; }\n' * 100
+
+
+class PageHandler(tornado.web.RequestHandler):
+  def get(self):
+    self.set_header('Content-Type', 'text/html')
+    self.write('<p>icubam</p>' * 200)
+
+
+class CompressionTest(tornado.testing.AsyncHTTPTestCase):
+  def get_app(self):
+    self.folder = tempfile.TemporaryDirectory()
+    with open(os.path.join(self.folder.name, 'map.js'), 'w') as fp:
+      fp.write(CONTENT)
+    with open(os.path.join(self.folder.name, 'tiny.css'), 'w') as fp:
+      fp.write('p {}')
+    routes = [
+      ('/page', PageHandler),
+      (
+        '/static/(.*)', compression.StaticFileHandler, {
+          'path': self.folder.name
+        }
+      ),
+    ]
+    return tornado.web.Application(
+      routes, transforms=[compression.ContentEncoding]
+    )
+
+  def tearDown(self):
+    super().tearDown()
+    self.folder.cleanup()
+
+  def fetch(self, path, encoding='gzip', **kwargs):
+    return super().fetch(
+      path,
+      headers={'Accept-Encoding': encoding},
+      decompress_response=False,
+      **kwargs
+    )
+
+  def test_compress_response(self):
+    response = self.fetch('/page')
+    self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+    self.assertEqual(gzip.decompress(response.body), b'<p>icubam</p>' * 200)
+
+    response = self.fetch('/page', encoding='identity')
+    self.assertNotIn('Content-Encoding', response.headers)
+
+  def test_precompress(self):
+    self.assertEqual(compression.precompress(self.folder.name), 1)
+    path = os.path.join(self.folder.name, 'map.js')
+    with open(path + '.gz', 'rb') as fp:
+      self.assertEqual(gzip.decompress(fp.read()).decode(), CONTENT)
+    self.assertFalse(os.path.exists(path + '.br'))
+    self.assertFalse(os.path.exists(path + '.gz.gz'))
+    # Up to date.
+    self.assertEqual(compression.precompress(self.folder.name), 0)
+
+  def test_serve_precompressed(self):
+    compression.precompress(self.folder.name)
+    response = self.fetch('/static/map.js')
+    self.assertEqual(response.code, 200)
+    self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+    self.assertIn('javascript', response.headers['Content-Type'])
+    self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+    self.assertEqual(gzip.decompress(response.body).decode(), CONTENT)
+
+    response = self.fetch('/static/map.js', encoding='identity')
+    self.assertNotIn('Content-Encoding', response.headers)
+    self.assertEqual(response.body.decode(), CONTENT)
+
+  def test_stale_precompressed(self):
+    compression.precompress(self.folder.name)
+    path = os.path.join(self.folder.name, 'map.js')
+    with open(path, 'w') as fp:
+      fp.write('var updated;\n')
+    mtime = os.path.getmtime(path + '.gz')
+    os.utime(path, (mtime + 10, mtime + 10))
+    response = self.fetch('/static/map.js')
+    self.assertEqual(response.code, 200)
+    body = response.body
+    if response.headers.get('Content-Encoding', None) == 'gzip':
+      body = gzip.decompress(body)
+    self.assertEqual(body.decode(), 'var updated;\n')
+
+  def test_static_url(self):
+    url = compression.static_url({'/static/': self.folder.name},
+                                 '/static/map.js')
+    self.assertTrue(url.startswith('/static/map.js?v='))
+    response = self.fetch(url)
+    self.assertEqual(response.code, 200)
+    self.assertIn('immutable', response.headers['Cache-Control'])
+    with self.assertRaises(ValueError):
+      compression.static_url({'/static/': self.folder.name}, '/other/map.js')
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -22,7 +22,7 @@ class Config:
     'SMS_KEY', 'SECRET_COOKIE', 'JWT_SECRET', 'GOOGLE_API_KEY', 'MB_KEY',
     'NX_KEY', 'NX_API', 'TW_KEY', 'TW_API', 'DB_SALT', 'SMTP_HOST',
     'SMTP_USER', 'SMTP_PASSWORD', 'EMAIL_FROM', 'SENTRY_URL', 'SENTRY_ENV',
-    'TELEGRAM_API_KEY'
+    'TELEGRAM_API_KEY', 'METRICS_TOKEN'
   ]
 
   def __init__(self, toml_config, env_path=None):
@@ -1,4 +1,13 @@
-from icubam.db.store import BedCount, ICU, Region, User
+import dataclasses
+import datetime
+import itertools
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+from icubam.db.store import (
+  AccessTypes, BedCount, ExternalClient, ICU, Region, User
+)
 
 
 def populate_store_fake(store):
@@ -90,3 +99,178 @@ def populate_store_fake(store):
     admin_user_id, icu_id,
     User(name='user1', telephone='+336666666', description='desc1')
   )
+
+
+# The columns of the bed counts generated by epidemic_bed_counts.
+BED_COUNT_COLUMNS = (
+  'icu_id', 'create_date', 'n_covid_occ', 'n_covid_free', 'n_ncovid_occ',
+  'n_ncovid_free', 'n_covid_deaths', 'n_covid_healed', 'n_covid_refused',
+  'n_covid_transfered'
+)
+
+
+@dataclasses.dataclass
+class NationalData:
+  """What populate_store_national created, to reach it afterwards."""
+  admin_user_id: int
+  num_bed_counts: int = 0
+  # The access keys of the external clients, by client name.
+  access_keys: Dict[str, str] = dataclasses.field(default_factory=dict)
+
+
+def epidemic_bed_counts(
+  rng: np.random.Generator,
+  icu_id: int,
+  dates: np.ndarray,
+  peak: float,
+  width: float,
+  intensity: float,
+  stay: float = 10.0
+) -> Iterator[Tuple]:
+  """Returns the bed counts of an ICU through an epidemic wave.
+
+  The covid occupancy follows a gaussian wave over the days, centered on the
+  `peak` day, of `width` days and reaching `intensity` of the beds. The
+  patients stay `stay` days on average, then die, are healed or transfered,
+  and the patients coming when the ICU is almost full are refused. The bed
+  counts are tuples of the BED_COUNT_COLUMNS values.
+
+  Args:
+   rng: the random generator.
+   icu_id: the id of the ICU of the bed counts.
+   dates: the dates of the bed counts, as datetime64 sorted in time.
+   peak: the day of the peak, since the first date.
+   width: the width of the wave, in days.
+   intensity: the part of the covid beds occupied at the peak.
+   stay: the average length of stay, in days.
+  """
+  days = (dates - dates[0]) / np.timedelta64(1, 'D')
+  beds = rng.integers(8, 40)
+  wave = intensity * np.exp(-0.5 * ((days - peak) / width) ** 2)
+  noise = rng.normal(0, 0.05, len(days))
+  occ = np.clip(np.rint(beds * (wave + noise)), 0, beds).astype(int)
+  # The discharges between two bed counts, by outcome.
+  elapsed = np.diff(days, prepend=days[0])
+  discharged = occ * elapsed / stay
+  deaths = np.floor(np.cumsum(discharged * 0.2)).astype(int)
+  transfered = np.floor(np.cumsum(discharged * 0.1)).astype(int)
+  healed = np.floor(np.cumsum(discharged * 0.7)).astype(int)
+  refused = np.cumsum(rng.poisson(np.where(occ >= 0.9 * beds, 0.5, 0)))
+  ncovid_beds = rng.integers(2, 12)
+  ncovid_occ = rng.binomial(ncovid_beds, 0.7, len(days))
+  return zip(
+    itertools.repeat(icu_id, len(days)),
+    dates.tolist(),
+    occ.tolist(),
+    (beds - occ).tolist(),
+    ncovid_occ.tolist(),
+    (ncovid_beds - ncovid_occ).tolist(),
+    deaths.tolist(),
+    healed.tolist(),
+    refused.tolist(),
+    transfered.tolist(),
+  )
+
+
+def populate_store_national(
+  store,
+  num_regions: int = 13,
+  icus_per_region: int = 20,
+  users_per_icu: int = 2,
+  num_clients: int = 0,
+  days: int = 30,
+  counts_per_day: int = 2,
+  seed: int = 0,
+  now: Optional[datetime.datetime] = None
+) -> NationalData:
+  """Populates a store with fake data at the scale of a country.
+
+  Each of the regions has ICUs of a few departments, each with its users and
+  their tokens. The ICUs have `counts_per_day` bed counts a day over the
+  `days` days before `now`, going through the epidemic wave of their region
+  (see epidemic_bed_counts), and are bulk inserted. The external clients
+  have access to a few regions each. The data only depends on the seed (and
+  `now`).
+  """
+  rng = np.random.default_rng(seed)
+  now = datetime.datetime.utcnow() if now is None else now
+  admin_user_id = store.add_user(
+    User(
+      name='admin',
+      email='admin@test.org',
+      is_admin=True,
+      password_hash=store.get_password_hash('password')
+    )
+  )
+  result = NationalData(admin_user_id)
+
+  num_counts = days * counts_per_day
+  step = 24 * 3600 // max(counts_per_day, 1)
+  start = np.datetime64(now - datetime.timedelta(days=days), 's')
+  user_icu_ids = []
+  waves = []
+  region_ids = []
+  for r in range(num_regions):
+    region_id = store.add_region(admin_user_id, Region(name=f'Region {r}'))
+    region_ids.append(region_id)
+    lat, long = rng.uniform(43, 50), rng.uniform(-1, 7)
+    # The waves of the regions are a few days apart.
+    peak = days * rng.uniform(0.3, 0.6)
+    width = max(days, 1) * rng.uniform(0.1, 0.2)
+    intensity = rng.uniform(0.5, 1.0)
+    for i in range(icus_per_region):
+      icu_id = store.add_icu(
+        admin_user_id,
+        ICU(
+          name=f'ICU {r}-{i}',
+          region_id=region_id,
+          dept=f'{(3 * r + i % 3) % 95 + 1:02d}',
+          city=f'City {r}-{i % 3}',
+          lat=lat + rng.uniform(-0.5, 0.5),
+          long=long + rng.uniform(-0.5, 0.5),
+          telephone=f'+331{r:02d}{i:04d}'
+        )
+      )
+      users = [
+        User(
+          name=f'user {r}-{i}-{u}',
+          telephone=f'+336{r:02d}{i:04d}{u:02d}',
+          is_active=True,
+          consent=True
+        ) for u in range(users_per_icu)
+      ]
+      user_ids = store.add_users_to_icu(admin_user_id, icu_id, users)
+      user_icu_ids.extend((user_id, icu_id) for user_id in user_ids)
+      # Bed counts come a bit after the regular times.
+      jitter = rng.integers(0, max(step // 2, 1), num_counts)
+      seconds = step * np.arange(num_counts) + jitter
+      dates = start + seconds.astype('timedelta64[s]')
+      waves.append((icu_id, dates, peak, width, intensity))
+  store.get_or_new_tokens(user_icu_ids)
+
+  def bed_counts():
+    for wave in waves:
+      yield from epidemic_bed_counts(rng, *wave)
+
+  result.num_bed_counts = store.add_bed_counts(
+    admin_user_id, BED_COUNT_COLUMNS, bed_counts()
+  )
+
+  access_types = list(AccessTypes)
+  for c in range(num_clients):
+    name = f'client {c}'
+    client_id, access_key = store.add_external_client(
+      admin_user_id,
+      ExternalClient(
+        name=name,
+        email=f'client{c}@test.org',
+        access_type=access_types[c % len(access_types)]
+      )
+    )
+    size = rng.integers(1, len(region_ids) + 1)
+    for region_id in rng.choice(region_ids, size, replace=False).tolist():
+      store.assign_external_client_to_region(
+        admin_user_id, client_id, region_id
+      )
+    result.access_keys[name] = access_key.key
+  return result
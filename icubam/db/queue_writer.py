@@ -1,4 +1,7 @@
 from absl import logging  # noqa: F401
+import tornado.ioloop
+
+from icubam import metrics
 from icubam.db import store
 
 
@@ -7,15 +10,53 @@ class QueueWriter:
   def __init__(self, queue, db_factory):
     self.queue = queue
     self.db = db_factory.create()
+    metrics.watch_queue('bed_counts', queue)
+
+  def write(self, item):
+    user_id = item.pop('user_id', None)
+    if user_id is None:
+      logging.error("No user in request")
+      return
+
+    self.db.update_bed_count_for_icu(user_id, store.BedCount(**item))
 
   async def process(self):
     async for item in self.queue:
       try:
-        user_id = item.pop('user_id', None)
-        if user_id is None:
-          logging.error("No user in request")
-          return
+        self.write(item)
+      finally:
+        self.queue.task_done()
+
+
+class ProcessQueueWriter(QueueWriter):
+  """Writes the data sent by several processes through a multiprocessing queue.
+
+  There is a single writer process, so that the bed counts are written in the
+  order they are received. The queue is read in an executor, not to block the
+  IOLoop of the writer process.
+  """
+  async def process(self):
+    io_loop = tornado.ioloop.IOLoop.current()
+    while True:
+      item = await io_loop.run_in_executor(None, self.queue.get)
+      if item is None:
+        return
+      try:
+        self.write(item)
+      except Exception as e:
+        logging.error(f"Could not write {item}: {e}")
+
+
+class QueueForwarder:
+  """Forwards the data of a worker process to the writer process."""
+  def __init__(self, queue, process_queue):
+    self.queue = queue
+    self.process_queue = process_queue
+    metrics.watch_queue('bed_counts', queue)
 
-        self.db.update_bed_count_for_icu(user_id, store.BedCount(**item))
+  async def process(self):
+    async for item in self.queue:
+      try:
+        self.process_queue.put(item)
       finally:
         self.queue.task_done()
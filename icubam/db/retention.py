@@ -0,0 +1,68 @@
+"""Retention of the bed counts history: compaction and archival.
+
+The bed counts older than `db.retention_days` days are compacted to the last
+one of each burst of updates of an ICU (see Store.compact_bed_counts). The
+deleted rows are first archived as compressed Parquet files in
+`db.archive_dir`, so that the raw history stays reproducible.
+"""
+import datetime
+import os.path
+from typing import List, Optional, Sequence
+
+from absl import logging
+
+COMPRESSION = 'gzip'
+INTERVAL = datetime.timedelta(minutes=15)
+
+
+class Archiver:
+  """Writes the archived bed counts to a new file of a directory per call.
+
+  The files are Parquet files, written by pyarrow, and gzipped CSV files if
+  they cannot be written, e.g. without a Parquet engine installed.
+  """
+  def __init__(self, directory: str):
+    self.directory = directory
+    self.paths: List[str] = []
+
+  def __call__(self, columns: Sequence[str], rows: List[tuple]):
+    import pandas as pd
+
+    os.makedirs(self.directory, exist_ok=True)
+    df = pd.DataFrame.from_records(rows, columns=columns)
+    prefix = os.path.join(
+      self.directory,
+      'bed_counts-{:%Y%m%dT%H%M%S}'.format(datetime.datetime.utcnow())
+    )
+    path = f'{prefix}.parquet'
+    try:
+      df.to_parquet(path, compression=COMPRESSION, index=False)
+    except Exception as e:
+      logging.warning(f'Cannot write {path}, archiving as CSV: {e}')
+      if os.path.exists(path):
+        os.remove(path)
+      path = f'{prefix}.csv.gz'
+      df.to_csv(path, compression=COMPRESSION, index=False)
+    logging.info(f'Archived {len(df)} bed counts to {path}')
+    self.paths.append(path)
+
+
+def compact_bed_counts(
+  store,
+  admin_user_id: int,
+  max_age: datetime.timedelta,
+  archive_dir: Optional[str],
+  now: Optional[datetime.datetime] = None
+) -> int:
+  """Compacts the bed counts older than max_age, archived in archive_dir.
+
+  Returns:
+   The number of deleted bed counts.
+  """
+  now = datetime.datetime.utcnow() if now is None else now
+  archive = Archiver(archive_dir) if archive_dir else None
+  count = store.compact_bed_counts(
+    admin_user_id, now - max_age, interval=INTERVAL, archive=archive
+  )
+  logging.info(f'Deleted {count} superseded bed counts older than {max_age}.')
+  return count
@@ -0,0 +1,58 @@
+import numbers
+import os.path
+import time
+import tornado.ioloop
+from absl import logging
+
+from icubam.db import store
+
+
+class SnapshotRefresher:
+  """Periodically refreshes the SQLite snapshot used for read-only queries.
+
+  Several servers may share the same snapshot: the snapshot is only copied
+  again if it is older than the refresh period, so that concurrent servers do
+  not refresh it more than needed.
+  """
+  def __init__(self, config):
+    self.config = config
+    self.src = config.db.sqlite_path
+    self.dst = config.db.snapshot_path
+    if not isinstance(self.dst, str) or isinstance(config.db.replica_url, str):
+      self.dst = None
+
+    self.frequency = config.db.snapshot_every
+    if not isinstance(self.frequency, numbers.Number) or self.frequency <= 0:
+      self.frequency = None
+
+  @property
+  def is_valid(self):
+    return self.frequency is not None and self.dst is not None
+
+  def is_stale(self, now=None) -> bool:
+    if not os.path.exists(self.dst):
+      return True
+    now = time.time() if now is None else now
+    return now - os.path.getmtime(self.dst) >= self.frequency
+
+  async def refresh(self, force=False):
+    if not force and not self.is_stale():
+      return
+    logging.info(f'Refreshing DB snapshot {self.dst}')
+    io_loop = tornado.ioloop.IOLoop.current()
+    try:
+      await io_loop.run_in_executor(
+        None, store.refresh_sqlite_snapshot, self.src, self.dst
+      )
+    except Exception as e:
+      logging.error(f'Cannot refresh DB snapshot {self.dst}: {e}')
+
+  def register(self, ioloop) -> None:
+    """Registers a callback to refresh the snapshot."""
+    if not self.is_valid:
+      return
+
+    logging.info(
+      f"Registering periodic callback: refresh snapshot /{self.frequency}s"
+    )
+    ioloop.PeriodicCallback(self.refresh, self.frequency * 1000).start()
@@ -3,22 +3,32 @@
 import dataclasses
 import enum
 import hashlib
+import itertools
 import json
+import numbers
+import os.path
+import secrets
+import sqlite3
+import time
 import uuid
 from contextlib import contextmanager
-from datetime import datetime
-from typing import Any, Dict, Iterable, Optional, Tuple
+from datetime import date, datetime, timedelta
+from typing import (
+  Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+)
 
-import pandas as pd
 from absl import logging
 from sqlalchemy import (
-  Boolean, Column, DateTime, Enum, Float, ForeignKey, Integer, String, Table,
-  create_engine, desc, func
+  Boolean, Column, Date, DateTime, Enum, Float, ForeignKey, Index, Integer,
+  String, Table, create_engine, desc, event, func, inspect, or_
 )
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.orm import relationship, selectinload, sessionmaker
 from sqlalchemy.sql import text
 
+from icubam import cache, metrics, profiling
+
 
 class RawBase(object):
   """Base with helper methods."""
@@ -188,6 +198,52 @@ class BedCount(Base):
   # ICU of the bed count.
   icu = relationship("ICU", back_populates="bed_counts")
 
+  # To find the latest bed count of an ICU without scanning its history.
+  __table_args__ = (
+    Index("ix_bed_counts_icu_id_create_date", "icu_id", "create_date"),
+  )
+
+
+class DailyRollup(Base):
+  """Sums of the daily bed counts of the ICUs of a region and department.
+
+  They are derived from the preprocessed bed counts, see Dataset.
+  """
+  __tablename__ = "daily_rollups"
+
+  COLUMNS = (
+    "n_covid_occ", "n_covid_free", "n_ncovid_occ", "n_ncovid_free",
+    "n_covid_deaths", "n_covid_healed", "n_covid_refused", "n_covid_transfered"
+  )
+
+  rowid = Column(Integer, primary_key=True)
+  date = Column(Date)
+  region_id = Column(Integer, ForeignKey("regions.region_id"))
+  dept = Column(String)
+  # Preprocessing interpolates the missing days, hence floats.
+  n_covid_occ = Column(Float)
+  n_covid_free = Column(Float)
+  n_ncovid_occ = Column(Float)
+  n_ncovid_free = Column(Float)
+  n_covid_deaths = Column(Float)
+  n_covid_healed = Column(Float)
+  n_covid_refused = Column(Float)
+  n_covid_transfered = Column(Float)
+
+  last_modified = Column(DateTime, default=func.now(), onupdate=func.now())
+
+  region = relationship("Region")
+
+  __table_args__ = (
+    Index(
+      "ix_daily_rollups_date_region_id_dept",
+      "date",
+      "region_id",
+      "dept",
+      unique=True
+    ),
+  )
+
 
 class ICU(Base):
   """Represents an ICU."""
@@ -266,6 +322,84 @@ class ExternalClient(Base):
     )
 
 
+class CacheStamp(Base):
+  """Version of the data behind an in-memory cache, shared by the processes.
+
+  It is bumped on each invalidation, so that the caches of the other processes
+  are cleared as well, see Store.sync_cache. The daily rollups use the one of
+  Store.ROLLUPS_STAMP to keep the largest rowid of the bed counts they include.
+  """
+  __tablename__ = "cache_stamps"
+
+  name = Column(String, primary_key=True)
+  version = Column(Integer, nullable=False, default=0)
+
+
+@dataclasses.dataclass
+class ExternalClientProfile:
+  """What is needed to serve an authenticated external client.
+
+  Unlike ExternalClient, it is not bound to a session and can be cached.
+  """
+  external_client_id: int
+  name: Optional[str]
+  access_type: Optional[AccessTypes]
+  region_ids: List[int]
+  expiration_date: Optional[datetime]
+  is_active: bool
+
+  @classmethod
+  def from_client(cls, client: ExternalClient):
+    return cls(
+      client.external_client_id, client.name, client.access_type,
+      [r.region_id for r in client.regions], client.expiration_date,
+      client.is_active
+    )
+
+  @property
+  def access_key_valid(self):
+    """Returns true if the access key is valid."""
+    return (
+      (self.expiration_date is None or
+       self.expiration_date > datetime.now()) and self.is_active
+    )
+
+
+@dataclasses.dataclass
+class PageRequest:
+  """Which page of the results of a listing to return.
+
+  The results are sorted by the `order_by` column, then by primary key, and
+  only those containing `search` in one of their text columns are kept.
+  """
+  offset: int = 0
+  limit: Optional[int] = None
+  order_by: Optional[str] = None
+  descending: bool = False
+  search: Optional[str] = None
+
+
+@dataclasses.dataclass
+class Page:
+  """A page of the results of a listing."""
+  items: List[Any]
+  # Number of results before and after the search.
+  total: int
+  filtered: int
+
+
+@dataclasses.dataclass
+class DataVersion:
+  """A cheap summary of the bed counts and ICUs, which changes with them."""
+  max_rowid: Optional[int]
+  num_icus: int
+  last_modified: Optional[datetime]
+
+  @property
+  def key(self) -> Tuple:
+    return self.max_rowid, self.num_icus, self.last_modified
+
+
 @dataclasses.dataclass
 class AccessKey(object):
   """Access key together with its hash."""
@@ -273,24 +407,113 @@ class AccessKey(object):
   key_hash: str
 
 
+def _create_missing_indexes(engine):
+  """Creates the indexes added to existing tables, which create_all skips."""
+  inspector = inspect(engine)
+  for table in Base.metadata.sorted_tables:
+    existing = {index["name"] for index in inspector.get_indexes(table.name)}
+    for index in table.indexes:
+      if index.name not in existing:
+        logging.info(f"Creating index {index.name}")
+        index.create(engine)
+
+
+def _forbid_flush(session, flush_context, instances):
+  """Prevents any write going through a read-only session."""
+  raise ValueError("Cannot write through a read-only store.")
+
+
 class StoreFactory:
-  """Factory for creating stores."""
-  def __init__(self, engine, salt=""):
+  """Factory for creating stores.
+
+  Stores can be created against two engines: the main one, where all the
+  writes go, and an optional read engine (e.g. a replica or a periodically
+  refreshed snapshot of the database) for heavy read-only workloads such as
+  analytics and dashboards. If no read engine is given, readers use the main
+  engine.
+
+  All the stores of a factory share a cache of the successful token
+  authentications, that is invalidated by the stores when users, ICUs or
+  tokens change (see authenticator.Authenticator), and a bounded cache of the
+  authenticated external clients, invalidated when the clients change. The
+  invalidations reach the caches of the other processes through the shared
+  cache stamps, within STAMP_CHECK_PERIOD seconds (see Store.sync_cache).
+
+  The tables are created in the read engine too, unless create_read_tables is
+  false, e.g. for a read-only replica of the main database.
+
+  If slow_query_ms is set, the statements slower than that are logged.
+  """
+
+  AUTH_CACHE_TTL = 30
+  # In seconds, how long the caches are trusted without checking the stamps.
+  STAMP_CHECK_PERIOD = 1
+  CLIENT_CACHE_TTL = 300
+  CLIENT_CACHE_SIZE = 1024
+
+  def __init__(
+    self,
+    engine,
+    salt="",
+    read_engine=None,
+    create_read_tables=True,
+    auth_cache_ttl=AUTH_CACHE_TTL,
+    client_cache_ttl=CLIENT_CACHE_TTL,
+    slow_query_ms=0
+  ):
     if salt is None:
       logging.warning("DB_SALT is not defined. Falling back to default")
       salt = ""
 
     Base.metadata.create_all(engine)
+    _create_missing_indexes(engine)
+    self._engines = [engine]
+    metrics.instrument_engine(engine, 'main')
     self._session_factory = sessionmaker(bind=engine)
+    self._read_session_factory = self._session_factory
+    if read_engine is not None:
+      if create_read_tables:
+        Base.metadata.create_all(read_engine)
+      self._engines.append(read_engine)
+      metrics.instrument_engine(read_engine, 'read')
+      self._read_session_factory = sessionmaker(bind=read_engine)
+      event.listen(self._read_session_factory, "before_flush", _forbid_flush)
     self._salt = salt.encode()
+    self.auth_cache = cache.TTLCache(ttl=auth_cache_ttl)
+    self.client_cache = cache.TTLCache(
+      ttl=client_cache_ttl, max_size=self.CLIENT_CACHE_SIZE
+    )
+    metrics.watch_cache('auth', self.auth_cache)
+    metrics.watch_cache('api_clients', self.client_cache)
+    if slow_query_ms > 0:
+      for logged_engine in self._engines:
+        profiling.log_slow_queries(logged_engine, slow_query_ms)
+
+  @property
+  def has_read_engine(self) -> bool:
+    return self._read_session_factory is not self._session_factory
 
   def create(self):
-    return Store(self._session_factory(), self._salt)
+    return Store(
+      self._session_factory(), self._salt, self.auth_cache, self.client_cache
+    )
+
+  def create_reader(self):
+    """Returns a store for read-only use, bound to the read engine if any."""
+    return Store(
+      self._read_session_factory(), self._salt, self.auth_cache,
+      self.client_cache
+    )
+
+  def dispose(self):
+    """Drops the pooled connections, which must not be shared after a fork."""
+    for engine in self._engines:
+      engine.dispose()
 
 
 class Store(object):
   """Provides high level access to the data store."""
-  def __init__(self, session, salt):
+  def __init__(self, session, salt, auth_cache=None, client_cache=None):
     """Creates a store.
 
     The session will be closed when the store is destructed.
@@ -298,9 +521,21 @@ class Store(object):
     Args:
       session: a DB session.
       salt: salt used when creating hashes.
+      auth_cache: a cache.TTLCache of authenticated tokens. Its values must
+        have user_id and icu_id attributes.
+      client_cache: a cache.TTLCache of ExternalClientProfile.
     """
     self._session = session
     self._salt = salt
+    self.auth_cache = auth_cache
+    if self.auth_cache is None:
+      self.auth_cache = cache.TTLCache(ttl=StoreFactory.AUTH_CACHE_TTL)
+    self.client_cache = client_cache
+    if self.client_cache is None:
+      self.client_cache = cache.TTLCache(
+        ttl=StoreFactory.CLIENT_CACHE_TTL,
+        max_size=StoreFactory.CLIENT_CACHE_SIZE
+      )
 
   @contextmanager
   def _commit_or_rollback(self):
@@ -312,6 +547,53 @@ class Store(object):
       self._session.rollback()
       raise
 
+  AUTH_STAMP = "auth"
+  CLIENT_STAMP = "api_clients"
+  ROLLUPS_STAMP = "daily_rollups"
+
+  def _get_stamp(self, name: str) -> int:
+    version = self._session.query(CacheStamp.version
+                                  ).filter(CacheStamp.name == name).scalar()
+    return version or 0
+
+  def _bump_stamp(self, name: str):
+    """Bumps a cache stamp, which clears that cache in the other processes."""
+    def bump():
+      with self._commit_or_rollback():
+        updated = self._session.query(CacheStamp).filter(
+          CacheStamp.name == name
+        ).update({CacheStamp.version: CacheStamp.version + 1})
+        if not updated:
+          self._session.add(CacheStamp(name=name, version=1))
+
+    try:
+      bump()
+    except IntegrityError:
+      # Another process created the stamp first.
+      bump()
+
+  def sync_cache(self, cache_: cache.TTLCache, name: str):
+    """Clears the cache if its stamp was bumped since the last check.
+
+    The stamp is read at most every StoreFactory.STAMP_CHECK_PERIOD seconds.
+    """
+    now = time.time()
+    if not cache_.is_on or now - cache_.synced < StoreFactory.STAMP_CHECK_PERIOD:
+      return
+    cache_.sync(self._get_stamp(name), now)
+
+  def sync_auth_cache(self):
+    self.sync_cache(self.auth_cache, self.AUTH_STAMP)
+
+  def _invalidate_auth(self, user_id: int = None, icu_id: int = None):
+    """Drops the cached authentications of a user and/or an ICU."""
+    def match(entry):
+      return ((user_id is None or entry.user_id == user_id) and
+              (icu_id is None or entry.icu_id == icu_id))
+
+    self.auth_cache.invalidate(match)
+    self._bump_stamp(self.AUTH_STAMP)
+
   def is_admin(self, user_id: int) -> bool:
     """Returns true if the user with the specified ID is an admin."""
     user = self.get_user(user_id)
@@ -350,6 +632,8 @@ class Store(object):
       self._session.query(UserICUToken).filter(
         UserICUToken.token_id == token_id
       ).update(values)
+    self.auth_cache.clear()
+    self._bump_stamp(self.AUTH_STAMP)
 
   def renew_token(
     self, admin_user_id: Optional[int], user_id: int, icu_id: int
@@ -361,7 +645,59 @@ class Store(object):
     with self._commit_or_rollback():
       token = self.make_token(user_id, icu_id)
       self._get_token_query(user_id, icu_id).update({'token': token})
-      return token
+    self._invalidate_auth(user_id, icu_id)
+    return token
+
+  # Max number of user ids per query, below the SQLite limit of variables.
+  IDS_PER_QUERY = 500
+
+  def get_or_new_tokens(
+    self,
+    user_icu_ids: Iterable[Tuple[int, int]],
+    renew_before: Optional[datetime] = None
+  ) -> Dict[Tuple[int, int], str]:
+    """Returns the tokens of many (user_id, icu_id) pairs.
+
+    The tokens are loaded with one query per IDS_PER_QUERY users. The missing
+    tokens, and those last modified before renew_before if set, are created or
+    renewed in a single transaction.
+
+    Returns:
+      a dictionary from (user_id, icu_id) to token.
+    """
+    pairs = set(user_icu_ids)
+    user_ids = sorted({user_id for user_id, _ in pairs})
+    existing = {}
+    for start in range(0, len(user_ids), self.IDS_PER_QUERY):
+      chunk = user_ids[start:start + self.IDS_PER_QUERY]
+      query = self._session.query(UserICUToken).filter(
+        UserICUToken.user_id.in_(chunk)
+      )
+      for token in query:
+        key = token.user_id, token.icu_id
+        if key in pairs:
+          existing[key] = token
+
+    result = {}
+    renewed = set()
+    with self._commit_or_rollback():
+      for key in pairs:
+        token = existing.get(key, None)
+        if token is None:
+          token = UserICUToken(
+            user_id=key[0], icu_id=key[1], token=self.make_random_token()
+          )
+          self._session.add(token)
+        elif renew_before is not None and (
+          token.last_modified is None or token.last_modified < renew_before
+        ):
+          token.token = self.make_random_token()
+          renewed.add(key)
+        result[key] = token.token
+    if renewed:
+      self.auth_cache.invalidate(lambda e: (e.user_id, e.icu_id) in renewed)
+      self._bump_stamp(self.AUTH_STAMP)
+    return result
 
   def add_token(
     self, admin_user_id: Optional[int], user_icu_token: UserICUToken
@@ -442,6 +778,7 @@ class Store(object):
       raise ValueError("User does not own the ICU.")
     with self._commit_or_rollback():
       self._session.query(ICU).filter(ICU.icu_id == icu_id).update(values)
+    self._invalidate_auth(icu_id=icu_id)
 
   def manages_icu(self, user_id: int, icu_id: int) -> bool:
     """Returns true if the user manages the ICU with the specified ID."""
@@ -540,19 +877,59 @@ class Store(object):
     self.assign_user_to_icu(manager_user_id, user_id, icu_id)
     return user_id
 
+  def add_users_to_icu(
+    self, manager_user_id: int, icu_id: int, users: List[User]
+  ) -> List[int]:
+    """Adds new users to an ICU in a single transaction, e.g. on an import.
+
+    Returns:
+      IDs of the users.
+    """
+    if not self.manages_icu(manager_user_id, icu_id):
+      raise ValueError("User does not own the ICU.")
+    with self._commit_or_rollback():
+      self._session.add_all(users)
+      self._session.flush()
+      self._session.execute(
+        icu_users.insert(), [{
+          'user_id': user.user_id,
+          'icu_id': icu_id
+        } for user in users]
+      )
+    return [user.user_id for user in users]
+
   def get_user(self, user_id: int) -> Optional[User]:
     """Returns the user with the specified ID."""
     return self._session.query(User).filter(User.user_id == user_id
                                             ).one_or_none()
 
+  def get_users_by_ids(self, user_ids: Iterable[int]) -> List[User]:
+    """Returns the users with the specified IDs, one query per chunk of ids."""
+    user_ids = sorted(set(user_ids))
+    result = []
+    for start in range(0, len(user_ids), self.IDS_PER_QUERY):
+      chunk = user_ids[start:start + self.IDS_PER_QUERY]
+      result.extend(
+        self._session.query(User).filter(User.user_id.in_(chunk)).all()
+      )
+    return result
+
   def get_user_by_phone(self, phone: int):
     """Returns the user with the specified phone number."""
     return self._session.query(User).filter(User.telephone == phone
                                             ).one_or_none()
 
-  def get_users(self) -> Iterable[User]:
-    """Returns all users, e.g. sync. Do not use in user facing code."""
-    return self._session.query(User).all()
+  def get_users(self, with_icus: bool = False) -> Iterable[User]:
+    """Returns all users, e.g. sync. Do not use in user facing code.
+
+    Args:
+      with_icus: loads the ICUs of all the users in a single query as well,
+        rather than one query per user on first access.
+    """
+    query = self._session.query(User)
+    if with_icus:
+      query = query.options(selectinload(User.icus))
+    return query.all()
 
   def get_admins(self) -> Iterable[User]:
     """Returns all admins, e.g. sync. Do not use in user facing code."""
@@ -573,6 +950,7 @@ class Store(object):
       )
     with self._commit_or_rollback():
       self._session.query(User).filter(User.user_id == user_id).update(values)
+    self._invalidate_auth(user_id=user_id)
 
   def assign_user_to_icu(
     self, manager_user_id: int, user_id: int, icu_id: int
@@ -596,6 +974,7 @@ class Store(object):
         icu_users.delete().where(icu_users.c.user_id == user_id
                                  ).where(icu_users.c.icu_id == icu_id)
       )
+    self._invalidate_auth(user_id, icu_id)
 
   def enable_user(self, manager_user_id: int, user_id: int, is_active=True):
     """Enables the user with the specified ID."""
@@ -643,6 +1022,11 @@ class Store(object):
     token_hash = self.get_password_hash(json.dumps([user_id, icu_id, now_ts]))
     return token_hash[:UserICUToken.TOKEN_SIZE]
 
+  @staticmethod
+  def make_random_token() -> str:
+    """Same format as make_token, without the cost of hashing."""
+    return secrets.token_hex(UserICUToken.TOKEN_SIZE // 2)
+
   def auth_user(self, email: str, password: str) -> int:
     """Authenticates a user using email and password.
 
@@ -730,6 +1114,72 @@ class Store(object):
                                                   desc(BedCount.create_date)
                                                 ).first()
 
+  def get_last_modified_for_icus(
+    self, icu_ids: Iterable[int]
+  ) -> Dict[int, datetime]:
+    """Returns the last modification date of the latest bed count of the ICUs.
+
+    Same as get_bed_count_for_icu(icu_id).last_modified for each ICU, but in a
+    single query. ICUs without bed counts are not in the result.
+    """
+    session = self._session
+    sub = session.query(BedCount.rowid, BedCount.icu_id).filter(
+      BedCount.icu_id.in_(list(icu_ids))
+    ).order_by(desc(BedCount.create_date)).subquery()
+    latest = session.query(sub.c.rowid).group_by(sub.c.icu_id).subquery()
+    rows = session.query(BedCount.icu_id, BedCount.last_modified
+                         ).join(latest, latest.c.rowid == BedCount.rowid)
+    return {icu_id: last_modified for icu_id, last_modified in rows}
+
+  def get_data_version(
+    self, region_ids: Optional[Iterable[int]] = None
+  ) -> DataVersion:
+    """Returns the version of the data shown on maps and dashboards.
+
+    Only the bed counts and ICUs of the given regions are looked at, if any.
+    Bed counts are only added, so the largest rowid changes with each of them.
+    """
+    session = self._session
+    bed_counts = session.query(
+      func.max(BedCount.rowid), func.max(BedCount.last_modified)
+    )
+    icus = session.query(func.count(ICU.icu_id), func.max(ICU.last_modified))
+    if region_ids is not None:
+      region_ids = list(region_ids)
+      bed_counts = bed_counts.join(ICU, ICU.icu_id == BedCount.icu_id).filter(
+        ICU.region_id.in_(region_ids)
+      )
+      icus = icus.filter(ICU.region_id.in_(region_ids))
+    max_rowid, counts_modified = bed_counts.one()
+    num_icus, icus_modified = icus.one()
+    dates = [d for d in (counts_modified, icus_modified) if d is not None]
+    return DataVersion(max_rowid, num_icus, max(dates) if dates else None)
+
+  def get_bed_count_overview(
+    self, manager_user_id: int, request: PageRequest
+  ) -> Page:
+    """Returns a page of the active ICUs managed by the user, with their state.
+
+    The items are (ICU, latest BedCount or None, user_id or None) tuples,
+    where user_id is the one of the first user assigned to the ICU. They are
+    loaded in a single query, which only looks at the latest bed counts.
+    """
+    session = self._session
+    latest_rowid = session.query(BedCount.rowid).filter(
+      BedCount.icu_id == ICU.icu_id
+    ).order_by(desc(BedCount.create_date)).limit(1).correlate(ICU).as_scalar()
+    user_id = session.query(func.min(icu_users.c.user_id)
+                            ).filter(icu_users.c.icu_id == ICU.icu_id
+                                     ).correlate(ICU).as_scalar()
+    query = session.query(ICU, BedCount, user_id).outerjoin(
+      BedCount, BedCount.rowid == latest_rowid
+    ).filter(ICU.is_active == True)
+    if not self.is_admin(manager_user_id):
+      query = query.join(icu_managers).filter(
+        icu_managers.c.user_id == manager_user_id
+      )
+    return self._get_page(query, ICU, request, [ICU.name])
+
   def update_bed_count_for_icu(
     self, user_id: int, bed_count: BedCount, force=False
   ):
@@ -739,6 +1189,232 @@ class Store(object):
     self._session.add(bed_count)
     self._session.commit()
 
+  # Number of rows per statement of the bulk inserts.
+  BULK_SIZE = 10000
+
+  def add_bed_counts(
+    self, admin_user_id: int, columns: Sequence[str],
+    rows: Iterable[Sequence[Any]]
+  ) -> int:
+    """Inserts many bed counts at once, e.g. to import a history.
+
+    The rows are inserted in a single transaction, by batches of BULK_SIZE
+    rows straight through the database driver: the values are converted by
+    the column types, column by column, but nothing of the ORM nor of the
+    statement execution is run per row.
+
+    Args:
+      admin_user_id: ID of an admin user.
+      columns: the names of the columns of the bed_counts table in the rows.
+      rows: the values of the columns, for each bed count.
+
+    Returns:
+      The number of inserted bed counts.
+    """
+    if not self.is_admin(admin_user_id):
+      raise ValueError("Only admins can import bed counts.")
+    table = BedCount.__table__
+    columns = list(columns)
+    rows = iter(rows)
+    count = 0
+    with self._commit_or_rollback():
+      connection = self._session.connection()
+      dialect = connection.dialect
+      insert = table.insert().compile(dialect=dialect, column_keys=columns)
+      processors = [
+        (i, table.c[key].type.dialect_impl(dialect).bind_processor(dialect))
+        for i, key in enumerate(columns)
+      ]
+      processors = [(i, p) for i, p in processors if p is not None]
+      if insert.positional:
+        order = [columns.index(key) for key in insert.positiontup]
+        cursor = connection.connection.cursor()
+
+      while True:
+        batch = list(itertools.islice(rows, self.BULK_SIZE))
+        if not batch:
+          break
+        count += len(batch)
+        if not insert.positional:
+          connection.execute(
+            table.insert(), [dict(zip(columns, row)) for row in batch]
+          )
+          continue
+
+        values = list(zip(*batch))
+        for i, processor in processors:
+          values[i] = list(map(processor, values[i]))
+        cursor.executemany(insert.string, zip(*(values[i] for i in order)))
+    return count
+
+  # Number of rowids per IN clause, below the SQLite limit of variables.
+  IN_SIZE = 500
+
+  def compact_bed_counts(
+    self,
+    admin_user_id: int,
+    before: datetime,
+    interval: timedelta = timedelta(minutes=15),
+    archive: Optional[Callable[[Sequence[str], List[tuple]], None]] = None
+  ) -> int:
+    """Deletes the bed counts older than `before` superseded by a later one.
+
+    A bed count is superseded if the next one of its ICU comes at most
+    `interval` later. Only the last bed count of each burst of updates is
+    kept, as preprocessing.aggregate_multiple_inputs does, so the preprocessed
+    history is unchanged.
+
+    Args:
+      admin_user_id: ID of an admin user.
+      before: only the bed counts created before are deleted.
+      interval: the bed counts superseded within it are deleted.
+      archive: called with the names of the columns of the bed_counts table
+        and the rows to delete, before they are deleted. If it raises,
+        nothing is deleted. The rows can be imported again with
+        add_bed_counts.
+
+    Returns:
+      The number of deleted bed counts.
+    """
+    if not self.is_admin(admin_user_id):
+      raise ValueError("Only admins can compact bed counts.")
+    # The bed counts right after `before` may supersede older ones.
+    query = self._session.query(
+      BedCount.rowid, BedCount.icu_id, BedCount.create_date
+    ).filter(BedCount.create_date < before + interval
+             ).order_by(BedCount.icu_id, BedCount.create_date, BedCount.rowid)
+    superseded = []
+    previous = None
+    for row in query.yield_per(self.BULK_SIZE):
+      if (
+        previous is not None and previous.icu_id == row.icu_id and
+        previous.create_date < before and
+        row.create_date - previous.create_date <= interval
+      ):
+        superseded.append(previous.rowid)
+      previous = row
+    if not superseded:
+      return 0
+
+    table = BedCount.__table__
+    chunks = [
+      superseded[i:i + self.IN_SIZE]
+      for i in range(0, len(superseded), self.IN_SIZE)
+    ]
+    with self._commit_or_rollback():
+      if archive is not None:
+        rows = []
+        for chunk in chunks:
+          rows.extend(
+            tuple(row) for row in self._session.
+            execute(table.select().where(table.c.rowid.in_(chunk)))
+          )
+        archive([column.name for column in table.columns], rows)
+      for chunk in chunks:
+        self._session.execute(table.delete().where(table.c.rowid.in_(chunk)))
+    return len(superseded)
+
+  def get_daily_rollups(
+    self,
+    region_ids: Optional[Iterable[int]] = None,
+    since: Optional[date] = None
+  ) -> List[DailyRollup]:
+    """Returns the daily rollups of the regions, if any, from a date on."""
+    query = self._session.query(DailyRollup).options(
+      selectinload(DailyRollup.region)
+    )
+    if region_ids is not None:
+      query = query.filter(DailyRollup.region_id.in_(list(region_ids)))
+    if since is not None:
+      query = query.filter(DailyRollup.date >= since)
+    return query.order_by(DailyRollup.date, DailyRollup.rowid).all()
+
+  def get_rollups_rowid(self) -> int:
+    """Returns the largest rowid of the bed counts in the daily rollups."""
+    return self._get_stamp(self.ROLLUPS_STAMP)
+
+  def get_bed_counts_after(
+    self, rowid: int
+  ) -> Tuple[Optional[datetime], Optional[int]]:
+    """Returns the oldest date and the largest rowid of the later bed counts."""
+    return self._session.query(
+      func.min(BedCount.create_date), func.max(BedCount.rowid)
+    ).filter(BedCount.rowid > rowid).one()
+
+  def get_bed_count_rows(
+    self,
+    max_date: Optional[datetime] = None
+  ) -> Tuple[List[str], List[tuple]]:
+    """Returns the bed counts before max_date, if any, as plain rows.
+
+    Lighter than get_bed_counts for a long history: only the counts and the
+    name, department and region of their ICU are read.
+
+    Returns:
+      The names of the columns, as by to_pandas, and the rows.
+    """
+    query = self._session.query(
+      BedCount.create_date, ICU.name.label("icu_name"),
+      ICU.dept.label("icu_dept"), ICU.region_id.label("icu_region_id"),
+      Region.name.label("icu_region_name"),
+      *[getattr(BedCount, column) for column in DailyRollup.COLUMNS]
+    ).join(ICU, BedCount.icu_id == ICU.icu_id
+           ).outerjoin(Region, ICU.region_id == Region.region_id)
+    if max_date:
+      query = query.filter(BedCount.create_date < max_date)
+    columns = [column["name"] for column in query.column_descriptions]
+    return columns, [tuple(row) for row in query.all()]
+
+  def update_daily_rollups(
+    self,
+    rollups: Iterable[DailyRollup],
+    max_rowid: Optional[int] = None
+  ) -> int:
+    """Sets the daily rollups of the dates of the given ones.
+
+    Only the rollups that changed are written. The rollups of those dates
+    missing from the given ones are deleted.
+
+    Args:
+      rollups: the new rollups of their dates.
+      max_rowid: the largest rowid of the bed counts they include, if any,
+        see get_rollups_rowid.
+
+    Returns:
+      The number of rollups inserted, updated or deleted.
+    """
+    rollups = {(r.date, r.region_id, r.dept): r for r in rollups}
+    if not rollups and max_rowid is None:
+      return 0
+    dates = {key[0] for key in rollups}
+    changed = 0
+    with self._commit_or_rollback():
+      if max_rowid is not None:
+        self._session.merge(
+          CacheStamp(name=self.ROLLUPS_STAMP, version=max_rowid)
+        )
+      if not rollups:
+        return 0
+      existing = self._session.query(DailyRollup).filter(
+        DailyRollup.date >= min(dates), DailyRollup.date <= max(dates)
+      )
+      for old in existing:
+        if old.date not in dates:
+          continue
+        new = rollups.pop((old.date, old.region_id, old.dept), None)
+        if new is None:
+          self._session.delete(old)
+          changed += 1
+          continue
+        values = {key: getattr(new, key) for key in DailyRollup.COLUMNS}
+        if any(getattr(old, k) != v for k, v in values.items()):
+          for key, value in values.items():
+            setattr(old, key, value)
+          changed += 1
+      self._session.add_all(rollups.values())
+      changed += len(rollups)
+    return changed
+
   def can_edit_bed_count(self, user_id: int, icu_id: int) -> bool:
     """Returns true if the user can edit the bed count for the specified ICU."""
     if self.is_admin(user_id):
@@ -788,7 +1464,8 @@ class Store(object):
     self,
     icu_ids,
     latest=False,
-    max_date: datetime = None
+    max_date: datetime = None,
+    min_date: datetime = None
   ) -> Iterable[BedCount]:
     """Returns the (latest) bed counts of the ICUs.
 
@@ -797,11 +1474,16 @@ class Store(object):
       latest: if true, then only the latest bed counts satisfying the conditions
         will be returned.
       max_date: Restricts the time of the bed counts to this date.
+      min_date: Restricts the time of all the bed counts from this date.
 
     Returns:
       a list of BedCounts.
     """
     if latest:
+      if min_date:
+        raise ValueError(
+          "min_date is not supported for the latest bed counts."
+        )
       return self._get_latest_bed_counts_for_icus(icu_ids, max_date=max_date)
     # Bed counts in reverse chronological order.
     query = self._session.query(BedCount).order_by(desc(BedCount.create_date))
@@ -810,6 +1492,8 @@ class Store(object):
 
     if max_date:
       query = query.filter(BedCount.create_date < max_date)
+    if min_date:
+      query = query.filter(BedCount.create_date >= min_date)
     query = query.filter(ICU.is_active == True)
     return query.all()
 
@@ -984,6 +1668,7 @@ class Store(object):
       self._session.query(ExternalClient).filter(
         ExternalClient.external_client_id == external_client_id
       ).update(values)
+    self._invalidate_client(external_client_id)
 
   def get_external_client_by_email(self, email: str) -> ExternalClient:
     """Returns the external client with the specified ID."""
@@ -1018,6 +1703,34 @@ class Store(object):
       return None
     return external_client
 
+  def _invalidate_client(self, external_client_id: int):
+    self.client_cache.invalidate(
+      lambda p: p.external_client_id == external_client_id
+    )
+    self._bump_stamp(self.CLIENT_STAMP)
+
+  def auth_external_client_profile(
+    self, access_key: str
+  ) -> Optional[ExternalClientProfile]:
+    """Same as auth_external_client, but returns a cached profile.
+
+    Verified keys are cached so as to avoid hashing the key and loading the
+    client on every request. The validity of the key is checked on each call,
+    and the changes of the clients in other processes (e.g. a key revoked in
+    the backoffice) clear the cache, see sync_cache.
+    """
+    self.sync_cache(self.client_cache, self.CLIENT_STAMP)
+    # Do not keep the keys themselves in memory.
+    cache_key = hashlib.sha256(access_key.encode("utf8")).hexdigest()
+    profile = self.client_cache.get(cache_key)
+    if profile is None:
+      external_client = self.auth_external_client(access_key)
+      if external_client is None:
+        return None
+      profile = ExternalClientProfile.from_client(external_client)
+      self.client_cache.put(cache_key, profile)
+    return profile if profile.access_key_valid else None
+
   def reset_external_client_access_key(
     self,
     admin_user_id: int,
@@ -1035,7 +1748,8 @@ class Store(object):
       external_client.access_key_hash = access_key.key_hash
       external_client.expiration_date = expiration_date
       self._session.add(external_client)
-      return access_key
+    self._invalidate_client(external_client_id)
+    return access_key
 
   def assign_external_client_to_region(
     self, admin_user_id: int, external_client_id: int, region_id: int
@@ -1051,6 +1765,7 @@ class Store(object):
           external_client_id=external_client_id, region_id=region_id
         )
       )
+    self._invalidate_client(external_client_id)
 
   def remove_external_client_from_region(
     self, admin_user_id: int, external_client_id: int, region_id: int
@@ -1066,11 +1781,118 @@ class Store(object):
           external_client_regions.c.external_client_id == external_client_id
         ).where(external_client_regions.c.region_id == region_id)
       )
+    self._invalidate_client(external_client_id)
+
+  # Paging related methods.
+
+  def _get_page(
+    self, query, cls, request: PageRequest, search_columns
+  ) -> Page:
+    """Returns a page of the query on the cls table, see PageRequest."""
+    total = query.count()
+    filtered = total
+    if request.search:
+      pattern = request.search.replace('\\', '\\\\')
+      pattern = pattern.replace('%', '\\%').replace('_', '\\_')
+      query = query.filter(
+        or_(
+          *[
+            column.ilike(f'%{pattern}%', escape='\\')
+            for column in search_columns
+          ]
+        )
+      )
+      filtered = query.count()
+
+    order_by = list(cls.__mapper__.primary_key)
+    if request.order_by is not None:
+      if request.order_by not in cls.get_column_names(False):
+        raise ValueError(f"Cannot sort {cls.__name__} by {request.order_by}.")
+      order_by.insert(0, getattr(cls, request.order_by))
+    if request.descending:
+      order_by = [desc(column) for column in order_by]
+    query = query.order_by(*order_by).offset(max(0, request.offset))
+    if request.limit is not None:
+      query = query.limit(max(0, request.limit))
+    return Page(query.all(), total, filtered)
+
+  def get_users_page(self, manager_user_id: int, request: PageRequest) -> Page:
+    """Returns a page of the users managed by the manager user."""
+    query = self._session.query(User)
+    if not self.is_admin(manager_user_id):
+      managed_icu_ids = self._session.query(
+        icu_managers.c.icu_id
+      ).filter(icu_managers.c.user_id == manager_user_id)
+      query = query.join(icu_users).filter(
+        icu_users.c.icu_id.in_(managed_icu_ids.subquery())
+      ).distinct()
+    query = query.options(
+      selectinload(User.icus), selectinload(User.managed_icus)
+    )
+    return self._get_page(
+      query, User, request, [User.name, User.telephone, User.email]
+    )
+
+  def get_icus_page(
+    self,
+    manager_user_id: int,
+    request: PageRequest,
+    active_only: bool = False
+  ) -> Page:
+    """Returns a page of the ICUs managed by the user."""
+    query = self._session.query(ICU)
+    if not self.is_admin(manager_user_id):
+      query = query.join(icu_managers).filter(
+        icu_managers.c.user_id == manager_user_id
+      )
+    if active_only:
+      query = query.filter(ICU.is_active == True)
+    query = query.options(
+      selectinload(ICU.region), selectinload(ICU.users),
+      selectinload(ICU.managers)
+    )
+    return self._get_page(query, ICU, request, [ICU.name, ICU.city, ICU.dept])
+
+  def get_regions_page(self, request: PageRequest) -> Page:
+    """Returns a page of the regions."""
+    query = self._session.query(Region).options(selectinload(Region.icus))
+    return self._get_page(query, Region, request, [Region.name])
+
+  def get_external_clients_page(self, request: PageRequest) -> Page:
+    """Returns a page of the external clients."""
+    query = self._session.query(ExternalClient).options(
+      selectinload(ExternalClient.regions)
+    )
+    return self._get_page(
+      query, ExternalClient, request,
+      [ExternalClient.name, ExternalClient.email]
+    )
+
+
+def refresh_sqlite_snapshot(src_path: str, dst_path: str):
+  """Copies the SQLite database into a snapshot using the backup API.
+
+  This is safe even if the source database is being written at the same time,
+  just as `sqlite3 src ".backup dst"` in scripts/backup_db.sh.
+  """
+  src = sqlite3.connect(src_path)
+  dst = sqlite3.connect(dst_path)
+  try:
+    with dst:
+      src.backup(dst)
+  finally:
+    dst.close()
+    src.close()
 
 
 def create_store_factory_for_sqlite_db(cfg) -> StoreFactory:
   """Creates a store for the SQLite database with the specified path.
 
+  The read engine is set from the optional `db.replica_url` (any SQLAlchemy
+  URL) or `db.snapshot_path` (a SQLite snapshot of the main database, see
+  refresh_sqlite_snapshot) entries of the config, and the statements slower
+  than `profiling.slow_query_ms` are logged.
+
   Args:
    cfg: A config.Config instance
 
@@ -1078,9 +1900,34 @@ def create_store_factory_for_sqlite_db(cfg) -> StoreFactory:
    A Store.
   """
   engine = create_engine("sqlite:///" + cfg.db.sqlite_path)
-  return StoreFactory(engine, salt=cfg.DB_SALT)
+  auth_cache_ttl = cfg.server.auth_cache_ttl
+  if not isinstance(auth_cache_ttl, numbers.Number):
+    auth_cache_ttl = StoreFactory.AUTH_CACHE_TTL
+  client_cache_ttl = cfg.server.api_key_cache_ttl
+  if not isinstance(client_cache_ttl, numbers.Number):
+    client_cache_ttl = StoreFactory.CLIENT_CACHE_TTL
+  read_engine = None
+  if isinstance(cfg.db.replica_url, str):
+    read_engine = create_engine(cfg.db.replica_url)
+  elif isinstance(cfg.db.snapshot_path, str):
+    if not os.path.exists(cfg.db.snapshot_path):
+      Base.metadata.create_all(engine)
+      refresh_sqlite_snapshot(cfg.db.sqlite_path, cfg.db.snapshot_path)
+    read_engine = create_engine("sqlite:///" + cfg.db.snapshot_path)
+  return StoreFactory(
+    engine,
+    salt=cfg.DB_SALT,
+    read_engine=read_engine,
+    # A replica is read-only: its schema comes from the main database.
+    create_read_tables=not isinstance(cfg.db.replica_url, str),
+    auth_cache_ttl=auth_cache_ttl,
+    client_cache_ttl=client_cache_ttl,
+    slow_query_ms=profiling.get_setting(cfg, 'slow_query_ms', 0)
+  )
 
 
 def to_pandas(objs, max_depth=1):
+  import pandas as pd
+
   return pd.json_normalize([obj.to_dict(max_depth=max_depth) for obj in objs],
                            sep="_")
@@ -41,6 +41,9 @@ class StoreSynchronizer:
   """
   def __init__(self, store_db):
     self.db = store_db
+    # Keys: user ids, values: the ids of the ICUs assigned to them by the last
+    # call to sync_users, e.g. to schedule their messages.
+    self.assigned_icus = defaultdict(list)
 
   def prepare(self):
     # Gather the managers and admins already present
@@ -102,6 +105,7 @@ class StoreSynchronizer:
 
   def sync_users(self, users_df, force_update=False):
     self.prepare()
+    self.assigned_icus = defaultdict(list)
     users_df = users_df[USER_COLUMNS]
     users_df['telephone'] = users_df['telephone'].apply(
       lambda x: str(x).encode('ascii', 'ignore').decode()
@@ -125,12 +129,14 @@ class StoreSynchronizer:
         self.db.update_user(manager_id, db_user.user_id, values)
         if icu_id not in [icu.icu_id for icu in db_user_icus]:
           self.db.assign_user_to_icu(manager_id, db_user.user_id, icu_id)
+          self.assigned_icus[db_user.user_id].append(icu_id)
       # Or insert new user:
       else:
         try:
-          self.db.add_user_to_icu(
+          user_id = self.db.add_user_to_icu(
             self._default_admin, icu_id, store.User(**values)
           )
+          self.assigned_icus[user_id].append(icu_id)
           logging.info("Inserting user {}".format(values['name']))
         except Exception as e:
           logging.error("Cannot add user to icu: {}. Skipping".format(e))
@@ -0,0 +1,58 @@
+import datetime
+
+from absl.testing import absltest
+from sqlalchemy import create_engine
+
+from icubam.db import fake
+from icubam.db.store import StoreFactory
+
+
+class PopulateNationalTest(absltest.TestCase):
+  def populate(self, seed=0):
+    store = StoreFactory(create_engine('sqlite:///:memory:')).create()
+    self.data = fake.populate_store_national(
+      store,
+      num_regions=2,
+      icus_per_region=3,
+      users_per_icu=2,
+      num_clients=2,
+      days=4,
+      counts_per_day=3,
+      seed=seed,
+      now=datetime.datetime(2020, 4, 1)
+    )
+    return store
+
+  def test_populate(self):
+    store = self.populate()
+    self.assertLen(store.get_regions(), 2)
+    self.assertLen(store.get_icus(), 6)
+    # The users of the ICUs and the admin.
+    self.assertLen(store.get_users(), 13)
+    self.assertLen(store.get_tokens(), 12)
+    self.assertLen(self.data.access_keys, 2)
+    for key in self.data.access_keys.values():
+      self.assertIsNotNone(store.auth_external_client(key))
+
+    bed_counts = store.get_bed_counts()
+    self.assertLen(bed_counts, 6 * 4 * 3)
+    self.assertEqual(self.data.num_bed_counts, len(bed_counts))
+    self.assertLess(
+      max(b.create_date for b in bed_counts), datetime.datetime(2020, 4, 1)
+    )
+    for b in bed_counts:
+      self.assertGreaterEqual(b.n_covid_free, 0)
+      self.assertGreaterEqual(b.n_covid_occ, 0)
+
+  def test_seed(self):
+    def occupancy(store):
+      return [b.n_covid_occ for b in store.get_bed_counts()]
+
+    self.assertEqual(occupancy(self.populate()), occupancy(self.populate()))
+    self.assertNotEqual(
+      occupancy(self.populate()), occupancy(self.populate(seed=1))
+    )
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -0,0 +1,42 @@
+import multiprocessing
+
+import tornado.queues
+import tornado.testing
+from sqlalchemy import create_engine
+
+from icubam.db import queue_writer
+from icubam.db.store import ICU, StoreFactory
+
+
+class QueueWriterTest(tornado.testing.AsyncTestCase):
+  def setUp(self):
+    super().setUp()
+    self.factory = StoreFactory(create_engine('sqlite:///:memory:'))
+    self.db = self.factory.create()
+    self.admin_id = self.db.add_default_admin()
+    self.icu_id = self.db.add_icu(self.admin_id, ICU(name='icu'))
+
+  def item(self, n_covid_occ):
+    return {
+      'user_id': self.admin_id,
+      'icu_id': self.icu_id,
+      'n_covid_occ': n_covid_occ
+    }
+
+  @tornado.testing.gen_test
+  async def test_forward_to_writer_process(self):
+    queue = tornado.queues.Queue()
+    process_queue = multiprocessing.Queue()
+    forwarder = queue_writer.QueueForwarder(queue, process_queue)
+    self.io_loop.spawn_callback(forwarder.process)
+    for value in range(3):
+      await queue.put(self.item(value))
+    # An invalid item does not stop the writer.
+    await queue.put({'icu_id': self.icu_id})
+    await queue.join()
+    process_queue.put(None)
+
+    writer = queue_writer.ProcessQueueWriter(process_queue, self.factory)
+    await writer.process()
+    bed_counts = sorted(self.db.get_bed_counts(), key=lambda b: b.rowid)
+    self.assertEqual([b.n_covid_occ for b in bed_counts], [0, 1, 2])
@@ -0,0 +1,110 @@
+import datetime
+import os
+import tempfile
+from unittest import mock
+
+import pandas as pd
+from absl.testing import absltest
+from sqlalchemy import create_engine
+
+from icubam.analytics import dataset
+from icubam.db import fake, retention
+from icubam.db.store import StoreFactory
+
+
+class RetentionTest(absltest.TestCase):
+  def setUp(self):
+    super().setUp()
+    self.store = StoreFactory(create_engine('sqlite:///:memory:')).create()
+    self.now = datetime.datetime(2020, 4, 10)
+    self.data = fake.populate_store_national(
+      self.store,
+      num_regions=2,
+      icus_per_region=2,
+      users_per_icu=1,
+      days=8,
+      counts_per_day=2,
+      now=self.now
+    )
+    # Bursts of corrections, a few minutes apart.
+    rows = []
+    for b in self.store.get_bed_counts():
+      for minutes in [3, 6]:
+        rows.append((
+          b.create_date + datetime.timedelta(minutes=minutes), b.icu_id,
+          b.n_covid_occ + minutes, b.n_covid_free
+        ))
+    self.store.add_bed_counts(
+      self.data.admin_user_id,
+      ['create_date', 'icu_id', 'n_covid_occ', 'n_covid_free'], rows
+    )
+    directory = tempfile.TemporaryDirectory()
+    self.addCleanup(directory.cleanup)
+    self.directory = directory.name
+
+  def history(self):
+    history = dataset.Dataset(self.store).get('all_bedcounts')
+    return history.reset_index(drop=True)
+
+  def test_compact_bed_counts(self):
+    num_bed_counts = len(self.store.get_bed_counts())
+    before = self.history()
+    count = retention.compact_bed_counts(
+      self.store, self.data.admin_user_id, datetime.timedelta(days=3),
+      self.directory, self.now
+    )
+    self.assertGreater(count, 0)
+    self.assertEqual(len(self.store.get_bed_counts()), num_bed_counts - count)
+    pd.testing.assert_frame_equal(self.history(), before)
+
+    # The archive and the remaining bed counts make up the raw history.
+    paths = os.listdir(self.directory)
+    self.assertLen(paths, 1)
+    path = os.path.join(self.directory, paths[0])
+    if path.endswith('.parquet'):
+      archived = pd.read_parquet(path)
+    else:
+      archived = pd.read_csv(path)
+    self.assertLen(archived, count)
+    self.assertLess(
+      pd.to_datetime(archived['create_date']).max(),
+      self.now - datetime.timedelta(days=3)
+    )
+
+    self.assertEqual(
+      retention.compact_bed_counts(
+        self.store, self.data.admin_user_id, datetime.timedelta(days=3),
+        self.directory, self.now
+      ), 0
+    )
+
+  def test_archive_csv_fallback(self):
+    def to_parquet(df, path, **kwargs):
+      with open(path, 'w') as f:
+        f.write('partial')
+      raise ValueError('Cannot convert')
+
+    archiver = retention.Archiver(self.directory)
+    with mock.patch.object(pd.DataFrame, 'to_parquet', to_parquet):
+      archiver(['icu_id', 'n_covid_occ'], [(1, 2), (3, 4)])
+    self.assertEqual(
+      os.listdir(self.directory), [os.path.basename(archiver.paths[0])]
+    )
+    self.assertTrue(archiver.paths[0].endswith('.csv.gz'))
+    self.assertLen(pd.read_csv(archiver.paths[0]), 2)
+
+  def test_archive_failure(self):
+    num_bed_counts = len(self.store.get_bed_counts())
+
+    def archive(columns, rows):
+      raise IOError('Disk full')
+
+    with self.assertRaises(IOError):
+      self.store.compact_bed_counts(
+        self.data.admin_user_id, self.now, archive=archive
+      )
+    self.assertLen(self.store.get_bed_counts(), num_bed_counts)
+
+
+if __name__ == '__main__':
+  absltest.main()
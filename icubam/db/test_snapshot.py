@@ -0,0 +1,45 @@
+import os
+import shutil
+import tempfile
+import time
+
+import tornado.testing
+from sqlalchemy import create_engine
+
+from icubam import config
+from icubam.db import snapshot
+from icubam.db.store import StoreFactory
+
+
+class SnapshotRefresherTest(tornado.testing.AsyncTestCase):
+  def setUp(self):
+    super().setUp()
+    self.tmpdir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.tmpdir)
+    self.config = config.Config('resources/test.toml')
+    self.config.db.sqlite_path = os.path.join(self.tmpdir, 'icubam.db')
+    self.config.db.snapshot_path = os.path.join(self.tmpdir, 'snapshot.db')
+    self.config.db.snapshot_every = 60
+    factory = StoreFactory(
+      create_engine('sqlite:///' + self.config.db.sqlite_path)
+    )
+    factory.create().add_default_admin()
+    self.refresher = snapshot.SnapshotRefresher(self.config)
+
+  def test_is_valid(self):
+    self.assertTrue(self.refresher.is_valid)
+    self.config.db.snapshot_every = None
+    self.assertFalse(snapshot.SnapshotRefresher(self.config).is_valid)
+
+  @tornado.testing.gen_test
+  async def test_refresh(self):
+    self.assertTrue(self.refresher.is_stale())
+    await self.refresher.refresh()
+    self.assertTrue(os.path.exists(self.config.db.snapshot_path))
+    self.assertFalse(self.refresher.is_stale())
+    self.assertTrue(self.refresher.is_stale(now=time.time() + 61))
+
+    reader = StoreFactory(
+      create_engine('sqlite:///' + self.config.db.snapshot_path)
+    ).create()
+    self.assertEqual(len(reader.get_admins()), 1)
@@ -1,10 +1,13 @@
 import os
+import shutil
+import tempfile
 import time
+from unittest import mock
 
 from absl.testing import absltest
 from datetime import datetime, timedelta
 import icubam.db.store as db_store
-from icubam.db.store import BedCount, ExternalClient, ICU, Region, StoreFactory, User
+from icubam.db.store import BedCount, DailyRollup, ExternalClient, ICU, Region, StoreFactory, User
 from icubam import config
 from sqlalchemy import create_engine
 from sqlalchemy.exc import IntegrityError
@@ -193,6 +196,14 @@ class StoreTest(absltest.TestCase):
     self.assertItemsEqual([user.name for user in users],
                           ["user1", "user2", "admin", "manager"])
 
+  def test_get_users_by_ids(self):
+    store = self.store
+    store.IDS_PER_QUERY = 1
+    user_ids = [store.add_user(User(name=f"user{i}")) for i in range(3)]
+    users = store.get_users_by_ids(user_ids[:2] + [user_ids[0], -1])
+    self.assertItemsEqual([user.name for user in users], ["user0", "user1"])
+    self.assertEqual(store.get_users_by_ids([]), [])
+
   def do_test_add_user_to_icu(self, icu_id, manager_user_id):
     store = self.store
     user = User(
@@ -245,6 +256,19 @@ class StoreTest(absltest.TestCase):
     with self.assertRaises(ValueError):
       self.do_test_add_user_to_icu(icu_id, self.manager_user_id)
 
+  def test_add_users_to_icu(self):
+    icu_id = self.add_icu()
+    users = [User(name=f"user{i}") for i in range(3)]
+    user_ids = self.store.add_users_to_icu(self.admin_user_id, icu_id, users)
+    self.assertLen(set(user_ids), 3)
+    for user_id in user_ids:
+      user = self.store.get_user(user_id)
+      self.assertEqual([icu.icu_id for icu in user.icus], [icu_id])
+    with self.assertRaises(ValueError):
+      self.store.add_users_to_icu(
+        self.manager_user_id, icu_id, [User(name="other")]
+      )
+
   def do_test_update_user(self, icu_id, manager_user_id):
     store = self.store
     user = User(name="foo")
@@ -376,6 +400,94 @@ class StoreTest(absltest.TestCase):
     self.assertFalse(store.can_edit_bed_count(user_id3, icu_id1))
     self.assertTrue(store.can_edit_bed_count(user_id3, icu_id2))
 
+  def test_add_bed_counts(self):
+    icu_id = self.add_icu()
+    columns = ["create_date", "icu_id", "n_covid_occ"]
+    rows = [(datetime(2020, 4, 1, i), icu_id, i) for i in range(5)]
+    with mock.patch.object(db_store.Store, "BULK_SIZE", 2):
+      count = self.store.add_bed_counts(self.admin_user_id, columns, rows)
+    self.assertEqual(count, 5)
+    bed_counts = sorted(self.store.get_bed_counts(), key=lambda b: b.rowid)
+    self.assertEqual([b.n_covid_occ for b in bed_counts], list(range(5)))
+    self.assertEqual(bed_counts[-1].create_date, datetime(2020, 4, 1, 4))
+    self.assertEqual(self.store.add_bed_counts(self.admin_user_id, [], []), 0)
+    with self.assertRaises(ValueError):
+      self.store.add_bed_counts(self.manager_user_id, columns, rows)
+
+  def test_compact_bed_counts(self):
+    icu_id = self.add_icu()
+    other_icu_id = self.add_icu("other")
+    columns = ["create_date", "icu_id", "n_covid_occ"]
+    minutes = [0, 5, 10, 40, 50, 120, 125]
+    start = datetime(2020, 4, 1)
+    rows = [(start + timedelta(minutes=m), icu_id, m) for m in minutes]
+    rows.append((start, other_icu_id, 1))
+    self.store.add_bed_counts(self.admin_user_id, columns, rows)
+
+    archived = []
+    with mock.patch.object(db_store.Store, "IN_SIZE", 2):
+      count = self.store.compact_bed_counts(
+        self.admin_user_id,
+        start + timedelta(minutes=121),
+        archive=lambda columns, rows: archived.extend(rows)
+      )
+    # The bed count of 120 is superseded by the one of 125, which is recent.
+    self.assertEqual(count, 4)
+    self.assertLen(archived, 4)
+    bed_counts = self.store.get_bed_counts()
+    self.assertEqual(
+      sorted((b.icu_id, b.n_covid_occ) for b in bed_counts),
+      [(icu_id, 10), (icu_id, 50), (icu_id, 125), (other_icu_id, 1)]
+    )
+    self.assertEqual(
+      self.store.compact_bed_counts(
+        self.admin_user_id, start + timedelta(days=1)
+      ), 0
+    )
+    with self.assertRaises(ValueError):
+      self.store.compact_bed_counts(self.manager_user_id, start)
+
+  def test_daily_rollups(self):
+    region_id = self.add_region()
+    day1 = datetime(2020, 4, 1).date()
+    day2 = datetime(2020, 4, 2).date()
+
+    def rollups(values):
+      return [
+        DailyRollup(date=date, region_id=region_id, dept=dept, n_covid_occ=n)
+        for date, dept, n in values
+      ]
+
+    self.assertEqual(self.store.update_daily_rollups([]), 0)
+    self.assertEqual(
+      self.store.update_daily_rollups(
+        rollups([(day1, "a", 1), (day1, "b", 2), (day2, "a", 3)])
+      ), 3
+    )
+    # Same values: nothing is written.
+    self.assertEqual(
+      self.store.update_daily_rollups(
+        rollups([(day1, "a", 1), (day1, "b", 2), (day2, "a", 3)])
+      ), 0
+    )
+    # One update and one deletion on day 1, day 2 is left alone.
+    self.assertEqual(
+      self.store.update_daily_rollups(rollups([(day1, "a", 4)])), 2
+    )
+    result = self.store.get_daily_rollups()
+    self.assertEqual([(r.date, r.dept, r.n_covid_occ) for r in result],
+                     [(day1, "a", 4), (day2, "a", 3)])
+    self.assertEqual(result[0].region.name, "region")
+    self.assertLen(self.store.get_daily_rollups(since=day2), 1)
+    self.assertEmpty(self.store.get_daily_rollups(region_ids=[region_id + 1]))
+
+    # The rowid of the bed counts they include is kept, even without changes.
+    self.assertEqual(self.store.get_rollups_rowid(), 0)
+    self.assertEqual(self.store.update_daily_rollups([], max_rowid=5), 0)
+    self.assertEqual(self.store.get_rollups_rowid(), 5)
+    self.store.update_daily_rollups(rollups([(day1, "a", 4)]), max_rowid=7)
+    self.assertEqual(self.store.get_rollups_rowid(), 7)
+
   def test_get_bed_count_for_icu(self):
     store = self.store
     icu_id = self.add_icu()
@@ -449,6 +561,21 @@ class StoreTest(absltest.TestCase):
       )
     return icu_id
 
+  def test_get_last_modified_for_icus(self):
+    now = datetime.now()
+    icu_id1 = self.add_icu_with_values(None, "icu1", now, [1, 2])
+    icu_id2 = self.add_icu_with_values(None, "icu2", now, [3])
+    icu_id3 = self.add_icu("icu3")
+
+    result = self.store.get_last_modified_for_icus([icu_id1, icu_id2, icu_id3])
+    self.assertCountEqual(result.keys(), [icu_id1, icu_id2])
+    for icu_id in [icu_id1, icu_id2]:
+      self.assertEqual(
+        result[icu_id],
+        self.store.get_bed_count_for_icu(icu_id).last_modified
+      )
+    self.assertEqual(self.store.get_last_modified_for_icus([]), {})
+
   def test_get_visible_bed_counts_for_user(self):
     store = self.store
     admin_user_id = self.admin_user_id
@@ -670,6 +797,61 @@ class StoreTest(absltest.TestCase):
 
     self.assertIsNone(store.auth_external_client("test"))
 
+  def test_auth_external_client_profile(self):
+    store = self.store
+    admin_user_id = self.admin_user_id
+    region_id = self.add_region()
+    external_client_id, access_key = store.add_external_client(
+      admin_user_id, ExternalClient(name="client")
+    )
+
+    profile = store.auth_external_client_profile(access_key.key)
+    self.assertEqual(profile.external_client_id, external_client_id)
+    self.assertEqual(profile.region_ids, [])
+    self.assertEqual(len(store.client_cache), 1)
+    self.assertIsNone(store.auth_external_client_profile("test"))
+    self.assertEqual(len(store.client_cache), 1)
+
+    # Changing the regions of the client invalidates the cache.
+    store.assign_external_client_to_region(
+      admin_user_id, external_client_id, region_id
+    )
+    self.assertEqual(len(store.client_cache), 0)
+    profile = store.auth_external_client_profile(access_key.key)
+    self.assertEqual(profile.region_ids, [region_id])
+
+    # So does deactivating it.
+    store.update_external_client(
+      admin_user_id, external_client_id, {"is_active": False}
+    )
+    self.assertIsNone(store.auth_external_client_profile(access_key.key))
+
+    # And resetting its key.
+    store.update_external_client(
+      admin_user_id, external_client_id, {"is_active": True}
+    )
+    self.assertIsNotNone(store.auth_external_client_profile(access_key.key))
+    new_key = store.reset_external_client_access_key(
+      admin_user_id, external_client_id
+    )
+    self.assertIsNone(store.auth_external_client_profile(access_key.key))
+    profile = store.auth_external_client_profile(new_key.key)
+    self.assertEqual(profile.external_client_id, external_client_id)
+
+  def test_auth_external_client_profile_expired(self):
+    store = self.store
+    external_client_id, access_key = store.add_external_client(
+      self.admin_user_id,
+      ExternalClient(
+        name="client", expiration_date=add_seconds(datetime.now(), 3600)
+      )
+    )
+    self.assertIsNotNone(store.auth_external_client_profile(access_key.key))
+    # Cached profiles are checked for expiration.
+    profile = store.client_cache.get(next(iter(store.client_cache._data)))
+    profile.expiration_date = add_seconds(datetime.now(), -1)
+    self.assertIsNone(store.auth_external_client_profile(access_key.key))
+
   def test_assign_external_client_to_region(self):
     store = self.store
     admin_user_id = self.admin_user_id
@@ -858,6 +1040,167 @@ class StoreTest(absltest.TestCase):
     renewed_token = self.store.get_token(renewed_token_str)
     self.assertNotEqual(token_str, renewed_token)
 
+  def test_get_or_new_tokens(self):
+    icu_ids = [self.add_icu(f'icu{i}') for i in range(3)]
+    user_id = self.admin_user_id
+    token_str = self.store.add_token(
+      None, db_store.UserICUToken(user_id=user_id, icu_id=icu_ids[0])
+    )
+    pairs = [(user_id, icu_id) for icu_id in icu_ids]
+    tokens = self.store.get_or_new_tokens(pairs)
+    self.assertCountEqual(tokens.keys(), pairs)
+    self.assertEqual(tokens[pairs[0]], token_str)
+    for pair in pairs:
+      token = tokens[pair]
+      self.assertEqual(len(token), db_store.UserICUToken.TOKEN_SIZE)
+      self.assertEqual(self.store.get_token_from_ids(*pair).token, token)
+    self.assertEqual(self.store.get_or_new_tokens(pairs), tokens)
+
+    # All the tokens are older than now.
+    time.sleep(1.1)
+    renewed = self.store.get_or_new_tokens(
+      pairs[:2], renew_before=datetime.utcnow()
+    )
+    self.assertCountEqual(renewed.keys(), pairs[:2])
+    for pair in pairs[:2]:
+      self.assertNotEqual(renewed[pair], tokens[pair])
+      self.assertEqual(self.store.get_token(renewed[pair]).icu_id, pair[1])
+    self.assertEqual(self.store.get_or_new_tokens([]), {})
+
+  def test_get_users_page(self):
+    store = self.store
+    icu_ids = [self.add_icu(f"icu{i}") for i in range(2)]
+    store.assign_user_as_icu_manager(
+      self.admin_user_id, self.manager_user_id, icu_ids[0]
+    )
+    names = ["bob", "alice", "carol_1", "carol%2"]
+    user_ids = {}
+    for name in names:
+      user_ids[name] = store.add_user_to_icu(
+        self.admin_user_id, icu_ids[0], User(name=name)
+      )
+    store.assign_user_to_icu(self.admin_user_id, user_ids["bob"], icu_ids[1])
+    store.add_user_to_icu(self.admin_user_id, icu_ids[1], User(name="dave"))
+
+    request = db_store.PageRequest(offset=1, limit=2, order_by="name")
+    page = store.get_users_page(self.admin_user_id, request)
+    self.assertEqual(page.total, 7)
+    self.assertEqual(page.filtered, 7)
+    self.assertEqual([user.name for user in page.items], ["alice", "bob"])
+
+    # Managers only see the users of their ICUs, once.
+    request = db_store.PageRequest(order_by="name", descending=True)
+    page = store.get_users_page(self.manager_user_id, request)
+    self.assertEqual(page.total, len(names))
+    self.assertEqual([user.name for user in page.items],
+                     sorted(names, reverse=True))
+    self.assertLen(page.items[-1].icus, 1)
+
+    request = db_store.PageRequest(search="CAROL_")
+    page = store.get_users_page(self.manager_user_id, request)
+    self.assertEqual(page.filtered, 1)
+    self.assertEqual([user.name for user in page.items], ["carol_1"])
+
+    with self.assertRaises(ValueError):
+      store.get_users_page(
+        self.admin_user_id, db_store.PageRequest(order_by="icus")
+      )
+
+  def test_get_icus_page(self):
+    store = self.store
+    region_id = self.add_region()
+    for name in ["b", "a", "c"]:
+      self.add_icu(name, region_id=region_id, is_active=name != "c")
+    icu_id = store.get_icu_by_name("a").icu_id
+    store.assign_user_as_icu_manager(
+      self.admin_user_id, self.manager_user_id, icu_id
+    )
+
+    request = db_store.PageRequest(order_by="name")
+    page = store.get_icus_page(self.admin_user_id, request)
+    self.assertEqual([icu.name for icu in page.items], ["a", "b", "c"])
+    page = store.get_icus_page(self.admin_user_id, request, active_only=True)
+    self.assertEqual([icu.name for icu in page.items], ["a", "b"])
+    page = store.get_icus_page(self.manager_user_id, request)
+    self.assertEqual(page.total, 1)
+    self.assertEqual(page.items[0].region.name, "region")
+
+  def test_get_bed_count_overview(self):
+    store = self.store
+    now = datetime.now()
+    icu_ids = [self.add_icu(name) for name in ["a", "b", "c"]]
+    self.add_icu("inactive", is_active=False)
+    store.assign_user_as_icu_manager(
+      self.admin_user_id, self.manager_user_id, icu_ids[0]
+    )
+    user_ids = [
+      store.add_user_to_icu(self.admin_user_id, icu_ids[0], User(name=name))
+      for name in ["u1", "u2"]
+    ]
+    for icu_id, n_covid_occ, seconds in [
+      (icu_ids[0], 1, 2), (icu_ids[0], 2, 3), (icu_ids[0], 3, 1),
+      (icu_ids[1], 4, 1)
+    ]:
+      store.update_bed_count_for_icu(
+        self.admin_user_id,
+        BedCount(
+          icu_id=icu_id,
+          n_covid_occ=n_covid_occ,
+          create_date=add_seconds(now, seconds)
+        )
+      )
+
+    request = db_store.PageRequest(order_by="name")
+    page = store.get_bed_count_overview(self.admin_user_id, request)
+    self.assertEqual(page.total, 3)
+    overview = [(icu.name, bed_count and bed_count.n_covid_occ, user_id)
+                for icu, bed_count, user_id in page.items]
+    self.assertEqual(
+      overview, [("a", 2, min(user_ids)), ("b", 4, None), ("c", None, None)]
+    )
+
+    page = store.get_bed_count_overview(self.manager_user_id, request)
+    self.assertEqual([icu.name for icu, _, _ in page.items], ["a"])
+
+  def test_get_data_version(self):
+    store = self.store
+    region_id = self.add_region("r")
+    icu_id = self.add_icu("a", region_id=region_id)
+    other_icu_id = self.add_icu("b")
+    version = store.get_data_version()
+    self.assertIsNone(version.max_rowid)
+    self.assertEqual(version.num_icus, 2)
+    self.assertIsNotNone(version.last_modified)
+
+    store.update_bed_count_for_icu(
+      self.admin_user_id, BedCount(icu_id=other_icu_id, n_covid_occ=1)
+    )
+    self.assertNotEqual(store.get_data_version().key, version.key)
+    # Not in the region.
+    region_version = store.get_data_version([region_id])
+    self.assertIsNone(region_version.max_rowid)
+    self.assertEqual(region_version.num_icus, 1)
+
+    store.update_bed_count_for_icu(
+      self.admin_user_id, BedCount(icu_id=icu_id, n_covid_occ=1)
+    )
+    self.assertNotEqual(
+      store.get_data_version([region_id]).key, region_version.key
+    )
+
+  def test_get_regions_and_external_clients_page(self):
+    for name in ["b", "a"]:
+      self.add_region(name)
+      self.store.add_external_client(
+        self.admin_user_id, ExternalClient(name=name)
+      )
+    request = db_store.PageRequest(order_by="name", limit=1)
+    page = self.store.get_regions_page(request)
+    self.assertEqual([region.name for region in page.items], ["a"])
+    page = self.store.get_external_clients_page(request)
+    self.assertEqual(page.total, 2)
+    self.assertEqual([client.name for client in page.items], ["a"])
+
   def test_create_store_factory_for_sqlite_db(self):
     cfg = config.Config(
       os.path.join(
@@ -885,3 +1228,100 @@ class StoreTest(absltest.TestCase):
     self.store._session.close()
     with self.assertRaises(DetachedInstanceError):
       user.icus
+
+
+class CacheStampTest(absltest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.tmpdir)
+    url = "sqlite:///" + os.path.join(self.tmpdir, "icubam.db")
+    # Two factories on the same database, as in two processes.
+    self.store = StoreFactory(create_engine(url)).create()
+    self.other_store = StoreFactory(create_engine(url)).create()
+    self.admin_user_id = self.store.add_default_admin()
+
+  @mock.patch.object(db_store.StoreFactory, "STAMP_CHECK_PERIOD", 0)
+  def test_revoked_access_key(self):
+    external_client_id, access_key = self.store.add_external_client(
+      self.admin_user_id, ExternalClient(name="client")
+    )
+    other_store = self.other_store
+    self.assertIsNotNone(
+      other_store.auth_external_client_profile(access_key.key)
+    )
+    self.assertEqual(len(other_store.client_cache), 1)
+    self.store.reset_external_client_access_key(
+      self.admin_user_id, external_client_id
+    )
+    self.assertIsNone(other_store.auth_external_client_profile(access_key.key))
+
+  def test_stamp_check_period(self):
+    external_client_id, access_key = self.store.add_external_client(
+      self.admin_user_id, ExternalClient(name="client")
+    )
+    self.other_store.auth_external_client_profile(access_key.key)
+    self.store.update_external_client(
+      self.admin_user_id, external_client_id, {"name": "other"}
+    )
+    with mock.patch.object(self.other_store, "_session") as session:
+      self.other_store.auth_external_client_profile(access_key.key)
+      session.query.assert_not_called()
+
+  def test_access_key_hash_is_indexed(self):
+    plan = self.store._session.execute(
+      "EXPLAIN QUERY PLAN SELECT * FROM external_clients "
+      "WHERE access_key_hash = 'hash'"
+    ).fetchall()
+    self.assertIn("USING INDEX", plan[0][-1])
+
+
+class ReadEngineTest(absltest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.tmpdir)
+    self.path = os.path.join(self.tmpdir, "icubam.db")
+    self.snapshot_path = os.path.join(self.tmpdir, "snapshot.db")
+    self.store_factory = StoreFactory(
+      create_engine("sqlite:///" + self.path),
+      read_engine=create_engine("sqlite:///" + self.snapshot_path)
+    )
+    self.store = self.store_factory.create()
+    self.admin_user_id = self.store.add_default_admin()
+
+  def test_reader_without_read_engine(self):
+    store_factory = StoreFactory(create_engine("sqlite:///:memory:"))
+    self.assertFalse(store_factory.has_read_engine)
+    user_id = store_factory.create().add_default_admin()
+    reader = store_factory.create_reader()
+    self.assertIsNotNone(reader.get_user(user_id))
+
+  def test_reader_uses_snapshot(self):
+    self.assertTrue(self.store_factory.has_read_engine)
+    reader = self.store_factory.create_reader()
+    self.assertEqual(len(reader.get_users()), 0)
+
+    db_store.refresh_sqlite_snapshot(self.path, self.snapshot_path)
+    reader = self.store_factory.create_reader()
+    self.assertEqual(len(reader.get_users()), 1)
+
+    # Writes are still only visible to the readers after the next refresh.
+    self.store.add_icu(self.admin_user_id, ICU(name="icu"))
+    self.assertEqual(len(reader.get_icus()), 0)
+    db_store.refresh_sqlite_snapshot(self.path, self.snapshot_path)
+    self.assertEqual(len(self.store_factory.create_reader().get_icus()), 1)
+
+  def test_replica_tables_not_created(self):
+    replica_path = os.path.join(self.tmpdir, "replica.db")
+    replica = create_engine("sqlite:///" + replica_path)
+    StoreFactory(
+      create_engine("sqlite:///:memory:"),
+      read_engine=replica,
+      create_read_tables=False
+    )
+    self.assertEqual(replica.table_names(), [])
+
+  def test_reader_cannot_write(self):
+    db_store.refresh_sqlite_snapshot(self.path, self.snapshot_path)
+    reader = self.store_factory.create_reader()
+    with self.assertRaises(ValueError):
+      reader.add_user(User(name="user"))
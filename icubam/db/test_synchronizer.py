@@ -217,6 +217,16 @@ class CSVTest(absltest.TestCase):
       self.db.get_user_by_phone("333").icus, 2,
       "This user should be registered for 2 ICUs."
     )
+    # The new assignments are the ones of the last import only.
+    icu_ids = {icu.name: icu.icu_id for icu in self.db.get_icus()}
+    user_ids = {user.telephone: user.user_id for user in self.db.get_users()}
+    self.assertEqual(
+      dict(self.csv.assigned_icus), {
+        user_ids["111"]: [icu_ids["hopital2"]],
+        user_ids["444"]: [icu_ids["hopital4"]],
+        user_ids["333"]: [icu_ids["hopital4"]],
+      }
+    )
 
     n_user = len(self.db.get_users())
     self.assertEqual(
@@ -243,4 +253,4 @@ class CSVTest(absltest.TestCase):
     with open("resources/test/bedcounts.csv") as csv_f:
       self.csv.sync_bedcounts_from_csv(csv_f, False)
     bed_counts = self.db.get_latest_bed_counts()
-    self.assertEqual(bed_counts[0].n_covid_free, 12)
\ No newline at end of file
+    self.assertEqual(bed_counts[0].n_covid_free, 12)
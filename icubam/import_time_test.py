@@ -0,0 +1,86 @@
+import os.path
+import subprocess
+import sys
+from typing import Dict, Tuple
+
+from absl.testing import absltest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Loaded on first use only, see the lazy imports of their users.
+HEAVY = (
+  'bokeh', 'matplotlib', 'messagebird', 'nexmo', 'pandas', 'pkg_resources',
+  'scipy', 'seaborn', 'twilio'
+)
+
+
+def import_times(module: str) -> Tuple[float, Dict[str, float]]:
+  """Imports the module in a new interpreter with `python -X importtime`.
+
+  Returns:
+   The cumulative import time of the module in seconds, and the cumulative
+   import times of all the modules it loaded, by name.
+  """
+  command = [sys.executable, '-X', 'importtime', '-c', f'import {module}']
+  result = subprocess.run(
+    command,
+    cwd=ROOT,
+    stderr=subprocess.PIPE,
+    universal_newlines=True,
+    check=True
+  )
+  times = {}
+  for line in result.stderr.splitlines():
+    parts = line.split('|')
+    if not line.startswith('import time:') or len(parts) != 3:
+      continue
+    try:
+      times[parts[2].strip()] = int(parts[1]) / 1e6
+    except ValueError:
+      continue
+  return times.get(module, 0.0), times
+
+
+class ImportTimeTest(absltest.TestCase):
+  # In seconds, on a cold interpreter: generous so as not to be flaky, the
+  # heavy modules are what makes the difference.
+  BUDGET = 1.5
+  # The heavy modules each entry point uses from the start.
+  ALLOWED = {
+    'icubam.analytics.server': ('pandas', ),
+    'scripts.csv_import': ('pandas', ),
+  }
+
+  def check(self, module: str):
+    seconds, times = import_times(module)
+    loaded = sorted({
+      name.split('.')[0]
+      for name in times
+      if name.split('.')[0] in HEAVY
+    })
+    expected = sorted(self.ALLOWED.get(module, ()))
+    self.assertEqual(loaded, expected, msg=module)
+    self.assertLess(seconds, self.BUDGET, msg=module)
+    return times
+
+  def test_cli(self):
+    times = self.check('icubam.cli')
+    self.assertNotIn('icubam.www.server', times)
+    self.assertNotIn('icubam.analytics.server', times)
+
+  def test_servers(self):
+    for server in [
+      'icubam.www.server', 'icubam.messaging.server',
+      'icubam.backoffice.server', 'icubam.analytics.server'
+    ]:
+      self.check(server)
+
+  def test_scripts(self):
+    for script in [
+      'scripts.run_server', 'scripts.generate_api_key', 'scripts.send_sms',
+      'scripts.csv_import'
+    ]:
+      self.check(script)
+
+
+if __name__ == '__main__':
+  absltest.main()
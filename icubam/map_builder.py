@@ -2,7 +2,7 @@ from absl import logging  # noqa: F401
 import functools
 import os.path
 import json
-from typing import List, Optional
+from typing import Dict, List, Optional
 import tornado.template
 
 from icubam import icu_tree
@@ -28,62 +28,89 @@ class MapBuilder:
 
     keep_empty = self.config.server.display_empty_icu
     self.keep_empty = keep_empty if isinstance(keep_empty, bool) else False
+    # The ICUs and their latest bed counts, loaded once for both trees.
+    self._beds = None
 
-  def to_map_data(self, tree, level):
-    nodes = tree.extract_below(
+  def build_tree(
+    self,
+    covid: bool,
+    regions: Optional[List[int]] = None
+  ) -> icu_tree.ICUTree:
+    if self._beds is None:
+      self._beds = list(self.db.get_icus()), self.db.get_latest_bed_counts()
+    icus, bed_counts = self._beds
+    if regions:
+      icus = [icu for icu in icus if icu.region_id in regions]
+    tree = icu_tree.ICUTree(covid=covid)
+    tree.add_many(icus, bed_counts)
+    return tree
+
+  def get_clusters(self, tree, level):
+    return tree.extract_below(
       level, keep_empty=self.keep_empty, max_nodes=self.max_cluster_size
     )
-    result = []
-    for cluster, icus in nodes:
-      views = [
-        {
-          'name': 'cluster',
-          'beds': [cluster]
-        },
-        {
-          'name': 'full',
-          'beds': sorted(icus, key=lambda x: x.label)
-        },
-      ]
-
-      num_days = self.config.server.num_days_for_stale
-      is_stale = functools.partial(
-        time_utils.is_stale, days_threshold=num_days
-      )
-      when = functools.partial(
-        time_utils.localewise_time_ago, locale=self.locale
-      )
-      popup = self.popup_template.generate(
-        cluster=cluster, views=views, is_stale=is_stale, when=when
-      )
-      curr = {'popup': popup.decode()}
-      curr.update(cluster.as_dict())
-      result.append(curr)
 
+  def to_map_data(self, tree, level) -> List[Dict]:
+    """Returns the compact data of the clusters, without their popups."""
+    result = [
+      cluster.as_dict() for cluster, _ in self.get_clusters(tree, level)
+    ]
     # This sorts the from north to south, so as to avoid overlap on the north.
     result.sort(key=lambda x: x['lat'], reverse=True)
     return result
 
-  def prepare_jsons(
+  def render_popup(self, cluster, icus) -> bytes:
+    views = [
+      {
+        'name': 'cluster',
+        'beds': [cluster]
+      },
+      {
+        'name': 'full',
+        'beds': sorted(icus, key=lambda x: x.label)
+      },
+    ]
+    num_days = self.config.server.num_days_for_stale
+    is_stale = functools.partial(time_utils.is_stale, days_threshold=num_days)
+    when = functools.partial(
+      time_utils.localewise_time_ago, locale=self.locale
+    )
+    return self.popup_template.generate(
+      cluster=cluster, views=views, is_stale=is_stale, when=when
+    )
+
+  def prepare_data(
     self,
-    user_id: Optional[int] = None,
     center_icu: Optional[store.ICU] = None,
     regions: Optional[List[int]] = None,
     level: str = 'dept',
-  ):
-    data = {}
+  ) -> Dict:
+    """Returns the center of the map and its clusters, with and without covid.
+
+    The popups of the clusters are rendered on demand by prepare_popup.
+    """
     center = {
       'lat': center_icu.lat,
       'lng': center_icu.long
     } if center_icu else None
+    clusters = {}
     for covid in [True, False]:
-      tree = icu_tree.ICUTree(covid=covid)
-      icus = self.db.get_icus()
-      if regions:
-        icus = [icu for icu in icus if icu.region_id in regions]
-      tree.add_many(icus, self.db.get_latest_bed_counts())
-      data[covid] = self.to_map_data(tree, level)
+      tree = self.build_tree(covid, regions)
+      clusters[json.dumps(covid)] = self.to_map_data(tree, level)
       if center is None:
         center = {'lat': tree.lat, 'lng': tree.long}
+    return {'center': center, 'clusters': clusters}
 
-    return json.dumps(data), json.dumps(center)
+  def prepare_popup(
+    self,
+    cluster_id: str,
+    covid: bool = True,
+    regions: Optional[List[int]] = None,
+    level: str = 'dept',
+  ) -> Optional[bytes]:
+    """Returns the popup of the cluster, None if there is no such cluster."""
+    tree = self.build_tree(covid, regions)
+    for cluster, icus in self.get_clusters(tree, level):
+      if cluster.id == cluster_id:
+        return self.render_popup(cluster, icus)
+    return None
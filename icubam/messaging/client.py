@@ -1,17 +1,34 @@
 from absl import logging
-import json
 import os.path
 from tornado import httpclient
-from typing import List, Optional
+from typing import Iterable, List, Optional, Tuple
 
 from icubam.messaging.handlers import onoff, schedule
 
 
+def get_http_client() -> httpclient.AsyncHTTPClient:
+  """Returns the curl client, or the default one if pycurl is missing.
+
+  Unlike the default client, the curl client keeps the connections alive and
+  reuses them for the next requests.
+  """
+  try:
+    from tornado import curl_httpclient
+  except ImportError:
+    logging.warning('pycurl is not installed: connections are not reused.')
+    return httpclient.AsyncHTTPClient()
+  return curl_httpclient.CurlAsyncHTTPClient()
+
+
 class MessageServerClient:
   """Client for HTTP-based comnunication with the MessageServer"""
+
+  # Maximum number of (user, ICUs) pairs sent in a single bulk request.
+  BULK_SIZE = 500
+
   def __init__(self, config):
     self.config = config
-    self.http_client = httpclient.AsyncHTTPClient()
+    self.http_client = get_http_client()
 
   async def fetch(self, handler, request):
     url = os.path.join(
@@ -40,19 +57,45 @@ class MessageServerClient:
     request = onoff.OnOffRequest(user_id, list(icu_ids), on, delay)
     return await self.fetch(onoff.OnOffHandler, request)
 
-  async def get_scheduled_messages(self, user_id):
-    request = schedule.ScheduleRequest(user_id)
+  async def notify_many(
+    self,
+    user_icus: Iterable[Tuple[int, List[int]]],
+    on: bool = True,
+    delay: Optional[int] = None
+  ):
+    """Notify the scheduler about many (user_id, icu_ids) at once."""
+    requests = [
+      onoff.OnOffRequest(user_id, list(icu_ids), on, delay)
+      for user_id, icu_ids in user_icus
+      if icu_ids
+    ]
+    for start in range(0, len(requests), self.BULK_SIZE):
+      bulk = onoff.BulkOnOffRequest(requests[start:start + self.BULK_SIZE])
+      await self.fetch(onoff.BulkOnOffHandler, bulk)
+
+  async def get_scheduled_messages(
+    self,
+    user_id: int,
+    icu_ids: Optional[List[int]] = None,
+    region_ids: Optional[List[int]] = None,
+    offset: int = 0,
+    limit: Optional[int] = None
+  ) -> schedule.ScheduleResponse:
+    request = schedule.ScheduleRequest(
+      user_id, icu_ids, region_ids, offset, limit
+    )
     response = await self.fetch(schedule.ScheduleHandler, request)
+    result = schedule.ScheduleResponse()
     if response.code != 200:
       logging.error('Something went wrong while fetching messages')
-      return []
+      return result
 
     try:
-      result = json.loads(response.body.decode())
+      result.from_json(response.body.decode())
     except Exception as e:
       logging.error(
         f"Could not parse {response.body} as ScheduleResponse: {e}"
       )
-      return []
+      return schedule.ScheduleResponse()
 
     return result
@@ -1,13 +1,28 @@
 """Email sender."""
 import abc
+import asyncio
+import contextlib
 from email.message import EmailMessage
+import queue
 import smtplib
+import threading
+import time
+from typing import Iterable, List, Tuple
 
 from absl import logging
 
+# Errors after which an SMTP connection cannot be used anymore.
+CONNECTION_ERRORS = (
+  smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError
+)
+
 
 class EmailSender(abc.ABC):
   """Base class for email senders."""
+
+  # Whether send is a coroutine.
+  is_async = False
+
   def __init__(self, config):
     self.config = config
 
@@ -16,14 +31,48 @@ class EmailSender(abc.ABC):
     """Send the email with the specified contents and subject."""
     return
 
+  def send_many(self, emails: Iterable[Tuple[str, str, str]]) -> List[int]:
+    """Sends several (email, subject, contents).
 
-class SMTPEmailSender(EmailSender):
-  """Sends emails using an SMTP server."""
-  def __init__(self, config):
-    super().__init__(config)
-    self.smtp = self._connect()
+    It does not raise: the emails that could not be sent are reported instead.
+
+    Returns:
+     The indices of the emails that could not be sent.
+    """
+    failed = []
+    for index, (email, subject, contents) in enumerate(emails):
+      try:
+        self.send(email, subject, contents)
+      except Exception as e:
+        logging.warning(f'Could not send email to {email}: {e}')
+        failed.append(index)
+    return failed
+
+
+def make_message(subject, contents) -> EmailMessage:
+  msg = EmailMessage()
+  msg.set_content(contents)
+  if subject:
+    msg['Subject'] = subject
+  return msg
+
+
+class SMTPConnectionPool:
+  """A pool of logged in connections to the SMTP server of the config.
+
+  Connections are created on demand, up to `size`. A connection that has been
+  idle for more than `check_after` seconds is checked with a NOOP before being
+  reused, and replaced if the server closed it.
+  """
+  def __init__(self, config, size=1, check_after=30):
+    self.config = config
+    self.size = size
+    self.check_after = check_after
+    # Idle connections with the time they were released.
+    self._idle: queue.LifoQueue = queue.LifoQueue()
+    self._slots = threading.BoundedSemaphore(size)
 
-  def _connect(self):
+  def connect(self):
     """Connects to the SMTP server specified in the config."""
     config = self.config
     logging.info(f'Connecting to SMTP server {config.SMTP_HOST}')
@@ -34,21 +83,181 @@ class SMTPEmailSender(EmailSender):
     smtp.login(config.SMTP_USER, config.SMTP_PASSWORD)
     return smtp
 
-  def _maybe_reconnect(self):
-    """Reconnects the SMTP server if disconnected."""
+  def _is_alive(self, smtp) -> bool:
     try:
-      self.smtp.noop()
-    except smtplib.SMTPServerDisconnected:
-      self.smtp = self._connect()
+      return smtp.noop()[0] == 250
+    except OSError:
+      return False
 
-  def send(self, email, subject, contents):
-    msg = EmailMessage()
-    msg.set_content(contents)
-    if subject:
-      msg['Subject'] = subject
-    self._maybe_reconnect()
+  def _get(self):
+    try:
+      smtp, released = self._idle.get_nowait()
+    except queue.Empty:
+      return self.connect()
+    if time.monotonic(
+    ) - released > self.check_after and not self._is_alive(smtp):
+      self.close_connection(smtp)
+      return self.connect()
+    return smtp
+
+  def put_idle(self, smtp):
+    self._idle.put((smtp, time.monotonic()))
+
+  @staticmethod
+  def close_connection(smtp):
+    try:
+      smtp.quit()
+    except Exception:
+      pass
+
+  @contextlib.contextmanager
+  def connection(self):
+    """Yields a connection, to be used by a single thread at a time.
+
+    The connection is given back to the pool unless an SMTP error occurred,
+    in which case it is closed.
+    """
+    with self._slots:
+      smtp = self._get()
+      try:
+        yield smtp
+      except CONNECTION_ERRORS:
+        self.close_connection(smtp)
+        raise
+      except Exception:
+        self.put_idle(smtp)
+        raise
+      else:
+        self.put_idle(smtp)
+
+  def close(self):
+    while True:
+      try:
+        smtp, _ = self._idle.get_nowait()
+      except queue.Empty:
+        return
+      self.close_connection(smtp)
+
+
+class SMTPEmailSender(EmailSender):
+  """Sends emails using a pool of connections to an SMTP server.
+
+  The size of the pool is set by `email.pool_size`. A message whose sending
+  fails because the connection was lost is sent again on a new connection.
+  """
+
+  POOL_SIZE = 2
+  CHECK_AFTER = 30  # in seconds.
+
+  def __init__(self, config):
+    super().__init__(config)
+    self.pool = SMTPConnectionPool(
+      config,
+      size=config.email.get('pool_size', self.POOL_SIZE),
+      check_after=config.email.get('check_after', self.CHECK_AFTER)
+    )
+    # Connects right away to report configuration errors early.
+    self.pool.put_idle(self.pool.connect())
+
+  def _sendmail(self, smtp, email, subject, contents):
+    msg = make_message(subject, contents)
     # It is easier to test sendmail instead of send_message.
-    self.smtp.sendmail(self.config.EMAIL_FROM, email, msg.as_string())
+    smtp.sendmail(self.config.EMAIL_FROM, email, msg.as_string())
+
+  def send(self, email, subject, contents):
+    try:
+      with self.pool.connection() as smtp:
+        return self._sendmail(smtp, email, subject, contents)
+    except CONNECTION_ERRORS as e:
+      logging.info(f'SMTP connection lost ({e}), reconnecting.')
+    with self.pool.connection() as smtp:
+      return self._sendmail(smtp, email, subject, contents)
+
+  def send_many(self, emails: Iterable[Tuple[str, str, str]]) -> List[int]:
+    """Sends the emails over a single session, reconnecting if needed."""
+    failed = []
+    emails = list(enumerate(emails))
+    while emails:
+      try:
+        with self.pool.connection() as smtp:
+          while emails:
+            index, (email, subject, contents) = emails[0]
+            try:
+              self._sendmail(smtp, email, subject, contents)
+            except smtplib.SMTPResponseException as e:
+              # The server refused this message, not the session.
+              logging.warning(f'Could not send email to {email}: {e}')
+              failed.append(index)
+            emails.pop(0)
+      except CONNECTION_ERRORS as e:
+        # Gives up on the message the connection was lost on.
+        index, (email, _, _) = emails.pop(0)
+        logging.warning(f'Could not send email to {email}: {e}')
+        failed.append(index)
+      except Exception as e:
+        # E.g. the connection cannot be opened: none of the rest was sent.
+        logging.warning(f'Could not send {len(emails)} emails: {e}')
+        failed.extend(index for index, _ in emails)
+        break
+    return failed
+
+
+class AsyncSMTPEmailSender(EmailSender):
+  """Sends emails from the IOLoop using aiosmtplib.
+
+  The concurrent senders share a single connection, opened on demand. A
+  message whose sending fails because the connection was lost is sent again
+  on a new connection.
+  """
+
+  is_async = True
+
+  def __init__(self, config):
+    super().__init__(config)
+    import aiosmtplib
+    self._aiosmtplib = aiosmtplib
+    self._smtp = None
+    # Created in the IOLoop, on first use.
+    self._lock = None
+
+  async def _connect(self):
+    config = self.config
+    logging.info(f'Connecting to SMTP server {config.SMTP_HOST}')
+    # Same format as smtplib: host[:port].
+    host, _, port = config.SMTP_HOST.partition(':')
+    smtp = self._aiosmtplib.SMTP(
+      hostname=host,
+      port=int(port) if port else None,
+      use_tls=bool(config.email.use_ssl)
+    )
+    await smtp.connect()
+    await smtp.login(config.SMTP_USER, config.SMTP_PASSWORD)
+    return smtp
+
+  async def _connection(self, lost=None):
+    """Returns the connection, opening a new one if needed.
+
+    Args:
+     lost: a connection found to be closed, replaced unless it was already.
+    """
+    if self._lock is None:
+      self._lock = asyncio.Lock()
+    async with self._lock:
+      if lost is not None and self._smtp is lost:
+        self._smtp = None
+      if self._smtp is None or not self._smtp.is_connected:
+        self._smtp = await self._connect()
+      return self._smtp
+
+  async def send(self, email, subject, contents):
+    msg = make_message(subject, contents).as_string()
+    smtp = await self._connection()
+    try:
+      return await smtp.sendmail(self.config.EMAIL_FROM, email, msg)
+    except self._aiosmtplib.SMTPServerDisconnected as e:
+      logging.info(f'SMTP connection lost ({e}), reconnecting.')
+    smtp = await self._connection(lost=smtp)
+    return await smtp.sendmail(self.config.EMAIL_FROM, email, msg)
 
 
 class FakeEmailSender(EmailSender):
@@ -61,6 +270,8 @@ def get(config, protocol=None):
   protocol = protocol.lower()
   if protocol == 'smtp':
     return SMTPEmailSender(config)
+  elif protocol == 'async_smtp':
+    return AsyncSMTPEmailSender(config)
   elif protocol == 'fake':
     return FakeEmailSender(config)
   raise ValueError(f'Incorrect email protocol {protocol}.')
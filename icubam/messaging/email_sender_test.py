@@ -1,9 +1,14 @@
+import concurrent.futures
 import os
 import smtplib
 import unittest
 from unittest.mock import call, patch
 
+import tornado.gen
+import tornado.testing
+
 from icubam.messaging import email_sender
+from icubam.messaging import mock_smtp
 from icubam import config
 
 SMTP_HOST = 'localhost'
@@ -54,11 +59,124 @@ class EmailSenderTest(unittest.TestCase):
     sender = email_sender.SMTPEmailSender(self.config)
 
     smtp = mock_smtp.return_value
-    smtp.noop.side_effect = smtplib.SMTPServerDisconnected()
+    smtp.sendmail.side_effect = [smtplib.SMTPServerDisconnected(), {}]
     sender.send('user@test.org', 'Test!', 'foo bar.')
 
     self.assertEqual(
       mock_smtp.call_args_list,
       [call(SMTP_HOST), call(SMTP_HOST)]
     )
-    smtp.sendmail.assert_called_once()
+    self.assertEqual(smtp.sendmail.call_count, 2)
+
+  @patch('smtplib.SMTP')
+  def test_smtp_health_check(self, mock_smtp):
+    self.config.email.use_ssl = False
+    sender = email_sender.SMTPEmailSender(self.config)
+    smtp = mock_smtp.return_value
+    sender.send('user@test.org', 'Test!', 'foo bar.')
+    smtp.noop.assert_not_called()
+
+    # Idle connections are checked before being reused.
+    sender.pool.check_after = -1
+    smtp.noop.return_value = (250, b'OK')
+    sender.send('user@test.org', 'Test!', 'foo bar.')
+    smtp.noop.assert_called_once()
+    mock_smtp.assert_called_once()
+
+    smtp.noop.side_effect = smtplib.SMTPServerDisconnected()
+    sender.send('user@test.org', 'Test!', 'foo bar.')
+    self.assertEqual(mock_smtp.call_count, 2)
+
+
+class SMTPPoolTest(unittest.TestCase):
+  def setUp(self):
+    super().setUp()
+    self.server = mock_smtp.MockSMTPServer().start()
+    self.addCleanup(self.server.stop)
+    os.environ['SMTP_HOST'] = self.server.host
+    os.environ['SMTP_USER'] = SMTP_USER
+    os.environ['SMTP_PASSWORD'] = SMTP_PASSWORD
+    os.environ['EMAIL_FROM'] = EMAIL_FROM
+    self.config = config.Config('resources/test.toml')
+    self.config.email.use_ssl = False
+    self.config.email.pool_size = 2
+    self.sender = email_sender.SMTPEmailSender(self.config)
+    self.addCleanup(self.sender.pool.close)
+
+  def test_send_many(self):
+    emails = [(f'user{i}@test.org', 'Test!', f'foo {i}') for i in range(20)]
+    self.assertEqual(self.sender.send_many(emails), [])
+    self.assertEqual(len(self.server.messages), 20)
+    self.assertEqual(self.server.messages[3][1], ['user3@test.org'])
+    self.assertEqual(self.server.num_connections, 1)
+
+  def test_send_concurrently(self):
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+      futures = [
+        executor.submit(
+          self.sender.send, f'user{i}@test.org', 'Test!', f'foo {i}'
+        ) for i in range(20)
+      ]
+      for future in futures:
+        future.result()
+    self.assertEqual(len(self.server.messages), 20)
+    self.assertLessEqual(self.server.num_connections, 2)
+
+  def test_connection_lost(self):
+    self.sender.send('user@test.org', 'Test!', 'foo bar.')
+    self.server.drop_next = True
+    self.sender.send('user@test.org', 'Test!', 'foo bar.')
+    self.assertEqual(len(self.server.messages), 2)
+    self.assertEqual(self.server.num_connections, 2)
+
+    # In a batch, the message the connection was lost on is reported.
+    self.server.drop_next = True
+    emails = [(f'user{i}@test.org', 'Test!', f'foo {i}') for i in range(3)]
+    self.assertEqual(self.sender.send_many(emails), [0])
+    self.assertEqual(len(self.server.messages), 4)
+
+  def test_send_many_cannot_connect(self):
+    emails = [(f'user{i}@test.org', 'Test!', f'foo {i}') for i in range(3)]
+    with patch.object(
+      self.sender.pool,
+      'connect',
+      side_effect=smtplib.SMTPAuthenticationError(535, b'Denied')
+    ):
+      self.sender.pool.close()
+      self.assertEqual(self.sender.send_many(emails), [0, 1, 2])
+
+
+class AsyncSMTPEmailSenderTest(tornado.testing.AsyncTestCase):
+  def setUp(self):
+    super().setUp()
+    self.server = mock_smtp.MockSMTPServer().start()
+    self.addCleanup(self.server.stop)
+    os.environ['SMTP_HOST'] = self.server.host
+    os.environ['SMTP_USER'] = SMTP_USER
+    os.environ['SMTP_PASSWORD'] = SMTP_PASSWORD
+    os.environ['EMAIL_FROM'] = EMAIL_FROM
+    self.config = config.Config('resources/test.toml')
+    self.config.email.use_ssl = False
+    self.sender = email_sender.get(self.config, 'ASYNC_SMTP')
+
+  @tornado.testing.gen_test(timeout=10)
+  async def test_send_concurrently(self):
+    await tornado.gen.multi([
+      self.sender.send(f'user{i}@test.org', 'Test!', f'foo {i}')
+      for i in range(10)
+    ])
+    self.assertEqual(len(self.server.messages), 10)
+    self.assertEqual(
+      sorted(m[1][0] for m in self.server.messages),
+      sorted(f'user{i}@test.org' for i in range(10))
+    )
+    # A single connection is shared.
+    self.assertEqual(self.server.num_connections, 1)
+
+  @tornado.testing.gen_test(timeout=10)
+  async def test_connection_lost(self):
+    await self.sender.send('user@test.org', 'Test!', 'foo bar.')
+    self.server.drop_next = True
+    await self.sender.send('user@test.org', 'Test!', 'foo bar.')
+    self.assertEqual(len(self.server.messages), 2)
+    self.assertEqual(self.server.num_connections, 2)
@@ -16,6 +16,20 @@ class OnOffRequest(serializable.Serizalizable):
   delay: Optional[int] = None
 
 
+@dataclasses.dataclass
+class BulkOnOffRequest(serializable.Serizalizable):
+  """Several OnOffRequest at once, e.g. when importing users."""
+  requests: Optional[List[OnOffRequest]] = None
+
+  def from_json(self, encoded):
+    super().from_json(encoded)
+    if self.requests is not None:
+      self.requests = [
+        r if isinstance(r, OnOffRequest) else OnOffRequest(**r)
+        for r in self.requests
+      ]
+
+
 class OnOffHandler(tornado.web.RequestHandler):
   """This handler is used to activate of deactivate the reception of messages.
 
@@ -30,35 +44,95 @@ class OnOffHandler(tornado.web.RequestHandler):
     self.db = db_factory.create()
     self.scheduler = scheduler
 
-  async def post(self):
-    request = OnOffRequest()
+  def parse(self, request):
+    """Parses the body into the request, returns whether it succeeded."""
     try:
       body = self.request.body
       request.from_json(body.decode())
     except Exception as e:
       self.set_status(400)
-      return logging.error(f"Cannot parse request {body}: {e}")
+      logging.error(f"Cannot parse request {body}: {e}")
+      return False
+    return True
 
+  @staticmethod
+  def is_complete(request: OnOffRequest) -> bool:
     if request.user_id is None or request.icu_ids is None:
-      self.set_status(400)
-      return logging.error(f"Incomplete request: {request}")
+      logging.error(f"Incomplete request: {request}")
+      return False
+    return True
+
+  def apply(self, requests: List[OnOffRequest], users) -> List[int]:
+    """Schedules or unschedules the messages of the requests.
 
-    if not request.on:
+    Args:
+      requests: the complete requests to apply.
+      users: the users of the requests to be turned on, by user_id.
+
+    Returns:
+      The ids of the unknown users.
+    """
+    unknown = []
+    to_schedule = []
+    for request in requests:
+      if not request.on:
+        for icu_id in request.icu_ids:
+          self.scheduler.unschedule(request.user_id, icu_id)
+        continue
+
+      user = users.get(request.user_id, None)
+      if user is None:
+        logging.error(f"Unknown user {request.user_id}")
+        unknown.append(request.user_id)
+        continue
+
+      user_icus = {i.icu_id: i for i in user.icus}
       for icu_id in request.icu_ids:
-        self.scheduler.unschedule(request.user_id, icu_id)
+        icu = user_icus.get(icu_id, None)
+        if icu is None:
+          logging.error(f"User {user.user_id} does not belong to ICU {icu_id}")
+          continue
+        to_schedule.append((user, icu, request.delay))
+    self.scheduler.schedule_many(to_schedule)
+    return unknown
+
+  async def post(self):
+    request = OnOffRequest()
+    if not self.parse(request):
       return
 
-    user = self.db.get_user(request.user_id)
-    if user is None:
+    if not self.is_complete(request):
+      return self.set_status(400)
+
+    users = {}
+    if request.on:
+      user = self.db.get_user(request.user_id)
+      if user is not None:
+        users[user.user_id] = user
+    if self.apply([request], users):
       self.set_status(400)
-      return logging.error("Unknown user {}".format(user.user_id))
-
-    user_icus = {i.icu_id: i for i in user.icus}
-    for icu_id in request.icu_ids:
-      icu = user_icus.get(icu_id, None)
-      if icu is None:
-        logging.error(
-          f"User {user.user_id} does not belong to ICU {icu.icu_id}"
-        )
-        continue
-      self.scheduler.schedule(user, icu, request.delay)
+
+
+class BulkOnOffHandler(OnOffHandler):
+  """Turns on or off the messages of many users in a single call.
+
+  The incomplete requests and the requests of unknown users are skipped.
+  """
+
+  ROUTE = '/onoff/bulk'
+
+  async def post(self):
+    bulk = BulkOnOffRequest()
+    if not self.parse(bulk):
+      return
+
+    if bulk.requests is None:
+      self.set_status(400)
+      return logging.error("Incomplete bulk request")
+
+    requests = [r for r in bulk.requests if self.is_complete(r)]
+    user_ids = {r.user_id for r in requests if r.on}
+    users = {u.user_id: u for u in self.db.get_users_by_ids(user_ids)}
+    unknown = self.apply(requests, users)
+    skipped = len(bulk.requests) - len(requests) + len(unknown)
+    self.write({'applied': len(bulk.requests) - skipped, 'skipped': skipped})
@@ -25,3 +25,14 @@ class OnOffRequestTestCase(unittest.TestCase):
     self.assertEqual(decoded.on, on)
     self.assertEqual(decoded.on, on)
     self.assertEqual(decoded.delay, delay)
+
+  def test_bulk_request(self):
+    requests = [
+      onoff.OnOffRequest(user_id=1, icu_ids=[2, 3], on=True, delay=10),
+      onoff.OnOffRequest(user_id=4, icu_ids=[5], on=False),
+    ]
+    encoded = onoff.BulkOnOffRequest(requests).to_json()
+
+    decoded = onoff.BulkOnOffRequest()
+    decoded.from_json(encoded)
+    self.assertEqual(decoded.requests, requests)
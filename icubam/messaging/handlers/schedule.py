@@ -1,8 +1,7 @@
 from absl import logging
 import dataclasses
-import json
 import tornado.web
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 
 from icubam.messaging import message
 from icubam.messaging import serializable
@@ -10,7 +9,16 @@ from icubam.messaging import serializable
 
 @dataclasses.dataclass
 class ScheduleRequest(serializable.Serizalizable):
+  """The messages of the ICUs managed by a user, possibly filtered and paged.
+
+  Only the messages of the ICUs in `icu_ids` and `region_ids` are returned
+  if set. The messages are sorted by time and paged by `offset` and `limit`.
+  """
   user_id: Optional[int] = None
+  icu_ids: Optional[List[int]] = None
+  region_ids: Optional[List[int]] = None
+  offset: int = 0
+  limit: Optional[int] = None
 
 
 @dataclasses.dataclass
@@ -26,6 +34,13 @@ class ScheduledMessage:
   url: Optional[str] = None
 
 
+@dataclasses.dataclass
+class ScheduleResponse(serializable.Serizalizable):
+  """A page of scheduled messages, as dicts, and the total number of them."""
+  messages: List[Dict] = dataclasses.field(default_factory=list)
+  total: int = 0
+
+
 class ScheduleHandler(tornado.web.RequestHandler):
   """This handler returns all the scheduled messages information."""
 
@@ -63,7 +78,15 @@ class ScheduleHandler(tornado.web.RequestHandler):
       logging.error(f"No such user {request.user_id}")
       return
 
-    icu_ids = [icu.icu_id for icu in self.db.get_managed_icus(user.user_id)]
-    messages = self.scheduler.get_messages(icu_ids)
-    response = self.build_response(messages)
-    return self.write(json.dumps(response))
+    icus = self.db.get_managed_icus(user.user_id)
+    if request.icu_ids is not None:
+      icu_ids = set(request.icu_ids)
+      icus = [icu for icu in icus if icu.icu_id in icu_ids]
+    if request.region_ids is not None:
+      region_ids = set(request.region_ids)
+      icus = [icu for icu in icus if icu.region_id in region_ids]
+    messages, total = self.scheduler.get_messages([icu.icu_id for icu in icus],
+                                                  request.offset,
+                                                  request.limit)
+    response = ScheduleResponse(self.build_response(messages), total)
+    return self.write(response.to_json())
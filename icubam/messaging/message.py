@@ -20,6 +20,26 @@ class Message:
     self.attempts = 0
     self.first_sent = None
 
+  @classmethod
+  def from_state(
+    cls, user_id, icu_id, attempts, first_sent, phone, user_name, icu_name,
+    locale_code, url
+  ):
+    """Rebuilds a message persisted by the scheduler, see SchedulerState."""
+    msg = cls.__new__(cls)
+    msg.icu_id = icu_id
+    msg.phone = phone
+    msg.user_id = user_id
+    msg.user_name = user_name
+    msg.icu_name = icu_name
+    msg.url = url
+    msg.locale_code = locale_code
+    msg.text = ""
+    msg.html = ""
+    msg.attempts = attempts
+    msg.first_sent = first_sent
+    return msg
+
   def reset(self):
     self.attempts = 0
     self.first_sent = None
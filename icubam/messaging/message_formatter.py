@@ -1,7 +1,10 @@
 import os.path
+import re
+import tornado.escape
 import tornado.locale
 import tornado.template
 import pathlib
+from typing import Dict, Iterable, List, Tuple
 
 
 class MessageFormatter:
@@ -9,23 +12,80 @@ class MessageFormatter:
 
   Formatting means turning the data in the message into a localized text or
   html.
+
+  Since the messages only differ by the fields of the message that are used by
+  the templates, the templates are rendered once per locale with placeholders
+  for those fields, which are then just substituted for each message.
   """
   ROOT_PATH = pathlib.Path(__file__).resolve().parents[2].as_posix()
   ROOT_PATH = os.path.join(ROOT_PATH, 'resources', 'messages')
   TRANSLATION_FOLDER = os.path.join(ROOT_PATH, 'translations')
   HTML_TEMPLATE = 'message.html'
   TEXT_TEMPLATE = 'message.txt'
+  # The fields of the message used in the templates.
+  FIELDS = ('user_name', 'icu_name', 'url')
+  PLACEHOLDER = '@@icubam:{}@@'
 
   def __init__(self):
     tornado.locale.load_translations(self.TRANSLATION_FOLDER)
     loader = tornado.template.Loader(self.ROOT_PATH)
     self.html_template = loader.load(self.HTML_TEMPLATE)
     self.text_template = loader.load(self.TEXT_TEMPLATE)
+    # Keys: locale codes, values: the compiled (html, text) templates.
+    self._cache: Dict[str, Tuple[List[str], List[str]]] = {}
+    placeholders = [self.PLACEHOLDER.format(f) for f in self.FIELDS]
+    self._split_re = re.compile('|'.join(re.escape(p) for p in placeholders))
+    self._fields_by_placeholder = dict(zip(placeholders, self.FIELDS))
+
+  def _compile(self, template, translate) -> List[str]:
+    """Renders the template with placeholders.
+
+    Returns a list alternating constant strings and field names.
+    """
+    placeholders = {f: self.PLACEHOLDER.format(f) for f in self.FIELDS}
+    rendered = template.generate(
+      msg=type('Placeholders', (), placeholders), _=translate
+    ).decode()
+    result = []
+    start = 0
+    for match in self._split_re.finditer(rendered):
+      result.append(rendered[start:match.start()])
+      result.append(self._fields_by_placeholder[match.group()])
+      start = match.end()
+    result.append(rendered[start:])
+    return result
+
+  def get_compiled(self, locale_code: str) -> Tuple[List[str], List[str]]:
+    compiled = self._cache.get(locale_code, None)
+    if compiled is None:
+      translate = tornado.locale.get(locale_code).translate
+      html = self._compile(self.html_template, translate)
+      text = self._compile(self.text_template, translate)
+      compiled = html, text
+      self._cache[locale_code] = compiled
+    return compiled
+
+  @staticmethod
+  def _render(compiled: List[str], values: Dict[str, str]) -> str:
+    parts = list(compiled)
+    for i in range(1, len(parts), 2):
+      parts[i] = values[parts[i]]
+    return ''.join(parts)
 
   def format(self, msg, may_renew_token=False):
     """Sets both the msg.text and msg.html members of the message."""
-    locale = tornado.locale.get(msg.locale_code)
-    html = self.html_template.generate(msg=msg, _=locale.translate)
-    msg.html = html.decode()
-    text = self.text_template.generate(msg=msg, _=locale.translate)
-    msg.text = text.decode()
+    html, text = self.get_compiled(msg.locale_code)
+    # Escaped as the templates would do.
+    values = {}
+    for field in self.FIELDS:
+      value = getattr(msg, field)
+      values[field] = tornado.escape.xhtml_escape(
+        value if isinstance(value, str) else str(value)
+      )
+    msg.html = self._render(html, values)
+    msg.text = self._render(text, values)
+
+  def format_many(self, msgs: Iterable):
+    """Formats several messages, e.g. all the messages of a ping."""
+    for msg in msgs:
+      self.format(msg)
@@ -1,6 +1,7 @@
 import itertools
 
 from absl.testing import absltest
+import tornado.locale
 
 from icubam import config
 from icubam.db import store
@@ -33,6 +34,26 @@ class MessageFormatterTest(absltest.TestCase):
     for item, text in to_be_tested:
       self.assertContainsSubsequence(text, item)
 
+  def test_format_as_templates(self):
+    msg = message.Message(self.icu, self.user, 'http://a.b/?c=1&d="2"')
+    msg.user_name = '<b>Jean & Marie</b>'
+    for locale_code in ['fr', 'en_US']:
+      msg.locale_code = locale_code
+      self.formatter.format(msg)
+      translate = tornado.locale.get(locale_code).translate
+      html = self.formatter.html_template.generate(msg=msg, _=translate)
+      text = self.formatter.text_template.generate(msg=msg, _=translate)
+      self.assertEqual(msg.html, html.decode())
+      self.assertEqual(msg.text, text.decode())
+
+  def test_format_many(self):
+    msgs = [message.Message(self.icu, self.user, f'url{i}') for i in range(10)]
+    self.formatter.format_many(msgs)
+    for i, msg in enumerate(msgs):
+      self.assertContainsSubsequence(msg.text, f'url{i}')
+      self.assertContainsSubsequence(msg.html, f'url{i}')
+    self.assertEqual(list(self.formatter._cache), ['fr'])
+
 
 if __name__ == '__main__':
   absltest.main()
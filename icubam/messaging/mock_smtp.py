@@ -0,0 +1,90 @@
+"""A local SMTP server stand-in for tests and benchmarks."""
+import socketserver
+import threading
+from typing import List, Tuple
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+  """Speaks just enough SMTP for smtplib: EHLO, AUTH PLAIN, MAIL, RCPT, DATA."""
+  def reply(self, line: str):
+    self.wfile.write(f'{line}\r\n'.encode())
+
+  def handle(self):
+    server = self.server
+    with server.lock:
+      server.num_connections += 1
+    self.reply('220 localhost mock SMTP')
+    sender, recipients = None, []
+    while True:
+      line = self.rfile.readline()
+      if not line:
+        return
+      command = line.decode().strip()
+      verb = command.split(' ', 1)[0].upper()
+      if server.drop_next:
+        server.drop_next = False
+        return
+      if verb == 'EHLO':
+        self.reply('250-localhost')
+        self.reply('250 AUTH PLAIN LOGIN')
+      elif verb == 'HELO':
+        self.reply('250 localhost')
+      elif verb == 'AUTH':
+        self.reply('235 Authentication successful')
+      elif verb == 'MAIL':
+        sender, recipients = command[len('MAIL FROM:'):], []
+        self.reply('250 OK')
+      elif verb == 'RCPT':
+        recipients.append(command[len('RCPT TO:'):].strip('<>'))
+        self.reply('250 OK')
+      elif verb == 'DATA':
+        self.reply('354 End data with <CR><LF>.<CR><LF>')
+        data = []
+        while True:
+          data_line = self.rfile.readline()
+          if not data_line or data_line == b'.\r\n':
+            break
+          data.append(data_line.decode())
+        with server.lock:
+          server.messages.append((sender, recipients, ''.join(data)))
+        self.reply('250 OK')
+      elif verb in ('NOOP', 'RSET'):
+        self.reply('250 OK')
+      elif verb == 'QUIT':
+        self.reply('221 Bye')
+        return
+      else:
+        self.reply('502 Command not implemented')
+
+
+class MockSMTPServer(socketserver.ThreadingTCPServer):
+  """Records the messages it receives, serves on a free local port.
+
+  Setting `drop_next` makes the server close the connection instead of
+  answering the next command, to simulate a lost connection.
+  """
+
+  daemon_threads = True
+  allow_reuse_address = True
+
+  def __init__(self):
+    super().__init__(('127.0.0.1', 0), _SMTPHandler)
+    self.lock = threading.Lock()
+    self.messages: List[Tuple[str, List[str], str]] = []
+    self.num_connections = 0
+    self.drop_next = False
+    self._thread = None
+
+  @property
+  def host(self) -> str:
+    host, port = self.server_address
+    return f'{host}:{port}'
+
+  def start(self):
+    self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+    self._thread.start()
+    return self
+
+  def stop(self):
+    self.shutdown()
+    self.server_close()
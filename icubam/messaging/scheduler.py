@@ -1,11 +1,17 @@
 from absl import logging
+import contextlib
 import dataclasses
+import heapq
+import itertools
+import numbers
 import time
+import tornado.gen
 import tornado.ioloop
-from typing import List, Optional
+from typing import Iterable, List, Optional, Tuple
 
-from icubam import time_utils
+from icubam import metrics, time_utils
 from icubam.messaging import message
+from icubam.messaging import scheduler_state
 from icubam.www import updater
 
 
@@ -17,7 +23,20 @@ class ScheduledMessage:
 
 
 class MessageScheduler:
-  """Schedules the sending of SMS to users."""
+  """Schedules the sending of SMS to users.
+
+  By default, each message gets its own IOLoop timeout. If `scheduler.tick` is
+  set in the config, the messages are instead kept in a due-queue sorted by
+  time, that is processed every tick by the `process` coroutine: the latest bed
+  counts of all the due ICUs are loaded in a single query and the messages are
+  dispatched by batches of `scheduler.batch_size`.
+
+  If `scheduler.state_path` is set, the scheduled messages are also persisted
+  to this SQLite file so that they can be restored after a restart.
+  """
+
+  BATCH_SIZE = 500
+
   def __init__(self, config, db, queue):
     self.config = config
     self.db = db
@@ -30,8 +49,31 @@ class MessageScheduler:
 
     # Keys: by (user_id, icu_id), value is ScheduledMessage
     self.timeouts = {}
+    metrics.SCHEDULED_MESSAGES.set_function(lambda: len(self.timeouts))
     self.updater = updater.Updater(self.config, self.db)
 
+    self.tick = self.config.scheduler.tick
+    if not isinstance(self.tick, numbers.Number) or self.tick <= 0:
+      self.tick = None
+    self.batch_size = self.config.scheduler.batch_size
+    if not isinstance(self.batch_size, int) or self.batch_size <= 0:
+      self.batch_size = self.BATCH_SIZE
+    # Heap of (when, sequence number, ScheduledMessage). Unscheduled messages
+    # are not removed from the heap, but skipped when they are due.
+    self.due = []
+    self._counter = itertools.count()
+
+    self.state = None
+    state_path = self.config.scheduler.state_path
+    if isinstance(state_path, str):
+      self.state = scheduler_state.SchedulerState(state_path)
+
+  def _batch(self):
+    """Groups the writes to the persisted state."""
+    if self.state is None:
+      return contextlib.nullcontext()
+    return self.state.batch()
+
   def computes_delay(self, delay=None) -> int:
     """Computes the delay if None."""
     if delay is not None:
@@ -54,43 +96,206 @@ class MessageScheduler:
 
     when = delay + time.time()
     timeout = self.timeouts.get(msg.key, None)
-    io_loop = tornado.ioloop.IOLoop.current()
     if timeout is not None:
       self.unschedule(msg.user_id, msg.icu_id)
 
-    handle = io_loop.call_later(delay, self.may_send, msg)
-    self.timeouts[msg.key] = ScheduledMessage(handle, msg, when)
+    if self.tick is None:
+      io_loop = tornado.ioloop.IOLoop.current()
+      handle = io_loop.call_later(delay, self.may_send, msg)
+      self.timeouts[msg.key] = ScheduledMessage(handle, msg, when)
+    else:
+      scheduled = ScheduledMessage(None, msg, when)
+      self.timeouts[msg.key] = scheduled
+      heapq.heappush(self.due, (when, next(self._counter), scheduled))
+      self._maybe_compact()
+    if self.state is not None:
+      self.state.save(msg, when)
     logging.info('Scheduling {} in {}s.'.format(msg.icu_name, delay))
     return True
 
-  def schedule(self, user, icu, delay: Optional[int] = None) -> bool:
+  def can_schedule(self, user, icu) -> bool:
     user_icus = {i.icu_id: i for i in user.icus}
     if not user.is_active or not icu.is_active or icu.icu_id not in user_icus:
       user_id, icu_id = user.user_id, icu.icu_id
       logging.info(f'Cannot send message to user {user_id} in icu {icu_id}')
       return False
+    return True
+
+  def schedule(
+    self,
+    user,
+    icu,
+    delay: Optional[int] = None,
+    url: Optional[str] = None
+  ) -> bool:
+    if not self.can_schedule(user, icu):
+      return False
 
-    url = self.updater.get_url(user.user_id, icu.icu_id)
+    if url is None:
+      url = self.updater.get_url(user.user_id, icu.icu_id)
     msg = message.Message(icu, user, url)
     return self.schedule_message(msg, delay)
 
+  def schedule_many(
+    self, items: Iterable[Tuple[object, object, Optional[int]]]
+  ):
+    """Schedules messages for many (user, icu, delay), getting urls in bulk."""
+    items = [(user, icu, delay)
+             for user, icu, delay in items
+             if self.can_schedule(user, icu)]
+    urls = self.updater.get_urls((u.user_id, i.icu_id) for u, i, _ in items)
+    with self._batch():
+      for user, icu, delay in items:
+        url = urls[(user.user_id, icu.icu_id)]
+        self.schedule(user, icu, delay=delay, url=url)
+
   def schedule_all(self, delay=None):
     """Schedules messages for all the users."""
-    users = self.db.get_users()
-    for user in users:
-      for icu in user.icus:
-        self.schedule(user, icu, delay=delay)
+    users = self.db.get_users(with_icus=True)
+    self.schedule_many((user, icu, delay)
+                       for user in users
+                       for icu in user.icus)
+
+  def restore(self, delay=None) -> int:
+    """Schedules again the persisted messages, returns their number.
+
+    Messages that became due while the server was down are sent right away,
+    with their attempts and first sending time, so that reminders are neither
+    dropped nor duplicated. The persisted messages are checked against the
+    current users: those that cannot be scheduled anymore are dropped, and
+    the users and ICUs without any persisted message are scheduled with the
+    given delay, as by schedule_all. The restored messages get the current
+    phone, names and url of their user and ICU.
+    """
+    if self.state is None:
+      self.schedule_all(delay)
+      return 0
+
+    persisted = list(self.state.iter_messages())
+    # The users and their ICUs are checked in bulk, in a couple of queries.
+    pairs = {(user.user_id, icu.icu_id): (user, icu)
+             for user in self.db.get_users(with_icus=True)
+             for icu in user.icus
+             if self.can_schedule(user, icu)}
+    kept, dropped = [], 0
+    with self._batch():
+      for msg, when in persisted:
+        if msg.key not in pairs:
+          self.state.remove(*msg.key)
+          dropped += 1
+        else:
+          kept.append((msg, when))
+
+    urls = self.updater.get_urls(msg.key for msg, _ in kept)
+    now = time.time()
+    with self._batch():
+      for msg, when in kept:
+        user, icu = pairs.pop(msg.key)
+        restored = message.Message(icu, user, urls[msg.key])
+        restored.attempts, restored.first_sent = msg.attempts, msg.first_sent
+        restored.locale_code = msg.locale_code
+        self.schedule_message(restored, delay=max(0, int(when - now)))
+    self.schedule_many((user, icu, delay) for user, icu in pairs.values())
+    logging.info(
+      f'Restored {len(kept)} scheduled messages, dropped {dropped} and '
+      f'scheduled {len(pairs)} new ones.'
+    )
+    return len(kept)
 
   def unschedule(self, user_id: int, icu_id: int):
+    if self.state is not None:
+      self.state.remove(user_id, icu_id)
     timeout = self.timeouts.pop((user_id, icu_id), None)
     if timeout is None:
       logging.info(f'No timeout for user {user_id}')
       return
 
-    io_loop = tornado.ioloop.IOLoop.current()
-    io_loop.remove_timeout(timeout.timeout)
+    if timeout.timeout is not None:
+      io_loop = tornado.ioloop.IOLoop.current()
+      io_loop.remove_timeout(timeout.timeout)
     logging.info(f'Unscheduling message for {user_id} in {icu_id}.')
 
+  def _maybe_compact(self):
+    """Drops the unscheduled messages from the heap if they pile up."""
+    if len(self.due) <= 2 * len(self.timeouts) + self.batch_size:
+      return
+    self.due = [e for e in self.due if self.timeouts.get(e[2].msg.key) is e[2]]
+    heapq.heapify(self.due)
+
+  def pop_due(self, now: Optional[float] = None) -> List[message.Message]:
+    """Removes the messages that are due from the queue and returns them."""
+    now = time.time() if now is None else now
+    result = []
+    while self.due and self.due[0][0] <= now:
+      _, _, scheduled = heapq.heappop(self.due)
+      key = scheduled.msg.key
+      if self.timeouts.get(key) is scheduled:
+        del self.timeouts[key]
+        result.append(scheduled.msg)
+    return result
+
+  def _requeue(self, msgs: List[message.Message], when: Optional[float]):
+    """Puts back in the due-queue popped messages not scheduled since."""
+    when = time.time() if when is None else when
+    for msg in msgs:
+      if msg.key in self.timeouts:
+        continue
+      scheduled = ScheduledMessage(None, msg, when)
+      self.timeouts[msg.key] = scheduled
+      heapq.heappush(self.due, (when, next(self._counter), scheduled))
+
+  async def process_due(self, now: Optional[float] = None) -> int:
+    """Sends the due messages by batches, returns their number."""
+    msgs = self.pop_due(now)
+    if not msgs:
+      return 0
+
+    try:
+      icu_ids = {msg.icu_id for msg in msgs if msg.first_sent is not None}
+      last_modified = {}
+      if icu_ids:
+        last_modified = self.db.get_last_modified_for_icus(icu_ids)
+      to_send = []
+      with self._batch():
+        for msg in msgs:
+          if self._is_done(msg, last_modified.get(msg.icu_id, None)):
+            self._reschedule(msg)
+          else:
+            to_send.append(msg)
+
+      # Watch out, this might change the tokens if stale!
+      urls = self.updater.get_urls((msg.key for msg in to_send), update=True)
+    except Exception:
+      # Nothing was dispatched: the messages are due again at the next tick.
+      self._requeue(msgs, now)
+      raise
+
+    # A message that failed may have been sent already: it is tried again as
+    # a reminder would be.
+    retry_at = (time.time() if now is None else now) + self.reminder_delay
+    for start in range(0, len(to_send), self.batch_size):
+      with self._batch():
+        for msg in to_send[start:start + self.batch_size]:
+          try:
+            await self.do_send(msg, url=urls[msg.key])
+          except Exception as e:
+            logging.error(f'Could not dispatch message {msg.key}: {e}')
+            self._requeue([msg], retry_at)
+      # Let the other coroutines run between batches.
+      await tornado.gen.sleep(0)
+    return len(msgs)
+
+  async def process(self):
+    """Processes the due-queue every tick, if enabled."""
+    if self.tick is None:
+      return
+    while True:
+      try:
+        await self.process_due()
+      except Exception as e:
+        logging.error(f'Could not process the due messages: {e}')
+      await tornado.gen.sleep(self.tick)
+
   async def may_send(self, msg):
     # This message was never sent: send it!
     if msg.first_sent is None:
@@ -98,19 +303,38 @@ class MessageScheduler:
 
     # Otherwise check if it has been answered or sent too many times.
     bed_count = self.db.get_bed_count_for_icu(msg.icu_id)
+    last_modified = None if bed_count is None else bed_count.last_modified
+    return await self._dispatch(msg, last_modified)
+
+  async def _dispatch(self, msg, last_modified):
+    """Sends the message unless it has been answered or sent too many times.
+
+    Args:
+      msg: the due message.
+      last_modified: the last modification date of the latest bed count of the
+        ICU of the message, if any.
+    """
+    if self._is_done(msg, last_modified):
+      return self._reschedule(msg)
+    await self.do_send(msg)
+
+  def _is_done(self, msg, last_modified) -> bool:
+    """Whether the message has been answered or sent too many times."""
+    if msg.first_sent is None:
+      return False
+
     last_update = None
-    if bed_count is not None and bed_count.last_modified is not None:
-      last_update = bed_count.last_modified.timestamp()
+    if last_modified is not None:
+      last_update = last_modified.timestamp()
     uptodate = (last_update is not None) and (last_update > msg.first_sent)
-    # The message has been answered or too many tries, send for next session.
-    if uptodate or (msg.attempts > self.max_retries):
-      msg.reset()
-      # This message will be sent again at the next session.
-      return self.schedule_message(msg)
-    else:
-      await self.do_send(msg)
+    return uptodate or (msg.attempts > self.max_retries)
+
+  def _reschedule(self, msg):
+    """This message will be sent again at the next session."""
+    msg.reset()
+    return self.schedule_message(msg)
 
-  async def do_send(self, msg):
+  async def do_send(self, msg, url: Optional[str] = None):
     msg.attempts += 1
     if msg.first_sent is None:
       msg.first_sent = time.time()
@@ -121,7 +345,9 @@ class MessageScheduler:
       )
     )
     # Watch out, this might change the token if stale!
-    msg.url = self.updater.get_url(msg.user_id, msg.icu_id, update=True)
+    if url is None:
+      url = self.updater.get_url(msg.user_id, msg.icu_id, update=True)
+    msg.url = url
     if self.queue is not None:
       await self.queue.put(msg)
     self.schedule_message(msg, delay=self.reminder_delay)
@@ -130,17 +356,32 @@ class MessageScheduler:
   def messages(self):
     """For debug purpose only"""
     users = self.db.get_users()
-    result = []
-    for user in users:
-      for icu in user.icus:
-        url = self.updater.get_url(user.user_id, icu.icu_id)
-        result.append(message.Message(icu, user, url))
-    return result
+    pairs = [(user, icu) for user in users for icu in user.icus]
+    urls = self.updater.get_urls((u.user_id, i.icu_id) for u, i in pairs)
+    return [
+      message.Message(icu, user, urls[(user.user_id, icu.icu_id)])
+      for user, icu in pairs
+    ]
 
-  def get_messages(self, icus: Optional[List[int]] = None):
-    """Get the scheduled messages and their time for some icus."""
-    result = []
-    for timeout in self.timeouts.values():
-      if icus is None or timeout.msg.icu_id in icus:
-        result.append((timeout.msg, timeout.when))
-    return result
+  def get_messages(
+    self,
+    icus: Optional[Iterable[int]] = None,
+    offset: int = 0,
+    limit: Optional[int] = None
+  ) -> Tuple[List[Tuple[message.Message, float]], int]:
+    """Get the scheduled messages and their time for some icus.
+
+    Returns the page of at most `limit` messages starting at `offset`, by
+    scheduled time, and the total number of messages for these icus.
+    """
+    icus = None if icus is None else set(icus)
+    result = [(timeout.msg, timeout.when)
+              for timeout in self.timeouts.values()
+              if icus is None or timeout.msg.icu_id in icus]
+    offset = max(0, offset)
+    end = None if limit is None else offset + max(0, limit)
+    if end is None:
+      page = sorted(result, key=lambda x: x[1])[offset:]
+    else:
+      page = heapq.nsmallest(end, result, key=lambda x: x[1])[offset:]
+    return page, len(result)
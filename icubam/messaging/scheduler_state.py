@@ -0,0 +1,112 @@
+import contextlib
+import sqlite3
+from typing import Iterator, List, Tuple
+
+from icubam.messaging import message
+
+
+class SchedulerState:
+  """Persists the messages scheduled by the MessageScheduler in SQLite.
+
+  Each row holds the scheduling state of a message (its time, attempts and
+  first sending time) together with what is needed to rebuild it, so that
+  restoring the messages does not require any query on the main database.
+  """
+
+  COLUMNS = (
+    'user_id', 'icu_id', 'when_ts', 'attempts', 'first_sent', 'phone',
+    'user_name', 'icu_name', 'locale_code', 'url'
+  )
+
+  def __init__(self, path: str):
+    self.path = path
+    self._connection = sqlite3.connect(path)
+    self._connection.execute(
+      'CREATE TABLE IF NOT EXISTS scheduled_messages ('
+      'user_id INTEGER NOT NULL, icu_id INTEGER NOT NULL, '
+      'when_ts REAL NOT NULL, attempts INTEGER NOT NULL, first_sent REAL, '
+      'phone TEXT, user_name TEXT, icu_name TEXT, locale_code TEXT, url TEXT, '
+      'PRIMARY KEY (user_id, icu_id))'
+    )
+    self._connection.commit()
+    self._in_batch = False
+
+  def __len__(self):
+    query = 'SELECT COUNT(*) FROM scheduled_messages'
+    return self._connection.execute(query).fetchone()[0]
+
+  def _maybe_commit(self):
+    if not self._in_batch:
+      self._connection.commit()
+
+  @contextlib.contextmanager
+  def batch(self):
+    """Commits the changes made in the context at once."""
+    if self._in_batch:
+      yield
+      return
+
+    self._in_batch = True
+    try:
+      yield
+      self._connection.commit()
+    except Exception:
+      self._connection.rollback()
+      raise
+    finally:
+      self._in_batch = False
+
+  def save(self, msg: message.Message, when: float):
+    columns = ', '.join(self.COLUMNS)
+    values = ', '.join('?' for _ in self.COLUMNS)
+    self._connection.execute(
+      f'INSERT OR REPLACE INTO scheduled_messages ({columns}) '
+      f'VALUES ({values})', (
+        msg.user_id, msg.icu_id, when, msg.attempts, msg.first_sent, msg.phone,
+        msg.user_name, msg.icu_name, msg.locale_code, msg.url
+      )
+    )
+    self._maybe_commit()
+
+  def remove(self, user_id: int, icu_id: int):
+    self._connection.execute(
+      'DELETE FROM scheduled_messages WHERE user_id = ? AND icu_id = ?',
+      (user_id, icu_id)
+    )
+    self._maybe_commit()
+
+  def clear(self):
+    self._connection.execute('DELETE FROM scheduled_messages')
+    self._maybe_commit()
+
+  def iter_messages(self,
+                    chunk_size: int = 1000
+                    ) -> Iterator[Tuple[message.Message, float]]:
+    """Yields the persisted messages and when they are due.
+
+    The rows are read by chunks, in primary key order, so that they are not
+    all loaded at once and so that the messages can be saved again while
+    iterating.
+    """
+    columns = ', '.join(self.COLUMNS)
+    last = (-1, -1)
+    while True:
+      rows = self._connection.execute(
+        f'SELECT {columns} FROM scheduled_messages '
+        'WHERE (user_id, icu_id) > (?, ?) ORDER BY user_id, icu_id LIMIT ?',
+        (*last, chunk_size)
+      ).fetchall()
+      for row in rows:
+        values = dict(zip(self.COLUMNS, row))
+        when = values.pop('when_ts')
+        yield message.Message.from_state(**values), when
+      if len(rows) < chunk_size:
+        return
+      last = rows[-1][:2]
+
+  def load(self) -> List[Tuple[message.Message, float]]:
+    """Returns the persisted messages and when they are due."""
+    return sorted(self.iter_messages(), key=lambda x: x[1])
+
+  def close(self):
+    self._connection.close()
@@ -0,0 +1,72 @@
+import os.path
+import shutil
+import tempfile
+
+from absl.testing import absltest
+
+from icubam.messaging import message
+from icubam.messaging import scheduler_state
+
+
+class FakeObject:
+  def __init__(self, **kwargs):
+    self.__dict__.update(kwargs)
+
+
+class SchedulerStateTest(absltest.TestCase):
+  def setUp(self):
+    super().setUp()
+    tmp_folder = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, tmp_folder)
+    self.path = os.path.join(tmp_folder, 'scheduler.db')
+    self.state = scheduler_state.SchedulerState(self.path)
+    self.addCleanup(self.state.close)
+
+    icu = FakeObject(icu_id=2, name='icu')
+    user = FakeObject(user_id=1, name='user', telephone='1234')
+    self.msg = message.Message(icu, user, url='url')
+
+  def test_save_and_load(self):
+    self.msg.attempts = 2
+    self.msg.first_sent = 10.0
+    self.state.save(self.msg, 100.0)
+    self.assertLen(self.state, 1)
+
+    # Saving again replaces the message.
+    self.state.save(self.msg, 200.0)
+    other = scheduler_state.SchedulerState(self.path)
+    self.addCleanup(other.close)
+    restored = other.load()
+    self.assertLen(restored, 1)
+    msg, when = restored[0]
+    self.assertEqual(when, 200.0)
+    self.assertEqual(msg.key, self.msg.key)
+    self.assertEqual(msg.attempts, 2)
+    self.assertEqual(msg.first_sent, 10.0)
+    self.assertEqual(msg.phone, '1234')
+    self.assertEqual(msg.icu_name, 'icu')
+
+    self.state.remove(*self.msg.key)
+    self.assertEmpty(self.state.load())
+
+  def test_iter_messages(self):
+    for user_id in range(5):
+      self.msg.user_id = user_id
+      self.state.save(self.msg, 100.0 - user_id)
+    keys = [msg.key for msg, _ in self.state.iter_messages(chunk_size=2)]
+    self.assertEqual(keys, [(i, 2) for i in range(5)])
+    # Sorted by time.
+    self.assertEqual([msg.user_id for msg, _ in self.state.load()],
+                     [4, 3, 2, 1, 0])
+
+  def test_batch(self):
+    with self.state.batch():
+      self.state.save(self.msg, 100.0)
+      other = scheduler_state.SchedulerState(self.path)
+      self.addCleanup(other.close)
+      self.assertEmpty(other.load())
+    self.assertLen(other.load(), 1)
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -1,5 +1,8 @@
 from absl.testing import absltest
 from datetime import datetime
+import os.path
+import shutil
+import tempfile
 import tornado.testing
 from unittest import mock
 
@@ -144,11 +147,64 @@ class SchedulerTestCase(tornado.testing.AsyncTestCase):
       curr = store.User(name=name, telephone=name, is_active=True)
       self.db.add_user_to_icu(self.admin, self.icu_id, curr)
 
-    self.scheduler.schedule_all()
+    with mock.patch.object(self.db, 'get_token_from_ids') as get_token:
+      self.scheduler.schedule_all()
+      get_token.assert_not_called()
     # We are not sure about what is the db. But at least it should send to the
     # newly built users.
     # TODO(olivier): do better here
     self.assertGreater(len(self.scheduler.timeouts), len(names))
+    for timeout in self.scheduler.timeouts.values():
+      token = self.db.get_token_from_ids(*timeout.msg.key).token
+      self.assertTrue(timeout.msg.url.endswith(f'id={token}'))
+
+  def add_users(self, num_users):
+    """Adds users to new ICUs, returns the (user, icu) pairs."""
+    pairs = []
+    for i in range(num_users):
+      icu_id = self.db.add_icu(self.admin, store.ICU(name=f'icu{i}'))
+      user_id = self.db.add_user_to_icu(
+        self.admin, icu_id, store.User(name=f'user{i}', telephone=f'{i}')
+      )
+      pairs.append((self.db.get_user(user_id), self.db.get_icu(icu_id)))
+    return pairs
+
+  @mock.patch('time.time', mock.MagicMock(return_value=fake_now))
+  def test_schedule_many(self):
+    pairs = self.add_users(3)
+    inactive = self.db.get_icu(self.icu_id)
+    inactive.is_active = False
+    items = [(user, icu, 10 * i) for i, (user, icu) in enumerate(pairs)]
+    items.append((self.user, inactive, 10))
+    with mock.patch.object(self.db, 'get_token_from_ids') as get_token:
+      self.scheduler.schedule_many(items)
+      get_token.assert_not_called()
+    self.assertEqual(len(self.scheduler.timeouts), len(pairs))
+    for user, icu, delay in items[:-1]:
+      timeout = self.scheduler.timeouts[(user.user_id, icu.icu_id)]
+      self.assertEqual(timeout.when, fake_now + delay)
+
+  @mock.patch('time.time', mock.MagicMock(return_value=fake_now))
+  def test_get_messages(self):
+    pairs = self.add_users(4)
+    delays = [300, 100, 400, 200]
+    for (user, icu), delay in zip(pairs, delays):
+      self.scheduler.schedule(user, icu, delay)
+    icu_ids = [icu.icu_id for _, icu in pairs]
+
+    messages, total = self.scheduler.get_messages()
+    self.assertEqual(total, len(pairs))
+    self.assertEqual([when - fake_now for _, when in messages], sorted(delays))
+
+    messages, total = self.scheduler.get_messages(icu_ids, offset=1, limit=2)
+    self.assertEqual(total, len(pairs))
+    self.assertEqual([msg.icu_id for msg, _ in messages],
+                     [icu_ids[3], icu_ids[0]])
+
+    messages, total = self.scheduler.get_messages(icu_ids[2:], limit=10)
+    self.assertEqual(total, 2)
+    self.assertEqual([msg.icu_id for msg, _ in messages], icu_ids[:1:-1])
+    self.assertEqual(self.scheduler.get_messages(icu_ids, 10, 10), ([], 4))
 
   @mock.patch('time.time', mock.MagicMock(return_value=fake_now))
   @tornado.testing.gen_test
@@ -165,5 +221,214 @@ class SchedulerTestCase(tornado.testing.AsyncTestCase):
     self.assertEqual(timeout.when, self.scheduler.reminder_delay + fake_now)
 
 
+class DueQueueSchedulerTestCase(SchedulerTestCase):
+  def setUp(self):
+    super().setUp()
+    self.scheduler.tick = 1
+    self.scheduler.batch_size = 2
+
+  def make_messages(self, n):
+    result = []
+    for i in range(n):
+      icu_id = self.db.add_icu(self.admin, store.ICU(name=f'icu{i}'))
+      user = store.User(name=f'user{i}', telephone=f'{i}')
+      user_id = self.db.add_user_to_icu(self.admin, icu_id, user)
+      result.append(
+        message.Message(
+          self.db.get_icu(icu_id), self.db.get_user(user_id), url='url'
+        )
+      )
+    return result
+
+  @mock.patch('time.time', mock.MagicMock(return_value=fake_now))
+  def test_pop_due(self):
+    msgs = self.make_messages(3)
+    for i, msg in enumerate(msgs):
+      self.assertTrue(self.scheduler.schedule_message(msg, delay=10 * i))
+    self.assertEqual(len(self.scheduler.timeouts), 3)
+    self.assertIsNone(self.scheduler.timeouts[msgs[0].key].timeout)
+
+    self.scheduler.unschedule(msgs[1].user_id, msgs[1].icu_id)
+    due = self.scheduler.pop_due(fake_now + 15)
+    self.assertEqual([m.key for m in due], [msgs[0].key])
+    self.assertEqual(list(self.scheduler.timeouts), [msgs[2].key])
+
+    # Rescheduling replaces the previous entry.
+    self.scheduler.schedule_message(msgs[2], delay=100)
+    self.assertEqual(self.scheduler.pop_due(fake_now + 50), [])
+    self.assertEqual(len(self.scheduler.pop_due(fake_now + 100)), 1)
+    self.assertEqual(len(self.scheduler.timeouts), 0)
+
+  @mock.patch('time.time', mock.MagicMock(return_value=fake_now))
+  @tornado.testing.gen_test
+  async def test_process_due(self):
+    msgs = self.make_messages(5)
+    for msg in msgs:
+      self.scheduler.schedule_message(msg, delay=10)
+    with mock.patch.object(self.db, 'get_bed_count_for_icu') as get_bed_count:
+      num_sent = await self.scheduler.process_due(fake_now + 10)
+      get_bed_count.assert_not_called()
+    self.assertEqual(num_sent, 5)
+    self.assertEqual(len(self.queue.data), 5)
+    # Reminders are scheduled.
+    self.assertEqual(len(self.scheduler.timeouts), 5)
+    self.assertEqual(len(self.scheduler.pop_due(fake_now)), 0)
+
+    # The first ICU answers: no reminder, the message is for next session.
+    self.db.update_bed_count_for_icu(
+      self.admin,
+      store.BedCount(
+        icu_id=msgs[0].icu_id,
+        last_modified=datetime.fromtimestamp(fake_now + 1)
+      )
+    )
+    with mock.patch.object(
+      self.db,
+      'get_last_modified_for_icus',
+      wraps=self.db.get_last_modified_for_icus
+    ) as get_last_modified:
+      when = fake_now + self.scheduler.reminder_delay
+      num_sent = await self.scheduler.process_due(when)
+      get_last_modified.assert_called_once()
+    self.assertEqual(num_sent, 5)
+    self.assertEqual(len(self.queue.data), 9)
+    self.assertEqual(msgs[0].attempts, 0)
+    self.assertEqual(msgs[1].attempts, 2)
+
+  @mock.patch('time.time', mock.MagicMock(return_value=fake_now))
+  @tornado.testing.gen_test
+  async def test_process_due_failure(self):
+    msgs = self.make_messages(3)
+    for msg in msgs:
+      self.scheduler.schedule_message(msg, delay=10)
+    with mock.patch.object(
+      self.scheduler.updater, 'get_urls', side_effect=IOError('db')
+    ):
+      with self.assertRaises(IOError):
+        await self.scheduler.process_due(fake_now + 10)
+    self.assertEqual(self.queue.data, [])
+    # The messages are due again.
+    self.assertEqual(len(self.scheduler.timeouts), 3)
+    self.assertEqual(await self.scheduler.process_due(fake_now + 10), 3)
+    self.assertEqual(len(self.queue.data), 3)
+
+  @mock.patch('time.time', mock.MagicMock(return_value=fake_now))
+  @tornado.testing.gen_test
+  async def test_process_due_send_failure(self):
+    msgs = self.make_messages(2)
+    for msg in msgs:
+      self.scheduler.schedule_message(msg, delay=10)
+    schedule_message = self.scheduler.schedule_message
+    errors = [IOError('state')]
+
+    def fail_once(msg, delay=None):
+      if errors:
+        raise errors.pop()
+      return schedule_message(msg, delay)
+
+    with mock.patch.object(
+      self.scheduler, 'schedule_message', side_effect=fail_once
+    ):
+      self.assertEqual(await self.scheduler.process_due(fake_now + 10), 2)
+    self.assertEqual(len(self.queue.data), 2)
+    # The failed message is due again after the reminder delay.
+    self.assertEqual(len(self.scheduler.timeouts), 2)
+    retry_at = fake_now + 10 + self.scheduler.reminder_delay
+    self.assertEqual(self.scheduler.timeouts[msgs[0].key].when, retry_at)
+    # Along with the reminder of the other one.
+    self.assertEqual(await self.scheduler.process_due(retry_at), 2)
+    self.assertEqual(len(self.queue.data), 4)
+
+  @tornado.testing.gen_test
+  async def test_process_survives_errors(self):
+    class Stop(Exception):
+      pass
+
+    process_due = mock.AsyncMock(side_effect=[IOError('db'), 0])
+    sleep = mock.AsyncMock(side_effect=[None, Stop()])
+    with mock.patch.object(self.scheduler, 'process_due', process_due):
+      with mock.patch('tornado.gen.sleep', sleep):
+        with self.assertRaises(Stop):
+          await self.scheduler.process()
+    self.assertEqual(process_due.await_count, 2)
+
+
+class PersistentSchedulerTestCase(SchedulerTestCase):
+  def setUp(self):
+    super().setUp()
+    tmp_folder = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, tmp_folder)
+    self.config.scheduler.state_path = os.path.join(tmp_folder, 'state.db')
+    self.scheduler = self.make_scheduler()
+
+  def make_scheduler(self):
+    result = scheduler.MessageScheduler(self.config, self.db, self.queue)
+    self.addCleanup(result.state.close)
+    return result
+
+  @mock.patch('time.time', mock.MagicMock(return_value=fake_now))
+  @tornado.testing.gen_test
+  async def test_restore(self):
+    self.assertEqual(self.scheduler.restore(), 0)
+    self.scheduler.schedule_all(delay=10)
+    num_messages = len(self.scheduler.timeouts)
+    self.assertGreater(num_messages, 0)
+    msg = message.Message(self.icu, self.user, url='url')
+    await self.scheduler.do_send(msg)
+    self.assertEqual(len(self.scheduler.timeouts), num_messages)
+
+    # Messages are restored with their state.
+    restarted = self.make_scheduler()
+    self.assertEqual(restarted.restore(), num_messages)
+    timeout = restarted.timeouts[msg.key]
+    self.assertEqual(timeout.msg.attempts, 1)
+    self.assertEqual(timeout.msg.first_sent, fake_now)
+    self.assertEqual(timeout.when, fake_now + self.scheduler.reminder_delay)
+
+    # Unscheduled messages are scheduled again, as without persisted state.
+    restarted.unschedule(self.user_id, self.icu_id)
+    restarted = self.make_scheduler()
+    self.assertEqual(restarted.restore(delay=10), num_messages - 1)
+    timeout = restarted.timeouts[msg.key]
+    self.assertEqual(timeout.msg.attempts, 0)
+    self.assertEqual(timeout.when, fake_now + 10)
+
+  @mock.patch('time.time', mock.MagicMock(return_value=fake_now))
+  def test_restore_reconciles_users(self):
+    kept_id = self.db.add_user_to_icu(
+      self.admin, self.icu_id, store.User(name='jean', telephone='1111')
+    )
+    self.scheduler.schedule_all(delay=10)
+    self.assertIn((self.user_id, self.icu_id), self.scheduler.timeouts)
+
+    # Changes while the server was down.
+    self.db.update_user(self.admin, self.user_id, dict(is_active=False))
+    self.db.update_user(
+      self.admin, kept_id, dict(name='jeanne', telephone='2222')
+    )
+    user_id = self.db.add_user_to_icu(
+      self.admin, self.icu_id, store.User(name='paul', telephone='5678')
+    )
+
+    restarted = self.make_scheduler()
+    with mock.patch.object(
+      self.db, 'get_users', wraps=self.db.get_users
+    ) as get_users:
+      self.assertEqual(restarted.restore(delay=10), 1)
+    get_users.assert_called_once_with(with_icus=True)
+    self.assertEqual(
+      sorted(restarted.timeouts), [(kept_id, self.icu_id),
+                                   (user_id, self.icu_id)]
+    )
+    self.assertEqual(
+      sorted(m.key for m, _ in restarted.state.load()),
+      [(kept_id, self.icu_id), (user_id, self.icu_id)]
+    )
+    # The restored message has the current details of its user.
+    msg = restarted.timeouts[(kept_id, self.icu_id)].msg
+    self.assertEqual((msg.user_name, msg.phone), ('jeanne', '2222'))
+    self.assertEqual(msg.url, restarted.updater.get_url(kept_id, self.icu_id))
+
+
 if __name__ == '__main__':
   absltest.main()
@@ -1,5 +1,12 @@
 from absl import logging
+import concurrent.futures
+import numbers
+import tornado.gen
+import tornado.ioloop
+import tornado.queues
+from typing import Optional
 
+from icubam import metrics
 from icubam.messaging import message_formatter
 from icubam.messaging import sms_sender
 from icubam.messaging.telegram import integrator
@@ -12,7 +19,29 @@ class Sender:
   It decides the channel to be used to contact the user: sms, email or
   via telegram bot depending on the user itself and the configuration of
   the server.
+
+  Each channel has its own pool of workers, whose size is set by the
+  `messaging.<channel>_workers` config entries. The email and sms senders are
+  blocking and run in a thread executor. Failed sendings are retried
+  `messaging.send_retries` times with an exponential backoff.
+
+  The messages are formatted by bursts of up to FORMAT_BURST_SIZE, as they
+  are read from the sending queue, before being dispatched to the channels.
+  The email workers send the messages waiting in their queue by batches of up
+  to `email.batch_size` over a single SMTP session.
   """
+
+  TELEGRAM = 'telegram'
+  EMAIL = 'email'
+  SMS = 'sms'
+  CHANNELS = (TELEGRAM, EMAIL, SMS)
+  # Default number of workers per channel.
+  WORKERS = {TELEGRAM: 8, EMAIL: 2, SMS: 4}
+  RETRIES = 2
+  RETRY_DELAY = 1.0  # in seconds, doubled after each failure.
+  EMAIL_BATCH_SIZE = 20
+  FORMAT_BURST_SIZE = 100
+
   def __init__(self, config, db, queue, tg_bot=None):
     self.config = config
     self.db = db
@@ -34,27 +63,171 @@ class Sender:
     # This might return be None if telegram is not properly set.
     self.telegram_bot = integrator.TelegramSetup(config, db, tg_bot=tg_bot).bot
 
+    self.workers = {}
+    for channel in self.CHANNELS:
+      workers = self.config.messaging[f'{channel}_workers']
+      if not isinstance(workers, int) or workers <= 0:
+        workers = self.WORKERS[channel]
+      self.workers[channel] = workers
+    self.retries = self.config.messaging.send_retries
+    if not isinstance(self.retries, int) or self.retries < 0:
+      self.retries = self.RETRIES
+    self.retry_delay = self.config.messaging.send_retry_delay
+    if not isinstance(
+      self.retry_delay, numbers.Number
+    ) or self.retry_delay < 0:
+      self.retry_delay = self.RETRY_DELAY
+    self.email_batch_size = self.config.email.batch_size
+    if not isinstance(
+      self.email_batch_size, int
+    ) or self.email_batch_size <= 0:
+      self.email_batch_size = self.EMAIL_BATCH_SIZE
+    # Bounded, so that the main queue fills up if a channel lags behind.
+    self.queues = {
+      channel: tornado.queues.Queue(maxsize=2 * self.workers[channel])
+      for channel in self.CHANNELS
+    }
+    self.queues[self.EMAIL] = tornado.queues.Queue(
+      maxsize=2 * self.workers[self.EMAIL] * self.email_batch_size
+    )
+    metrics.watch_queue('messages', self.queue)
+    for channel, queue in self.queues.items():
+      metrics.watch_queue(f'sender_{channel}', queue)
+    self.executors = {
+      channel: concurrent.futures.ThreadPoolExecutor(
+        max_workers=self.workers[channel],
+        thread_name_prefix=f'icubam-{channel}'
+      )
+      for channel in (self.EMAIL, self.SMS)
+    }
+
   async def process(self):
-    """Keeps reading the sending queue and does send the messages."""
+    """Keeps reading the sending queue and dispatches the messages."""
+    io_loop = tornado.ioloop.IOLoop.current()
+    for channel in self.CHANNELS:
+      for _ in range(self.workers[channel]):
+        io_loop.spawn_callback(self.work, channel)
+
     async for msg in self.queue:
+      burst = [msg]
+      while len(burst) < self.FORMAT_BURST_SIZE and self.queue.qsize():
+        burst.append(self.queue.get_nowait())
       try:
-        user = self.db.get_user(msg.user_id)
-        await self.send(msg, user)
+        self.formatter.format_many(burst)
       except Exception as e:
-        logging.warning(f'Could not send message in message loop {e}.')
+        logging.error(f'Could not format {len(burst)} messages: {e}')
+        for _ in burst:
+          self.queue.task_done()
+        continue
+
+      for msg in burst:
+        try:
+          user = self.db.get_user(msg.user_id)
+          channel = self.get_channel(user)
+          if channel is None:
+            logging.warning(f'No channel to send message to {msg.user_id}.')
+          else:
+            await self.queues[channel].put((msg, user))
+        except Exception as e:
+          logging.warning(f'Could not send message in message loop {e}.')
+        finally:
+          self.queue.task_done()
+
+  async def work(self, channel: str):
+    """Sends the messages of a channel, one at a time or by batches."""
+    queue = self.queues[channel]
+    can_batch = (
+      channel == self.EMAIL and self.email_sender is not None and
+      not self.email_sender.is_async
+    )
+    async for item in queue:
+      batch = [item]
+      while can_batch and len(batch) < self.email_batch_size and queue.qsize():
+        batch.append(queue.get_nowait())
+      try:
+        if len(batch) > 1:
+          await self.send_email_batch(batch)
+        else:
+          await self.send_with_retries(channel, *item)
       finally:
-        self.queue.task_done()
+        for _ in batch:
+          queue.task_done()
 
-  async def send(self, msg, user) -> bool:
-    """Sends the message to a single user."""
-    self.formatter.format(msg)
+  async def send_email_batch(self, batch):
+    """Sends a batch of (msg, user) emails, retrying the failed ones alone."""
+    emails = [(user.email, 'ICUBAM', msg.html) for msg, user in batch]
+    io_loop = tornado.ioloop.IOLoop.current()
+    try:
+      failed = await io_loop.run_in_executor(
+        self.executors[self.EMAIL], self.email_sender.send_many, emails
+      )
+    except Exception as e:
+      # Some of the emails may have been sent: retrying them all could send
+      # them twice.
+      logging.error(f'Could not send batch of {len(batch)} emails: {e}')
+      return
+    for index in failed:
+      await self.send_with_retries(self.EMAIL, *batch[index])
+
+  async def join(self):
+    """Waits until all the queued messages have been processed."""
+    await self.queue.join()
+    for channel in self.CHANNELS:
+      await self.queues[channel].join()
+
+  def get_channel(self, user) -> Optional[str]:
+    """Returns the channel to be used to contact the user, if any."""
     if self.telegram_bot is not None and user.telegram_chat_id is not None:
-      await self.telegram_bot.send(user.telegram_chat_id, msg.html)
-      return True
+      return self.TELEGRAM
     elif user.email is not None and self.email_sender is not None:
-      self.email_sender.send(user.email, 'ICUBAM', msg.html)
-      return True
+      return self.EMAIL
     elif self.sms_sender is not None and user.telephone is not None:
-      self.sms_sender.send(msg.phone, msg.text)
-      return True
+      return self.SMS
+    return None
+
+  async def send_with_retries(self, channel: str, msg, user) -> bool:
+    delay = self.retry_delay
+    for attempt in range(self.retries + 1):
+      try:
+        if await self.send_to(channel, msg, user):
+          return True
+        logging.warning(f'Could not send message via {channel}.')
+      except Exception as e:
+        logging.warning(f'Could not send message via {channel}: {e}')
+      if attempt < self.retries:
+        await tornado.gen.sleep(delay)
+        delay *= 2
+
+    logging.error(
+      f'Giving up sending message to {msg.user_id} after '
+      f'{self.retries + 1} attempts.'
+    )
     return False
+
+  async def send_to(self, channel: str, msg, user) -> bool:
+    """Sends the formatted message to a user through the given channel."""
+    if channel == self.TELEGRAM:
+      return await self.telegram_bot.send(user.telegram_chat_id, msg.html)
+
+    io_loop = tornado.ioloop.IOLoop.current()
+    if channel == self.EMAIL and self.email_sender.is_async:
+      await self.email_sender.send(user.email, 'ICUBAM', msg.html)
+    elif channel == self.EMAIL:
+      await io_loop.run_in_executor(
+        self.executors[channel], self.email_sender.send, user.email, 'ICUBAM',
+        msg.html
+      )
+    else:
+      await io_loop.run_in_executor(
+        self.executors[channel], self.sms_sender.send, msg.phone, msg.text
+      )
+    return True
+
+  async def send(self, msg, user) -> bool:
+    """Sends the message to a single user."""
+    channel = self.get_channel(user)
+    if channel is None:
+      return False
+    self.formatter.format(msg)
+    await self.send_to(channel, msg, user)
+    return True
@@ -1,3 +1,6 @@
+from unittest import mock
+
+import tornado.ioloop
 import tornado.testing
 import tornado.queues
 
@@ -5,6 +8,7 @@ from icubam import config
 from icubam.db import store
 from icubam.messaging import sender
 from icubam.messaging import message
+from icubam.messaging import mock_smtp
 from icubam.messaging.telegram import mock_bot
 
 
@@ -71,4 +75,123 @@ class SenderTest(tornado.testing.AsyncTestCase):
     msg = message.Message(self.icu, user, url)
     self.assertTrue(await self.sender.send(msg, user))
     self.assertGreater(len(self.bot.client.requests), 0)
-    self.assertIn(url, self.bot.client.requests[-1].body.decode())
\ No newline at end of file
+    self.assertIn(url, self.bot.client.requests[-1].body.decode())
+
+  @tornado.testing.gen_test
+  async def test_process(self):
+    self.sender.sms_sender = mock.MagicMock()
+    self.sender.retry_delay = 0
+    ids = []
+    for i in range(10):
+      ids.append(
+        self.db.add_user_to_icu(
+          self.admin, self.icu.icu_id,
+          store.User(name=f'user{i}', telephone=f'{i}')
+        )
+      )
+    # A user with a chat id is sent a telegram message instead.
+    ids.append(
+      self.db.add_user_to_icu(
+        self.admin, self.icu.icu_id,
+        store.User(name='telegram', telephone='1', telegram_chat_id='123')
+      )
+    )
+
+    # The messages queued at once are formatted together.
+    for user_id in ids:
+      self.queue.put_nowait(
+        message.Message(self.icu, self.db.get_user(user_id), 'url')
+      )
+    format_many = self.sender.formatter.format_many
+    with mock.patch.object(
+      self.sender.formatter, 'format_many', side_effect=format_many
+    ) as formats:
+      tornado.ioloop.IOLoop.current().spawn_callback(self.sender.process)
+      await self.sender.join()
+    formats.assert_called_once()
+    self.assertEqual(self.sender.sms_sender.send.call_count, 10)
+    self.assertEqual(len(self.bot.client.requests), 1)
+    texts = {c.args[1] for c in self.sender.sms_sender.send.call_args_list}
+    self.assertEqual(len(texts), 10)
+
+  @tornado.testing.gen_test
+  async def test_send_with_retries(self):
+    self.sender.retry_delay = 0
+    user_id = self.db.add_user_to_icu(
+      self.admin, self.icu.icu_id,
+      store.User(name='user1', telephone='32121312')
+    )
+    user = self.db.get_user(user_id)
+    msg = message.Message(self.icu, user, 'some_url')
+    self.sender.sms_sender = mock.MagicMock()
+    self.sender.sms_sender.send.side_effect = [Exception('down'), None]
+    success = await self.sender.send_with_retries(self.sender.SMS, msg, user)
+    self.assertTrue(success)
+    self.assertEqual(self.sender.sms_sender.send.call_count, 2)
+
+    self.sender.sms_sender.send.side_effect = Exception('down')
+    success = await self.sender.send_with_retries(self.sender.SMS, msg, user)
+    self.assertFalse(success)
+    self.assertEqual(
+      self.sender.sms_sender.send.call_count, 2 + self.sender.retries + 1
+    )
+
+  def test_config(self):
+    self.config.messaging.send_retries = -1
+    self.config.messaging.send_retry_delay = 'soon'
+    self.config.messaging.sms_workers = 3
+    self.config.email.batch_size = 0
+    result = sender.Sender(self.config, self.db, self.queue, tg_bot=self.bot)
+    self.assertEqual(result.retries, sender.Sender.RETRIES)
+    self.assertEqual(result.retry_delay, sender.Sender.RETRY_DELAY)
+    self.assertEqual(result.workers[sender.Sender.SMS], 3)
+    self.assertEqual(result.email_batch_size, sender.Sender.EMAIL_BATCH_SIZE)
+
+  @tornado.testing.gen_test
+  async def test_send_email_batch(self):
+    user = self.db.get_user(
+      self.db.add_user_to_icu(
+        self.admin, self.icu.icu_id,
+        store.User(name='user1', email='user1@example.com')
+      )
+    )
+    # The same user twice, e.g. in two ICUs: only the failed one is retried.
+    batch = [(message.Message(self.icu, user, f'url{i}'), user)
+             for i in range(2)]
+    self.sender.email_sender = mock.MagicMock()
+    self.sender.email_sender.send_many.return_value = [1]
+    with mock.patch.object(self.sender, 'send_with_retries') as retry:
+      await self.sender.send_email_batch(batch)
+      retry.assert_called_once_with(self.sender.EMAIL, *batch[1])
+
+      # Nothing is known about an exception: nothing is retried.
+      retry.reset_mock()
+      self.sender.email_sender.send_many.side_effect = Exception('bug')
+      await self.sender.send_email_batch(batch)
+      retry.assert_not_called()
+
+  @tornado.testing.gen_test(timeout=10)
+  async def test_process_emails(self):
+    server = mock_smtp.MockSMTPServer().start()
+    self.addCleanup(server.stop)
+    self.config.env['SMTP_HOST'] = server.host
+    self.config.env['EMAIL_FROM'] = 'icubam@localhost'
+    self.config.email.protocol = 'smtp'
+    self.config.email.pool_size = 1
+    self.sender = sender.Sender(
+      self.config, self.db, self.queue, tg_bot=self.bot
+    )
+    self.addCleanup(self.sender.email_sender.pool.close)
+
+    tornado.ioloop.IOLoop.current().spawn_callback(self.sender.process)
+    for i in range(30):
+      user_id = self.db.add_user_to_icu(
+        self.admin, self.icu.icu_id,
+        store.User(name=f'user{i}', email=f'user{i}@example.com')
+      )
+      await self.queue.put(
+        message.Message(self.icu, self.db.get_user(user_id), 'url')
+      )
+    await self.sender.join()
+    self.assertEqual(len(server.messages), 30)
+    self.assertEqual(server.num_connections, 1)
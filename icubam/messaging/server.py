@@ -3,7 +3,7 @@ import tornado.web
 from absl import logging  # noqa: F401
 from tornado import queues
 
-from icubam import base_server, sentry
+from icubam import base_server, metrics, sentry
 from icubam.messaging import scheduler
 from icubam.messaging import sender
 from icubam.messaging.telegram import integrator
@@ -22,7 +22,7 @@ class MessageServer(base_server.BaseServer):
       config=self.config, db=self.db, queue=self.queue
     )
     self.sender = sender.Sender(self.config, self.db, self.queue)
-    self.callbacks = [self.sender.process]
+    self.callbacks = [self.sender.process, self.scheduler.process]
 
     self.telegram_setup = telegram_setup
     if self.telegram_setup is None:
@@ -34,7 +34,7 @@ class MessageServer(base_server.BaseServer):
   def make_app(self):
     kwargs = dict(db_factory=self.db_factory, scheduler=self.scheduler)
     self.add_handler(onoff.OnOffHandler, **kwargs)
-    self.add_handler(schedule.ScheduleHandler, **kwargs)
+    self.add_handler(onoff.BulkOnOffHandler, **kwargs)
     self.add_handler(schedule.ScheduleHandler, **kwargs)
 
     # Only accepts request from same host
@@ -42,7 +42,9 @@ class MessageServer(base_server.BaseServer):
       (tornado.routing.HostMatches(r'(localhost|127\.0\.0\.1)'), self.routes)
     ]
     self.telegram_setup.add_routes(app_routes)
-    return tornado.web.Application(app_routes)
+    return tornado.web.Application(
+      app_routes, log_function=metrics.log_request
+    )
 
   async def process(self):
     async for msg in self.queue:
@@ -54,5 +56,6 @@ class MessageServer(base_server.BaseServer):
         self.queue.task_done()
 
   def run(self, delay=None):
-    self.scheduler.schedule_all(delay)
+    # Restores the persisted schedule, if any, reconciled with the users.
+    self.scheduler.restore(delay)
     super().run()
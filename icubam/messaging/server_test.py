@@ -0,0 +1,121 @@
+import json
+from unittest import mock
+
+import tornado.testing
+
+from icubam import config
+from icubam.db import store
+from icubam.messaging import client, server
+from icubam.messaging.handlers import onoff, schedule
+
+
+class MessageServerTest(tornado.testing.AsyncHTTPTestCase):
+  TEST_CONFIG = 'resources/test.toml'
+
+  def setUp(self):
+    self.config = config.Config(self.TEST_CONFIG)
+    super().setUp()
+    self.db = self.server.db
+    self.admin = self.db.add_default_admin()
+    region_ids = [
+      self.db.add_region(self.admin, store.Region(name=f'region{i}'))
+      for i in range(2)
+    ]
+    self.user_ids, self.icu_ids = [], []
+    # The first and last ICUs are in the same region.
+    for i in range(3):
+      region_id = region_ids[i % 2]
+      icu_id = self.db.add_icu(
+        self.admin, store.ICU(name=f'icu{i}', region_id=region_id)
+      )
+      user_id = self.db.add_user_to_icu(
+        self.admin, icu_id, store.User(name=f'user{i}', telephone=f'{i}')
+      )
+      self.icu_ids.append(icu_id)
+      self.user_ids.append(user_id)
+
+  def get_app(self):
+    self.server = server.MessageServer(self.config, port=8889)
+    return self.server.make_app()
+
+  def post(self, handler, request):
+    return self.fetch(handler.ROUTE, method='POST', body=request.to_json())
+
+  def test_bulk_onoff(self):
+    requests = [
+      onoff.OnOffRequest(user_id, [icu_id], True, 60 * (i + 1))
+      for i, (user_id, icu_id) in enumerate(zip(self.user_ids, self.icu_ids))
+    ]
+    # Unknown users and incomplete requests are skipped.
+    requests.append(onoff.OnOffRequest(-1, [self.icu_ids[0]]))
+    requests.append(onoff.OnOffRequest(self.user_ids[0]))
+    response = self.post(
+      onoff.BulkOnOffHandler, onoff.BulkOnOffRequest(requests)
+    )
+    self.assertEqual(response.code, 200)
+    self.assertEqual(json.loads(response.body), {'applied': 3, 'skipped': 2})
+    self.assertEqual(len(self.server.scheduler.timeouts), 3)
+
+    off = [onoff.OnOffRequest(self.user_ids[0], [self.icu_ids[0]], False)]
+    response = self.post(onoff.BulkOnOffHandler, onoff.BulkOnOffRequest(off))
+    self.assertEqual(response.code, 200)
+    self.assertEqual(len(self.server.scheduler.timeouts), 2)
+
+    response = self.fetch(
+      onoff.BulkOnOffHandler.ROUTE, method='POST', body='not json'
+    )
+    self.assertEqual(response.code, 400)
+
+  def test_client_reuses_connections(self):
+    self.config.messaging.base_url = self.get_url('/')
+    self.config.messaging.timeout = 10
+    messaging_client = client.MessageServerClient(self.config)
+    self.addCleanup(messaging_client.http_client.close)
+    with mock.patch.object(
+      self.http_server, 'handle_stream', wraps=self.http_server.handle_stream
+    ) as handle_stream:
+      for user_id, icu_id in zip(self.user_ids, self.icu_ids):
+        response = self.io_loop.run_sync(
+          lambda: messaging_client.notify(user_id, [icu_id], delay=60)
+        )
+        self.assertEqual(response.code, 200)
+    self.assertEqual(len(self.server.scheduler.timeouts), 3)
+    self.assertEqual(handle_stream.call_count, 1)
+
+  def test_onoff_unknown_user(self):
+    request = onoff.OnOffRequest(-1, [self.icu_ids[0]])
+    response = self.post(onoff.OnOffHandler, request)
+    self.assertEqual(response.code, 400)
+
+  def get_schedule(self, **kwargs) -> schedule.ScheduleResponse:
+    request = schedule.ScheduleRequest(self.admin, **kwargs)
+    response = self.post(schedule.ScheduleHandler, request)
+    self.assertEqual(response.code, 200)
+    result = schedule.ScheduleResponse()
+    result.from_json(response.body.decode())
+    return result
+
+  def test_schedule(self):
+    for i, user_id in enumerate(self.user_ids):
+      user = self.db.get_user(user_id)
+      self.server.scheduler.schedule(user, user.icus[0], 60 * (3 - i))
+
+    result = self.get_schedule()
+    self.assertEqual(result.total, 3)
+    self.assertEqual([m['icu_id'] for m in result.messages],
+                     self.icu_ids[::-1])
+
+    result = self.get_schedule(offset=1, limit=1)
+    self.assertEqual(result.total, 3)
+    self.assertEqual([m['icu_id'] for m in result.messages], [self.icu_ids[1]])
+
+    region_id = self.db.get_icu(self.icu_ids[0]).region_id
+    result = self.get_schedule(region_ids=[region_id])
+    self.assertEqual(result.total, 2)
+    self.assertEqual([m['icu_id'] for m in result.messages],
+                     [self.icu_ids[2], self.icu_ids[0]])
+
+    result = self.get_schedule(
+      region_ids=[region_id], icu_ids=[self.icu_ids[0]]
+    )
+    self.assertEqual([m['icu_id'] for m in result.messages], [self.icu_ids[0]])
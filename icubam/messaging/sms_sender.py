@@ -4,9 +4,6 @@ import inspect
 import sys
 
 from absl import logging
-import messagebird
-import nexmo
-from twilio.rest import Client as TWCLient
 
 
 class Sender(abc.ABC):
@@ -31,6 +28,8 @@ class MBSender(Sender):
   """Initializes and wrap a MessageBird sender object."""
   def __init__(self, config):
     super().__init__(config)
+    import messagebird
+
     self._api_key = self.config.MB_KEY
     self._client = messagebird.Client(self._api_key)
 
@@ -44,6 +43,8 @@ class MBSender(Sender):
 class NXSender(Sender):
   def __init__(self, config):
     super().__init__(config)
+    import nexmo
+
     self._client = nexmo.Client(
       key=self.config.NX_KEY, secret=self.config.NX_API
     )
@@ -59,6 +60,8 @@ class NXSender(Sender):
 class TWSender(Sender):
   def __init__(self, config):
     super().__init__(config)
+    from twilio.rest import Client as TWCLient
+
     self._client = TWCLient(self.config.TW_KEY, self.config.TW_API)
 
   def send(self, dest, contents):
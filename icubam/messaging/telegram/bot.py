@@ -1,19 +1,28 @@
 from absl import logging
 import json
 import os.path
-import tornado.gen
 import tornado.httpclient
+import urllib.parse
 from typing import Dict, List, Optional
 
+from icubam.messaging.telegram import limiter
 from icubam.messaging.telegram import webhook
 
 
 class TelegramBot:
-  """A class to send and receive messages to/from telegram."""
+  """A class to send and receive messages to/from telegram.
+
+  The messages are rate limited following the `messaging.telegram_rate` and
+  `messaging.telegram_chat_rate` config entries (in messages per second), and
+  sent again after the delay requested by telegram if rate limited anyway.
+  """
 
   API_URL = "https://api.telegram.org/bot"
   URL = "http://telegram.me/"
   START = "/start"
+  TOO_MANY_REQUESTS = 429
+  MAX_RETRIES = 3
+  POLL_MARGIN = 10  # in seconds, on top of the long polling timeout.
 
   def __init__(self, config, client=None):
     self.config = config
@@ -23,12 +32,25 @@ class TelegramBot:
     self.client = client
     if self.client is None:
       self.client = tornado.httpclient.AsyncHTTPClient()
+    self.limiter = limiter.RateLimiter(
+      global_rate=self.config.messaging.get(
+        'telegram_rate', limiter.RateLimiter.GLOBAL_RATE
+      ),
+      chat_rate=self.config.messaging.get(
+        'telegram_chat_rate', limiter.RateLimiter.CHAT_RATE
+      ),
+    )
 
-  async def get(self, route: str) -> Optional[tornado.httpclient.HTTPResponse]:
+  async def get(
+    self,
+    route: str,
+    request_timeout: Optional[float] = None
+  ) -> Optional[tornado.httpclient.HTTPResponse]:
     """Sends a GET request to telegram."""
     request = tornado.httpclient.HTTPRequest(
       url=f"{self.api_url}/{route}",
       method='GET',
+      request_timeout=request_timeout,
     )
     try:
       return await self.client.fetch(request)
@@ -47,14 +69,35 @@ class TelegramBot:
     )
     try:
       return await self.client.fetch(request)
+    except tornado.httpclient.HTTPClientError as e:
+      logging.warning(f'Cannot fetch telegram POST route {route}: {e}')
+      return e.response
     except Exception as e:
       logging.warning(f'Cannot fetch telegram POST route {route}: {e}')
       return None
 
-  async def getUpdates(self, min_id: int = 0) -> Optional[List[Dict]]:
-    """Returns the updates."""
+  async def getUpdates(
+    self,
+    min_id: int = 0,
+    offset: Optional[int] = None,
+    timeout: int = 0
+  ) -> Optional[List[Dict]]:
+    """Returns the updates.
+
+    Telegram forgets the updates before `offset`. If `timeout` is positive,
+    the request is a long poll: it waits up to `timeout` seconds for updates
+    to come instead of returning right away.
+    """
     route = "getUpdates"
-    resp = await self.get(route)
+    params = {}
+    if offset is not None:
+      params['offset'] = offset
+    if timeout > 0:
+      params['timeout'] = timeout
+    if params:
+      route = f'{route}?{urllib.parse.urlencode(params)}'
+    # The request must not time out before telegram answers.
+    resp = await self.get(route, request_timeout=timeout + self.POLL_MARGIN)
     if resp is None or resp.code != 200:
       logging.warning(f"Cannot fetch {route} from telegram.")
       return None
@@ -88,11 +131,24 @@ class TelegramBot:
       'text': text,
       'parse_mode': 'HTML',
     }
-    # Respect the 30ms per seconds
-    await tornado.gen.sleep(0.04)
-    resp = await self.post(data, 'sendMessage')
+    for _ in range(self.MAX_RETRIES + 1):
+      await self.limiter.acquire(chatid)
+      resp = await self.post(data, 'sendMessage')
+      if resp is None or resp.code != self.TOO_MANY_REQUESTS:
+        break
+      retry_after = self.get_retry_after(resp)
+      logging.warning(f'Rate limited by telegram for {retry_after}s.')
+      self.limiter.retry_after(retry_after)
     return resp is not None and resp.code == 200
 
+  def get_retry_after(self, resp: tornado.httpclient.HTTPResponse) -> float:
+    """Returns the delay requested by a 429 response, in seconds."""
+    try:
+      data = json.loads(resp.body.decode())
+      return float(data["parameters"]["retry_after"])
+    except Exception:
+      return 1.0
+
   async def setWebhook(self) -> bool:
     """Sets up a webhook to receive update directly from the server."""
     url = os.path.join(
@@ -1,5 +1,7 @@
 import tornado.queues
 from typing import Optional
+
+from icubam import metrics
 from icubam.messaging.telegram import bot, updater, webhook
 
 
@@ -8,17 +10,26 @@ class TelegramSetup:
   
   There are two ways to get the messages (called updates) from telegram
   to our server:
-   1. Periodically ask telegram to get the last messages.
+   1. Long poll telegram to get the last messages.
    2. Set a webhook so that telegram forwards directly every update
       to us when they receive it. The webhook must be a https url.
   
   The TelegramSetup class decides first if Telegram should be integrated to
   the stack based on the config and also decides whether we are getting the
-  updates via webhook or periodic callback.
+  updates via webhook or long polling.
+
+  The updates wait for being processed in a queue bounded by
+  `messaging.telegram_queue_size`.
   """
+
+  QUEUE_SIZE = 100
+
   def __init__(self, config, db, scheduler=None, tg_bot=None):
     self.config = config
-    self.queue = tornado.queues.Queue()
+    self.queue = tornado.queues.Queue(
+      maxsize=config.messaging.get('telegram_queue_size', self.QUEUE_SIZE)
+    )
+    metrics.watch_queue('telegram_updates', self.queue)
     self.db = db
     self.bot = None
     self.processor = None
@@ -53,14 +64,9 @@ class TelegramSetup:
       return self.bot.invite_url(token)
     return None
 
-  def _start_periodic_fetching(self):
-    """A function to periodically fetch updates."""
-    repeat_every = self.config.messaging.telegram_updates_every * 1000
-    tornado.ioloop.PeriodicCallback(self.fetcher.fetch, repeat_every).start()
-
   def setup_fetching(self, callbacks):
     """If Telegram should be running, we either setup a webhook or
-    starts fetching regularly the updates depending on the configuration."""
+    starts long polling the updates depending on the configuration."""
     if not self.is_on:
       return
 
@@ -68,7 +74,7 @@ class TelegramSetup:
     if self.uses_webhook:
       callbacks.append(self.bot.setWebhook)
     else:
-      self._start_periodic_fetching()
+      callbacks.append(self.fetcher.poll)
 
   def add_routes(self, app_routes):
     """Ads the proper routes for telegram, restricting for proper subnets."""
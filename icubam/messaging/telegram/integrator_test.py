@@ -1,4 +1,3 @@
-from unittest import mock
 import tornado.queues
 import tornado.testing
 
@@ -47,11 +46,9 @@ class TelegramSetupTest(tornado.testing.AsyncTestCase):
 
   def test_setup_fetching(self):
     callbacks = []
-    self.integrator._start_periodic_fetching = mock.MagicMock(
-      return_value=None
-    )
     self.integrator.setup_fetching(callbacks)
-    self.assertEqual(len(callbacks), 1)
+    self.assertEqual(len(callbacks), 2)
+    self.assertIn(self.integrator.fetcher.poll, callbacks)
 
     # This should set up the webhook.
     self.config.server.base_url = 'https://www.example.com/'
@@ -0,0 +1,108 @@
+import time
+import tornado.gen
+from typing import Dict, Hashable, Optional
+
+
+class TokenBucket:
+  """Allows `rate` events per second on average, and bursts of `capacity`."""
+
+  # Tolerance on the number of tokens, for floating point errors.
+  EPSILON = 1e-6
+
+  def __init__(self, rate: float, capacity: Optional[float] = None, now=None):
+    self.rate = rate
+    self.capacity = capacity if capacity is not None else max(1.0, rate)
+    self.tokens = self.capacity
+    self.last = time.monotonic() if now is None else now
+    # No tokens are available before this time, see pause.
+    self.paused_until = 0.0
+
+  def _refill(self, now: float):
+    if now > self.last:
+      self.tokens = min(
+        self.capacity, self.tokens + (now - self.last) * self.rate
+      )
+      self.last = now
+
+  @property
+  def is_full(self) -> bool:
+    self._refill(time.monotonic())
+    return self.tokens >= self.capacity
+
+  def delay(self, now: Optional[float] = None) -> float:
+    """Returns the number of seconds to wait before a token is available."""
+    now = time.monotonic() if now is None else now
+    self._refill(now)
+    wait = max(0.0, (1 - self.tokens - self.EPSILON) / self.rate)
+    return max(wait, self.paused_until - now)
+
+  def take(self, now: Optional[float] = None) -> bool:
+    """Takes a token if available, returns whether it succeeded."""
+    now = time.monotonic() if now is None else now
+    if self.delay(now) > 0:
+      return False
+    self.tokens -= 1
+    return True
+
+  def pause(self, seconds: float, now: Optional[float] = None):
+    """Prevents any token to be taken for some time."""
+    now = time.monotonic() if now is None else now
+    self._refill(now)
+    self.tokens = min(self.tokens, 0)
+    self.paused_until = max(self.paused_until, now + seconds)
+
+
+class RateLimiter:
+  """Rate limits the messages, both globally and per chat.
+
+  Telegram allows about 30 messages per second overall, and 1 per second in a
+  given chat.
+  """
+
+  GLOBAL_RATE = 30
+  CHAT_RATE = 1
+  # Beyond this number of chats, the buckets of the idle chats are dropped.
+  MAX_CHATS = 1000
+
+  def __init__(self, global_rate=GLOBAL_RATE, chat_rate=CHAT_RATE):
+    self.chat_rate = chat_rate
+    self.global_bucket = TokenBucket(global_rate)
+    self.chat_buckets: Dict[Hashable, TokenBucket] = {}
+
+  def _chat_bucket(self, chat_id: Hashable) -> TokenBucket:
+    bucket = self.chat_buckets.get(chat_id, None)
+    if bucket is None:
+      if len(self.chat_buckets) >= self.MAX_CHATS:
+        self.chat_buckets = {
+          k: b
+          for k, b in self.chat_buckets.items()
+          if not b.is_full
+        }
+      bucket = TokenBucket(self.chat_rate, capacity=1)
+      self.chat_buckets[chat_id] = bucket
+    return bucket
+
+  def delay(self, chat_id: Hashable) -> float:
+    now = time.monotonic()
+    return max(
+      self.global_bucket.delay(now),
+      self._chat_bucket(chat_id).delay(now)
+    )
+
+  async def acquire(self, chat_id: Hashable):
+    """Waits until a message can be sent to the chat."""
+    while True:
+      delay = self.delay(chat_id)
+      if delay <= 0:
+        now = time.monotonic()
+        self.global_bucket.take(now)
+        self._chat_bucket(chat_id).take(now)
+        return
+      await tornado.gen.sleep(delay)
+
+  def retry_after(self, seconds: float):
+    """Pauses all the sendings, following a 429 Too Many Requests answer.
+
+    Telegram does not tell which limit was hit, hence the global pause.
+    """
+    self.global_bucket.pause(seconds)
@@ -0,0 +1,70 @@
+import time
+
+import tornado.gen
+import tornado.testing
+from absl.testing import absltest
+
+from icubam import config
+from icubam.messaging.telegram import limiter, mock_bot
+
+
+class TokenBucketTest(absltest.TestCase):
+  def test_take(self):
+    bucket = limiter.TokenBucket(rate=2, capacity=2, now=0)
+    self.assertTrue(bucket.take(now=0))
+    self.assertTrue(bucket.take(now=0))
+    self.assertFalse(bucket.take(now=0))
+    self.assertAlmostEqual(bucket.delay(now=0), 0.5, places=3)
+    self.assertTrue(bucket.take(now=0.5))
+    # Tokens do not accumulate beyond the capacity.
+    self.assertTrue(bucket.take(now=100))
+    self.assertTrue(bucket.take(now=100))
+    self.assertFalse(bucket.take(now=100))
+
+  def test_pause(self):
+    bucket = limiter.TokenBucket(rate=10, now=0)
+    bucket.pause(3, now=0)
+    self.assertAlmostEqual(bucket.delay(now=1), 2)
+    self.assertFalse(bucket.take(now=2.9))
+    self.assertTrue(bucket.take(now=3))
+
+
+class RateLimitedBotTest(tornado.testing.AsyncTestCase):
+  def setUp(self):
+    super().setUp()
+    self.config = config.Config('resources/test.toml')
+    self.config.messaging.telegram_rate = 20
+    self.config.messaging.telegram_chat_rate = 10
+
+  @tornado.testing.gen_test(timeout=10)
+  async def test_send_within_limits(self):
+    client = mock_bot.RateLimitedHTTPClient(global_rate=20, chat_rate=10)
+    bot = mock_bot.MockTelegramBot(self.config, client)
+    start = time.monotonic()
+    results = await tornado.gen.multi([
+      bot.send(f'chat{i % 3}', f'message {i}') for i in range(30)
+    ])
+    elapsed = time.monotonic() - start
+    self.assertTrue(all(results))
+    self.assertEqual(client.num_rejected, 0)
+    self.assertEqual(len(client.requests), 30)
+    # 20 messages in a burst, then 20 per second.
+    self.assertGreater(elapsed, 0.4)
+
+  @tornado.testing.gen_test(timeout=10)
+  async def test_send_retry_after(self):
+    # The server is stricter than the bot thinks.
+    client = mock_bot.RateLimitedHTTPClient(
+      global_rate=20, chat_rate=5, retry_after=0.2
+    )
+    bot = mock_bot.MockTelegramBot(self.config, client)
+    results = await tornado.gen.multi([
+      bot.send('chat', 'a'), bot.send('chat', 'b')
+    ])
+    self.assertTrue(all(results))
+    self.assertEqual(client.num_rejected, 1)
+    self.assertEqual(len(client.requests), 3)
+
+
+if __name__ == '__main__':
+  absltest.main()
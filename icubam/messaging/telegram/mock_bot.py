@@ -2,6 +2,7 @@ import io
 import json
 import tornado.httpclient
 from icubam.messaging.telegram import bot
+from icubam.messaging.telegram import limiter
 
 
 class MockHTTPClient:
@@ -25,9 +26,41 @@ class MockHTTPClient:
     )
 
 
+class RateLimitedHTTPClient(MockHTTPClient):
+  """Simulates a telegram server that enforces rate limits on sendMessage."""
+  def __init__(self, global_rate, chat_rate, retry_after=1):
+    super().__init__()
+    self.global_bucket = limiter.TokenBucket(global_rate)
+    self.chat_rate = chat_rate
+    self.chat_buckets = {}
+    self.retry_after = retry_after
+    self.num_rejected = 0
+
+  async def fetch(self, request):
+    chat_id = json.loads(request.body.decode())['chat_id']
+    chat_bucket = self.chat_buckets.setdefault(
+      chat_id, limiter.TokenBucket(self.chat_rate, capacity=1)
+    )
+    if chat_bucket.delay() > 0 or not self.global_bucket.take():
+      self.num_rejected += 1
+      self.code = bot.TelegramBot.TOO_MANY_REQUESTS
+      self.set_body({
+        'ok': False,
+        'error_code': self.code,
+        'parameters': {
+          'retry_after': self.retry_after
+        }
+      })
+    else:
+      chat_bucket.take()
+      self.code = 200
+      self.set_body({'ok': True})
+    return await super().fetch(request)
+
+
 class MockTelegramBot(bot.TelegramBot):
-  def __init__(self, config):
+  def __init__(self, config, client=None):
     config.TELEGRAM_API_KEY = 'key'
     config.messaging.telegram_bot = 'michel'
     config.messaging.telegram_updates_every = '60'
-    super().__init__(config, MockHTTPClient())
+    super().__init__(config, client or MockHTTPClient())
@@ -1,5 +1,6 @@
 from absl import logging
-from typing import Dict
+import tornado.gen
+from typing import Dict, Optional
 
 from icubam import authenticator
 from icubam.messaging.telegram import bot
@@ -10,25 +11,55 @@ class UpdateFetcher:
   
   The UpdateFetcher is only used in dev mode when the webhook is not
   for convenience.
+
+  It long polls telegram, waiting up to `messaging.telegram_poll_timeout`
+  seconds for new updates, and acknowledges the updates once they are in the
+  queue. Since the queue is bounded, the fetcher waits for the processor when
+  it lags behind.
   """
+
+  POLL_TIMEOUT = 30  # in seconds.
+
   def __init__(self, config, queue, tg_bot=None):
     self.config = config
     self.queue = queue
     self.bot = bot.TelegramBot(config) if tg_bot is None else tg_bot
     self.last_update_id = 0
+    self.timeout = self.config.messaging.get(
+      'telegram_poll_timeout', self.POLL_TIMEOUT
+    )
+    # Delay before polling again after a failure.
+    self.retry_delay = float(self.config.messaging.telegram_updates_every)
 
-  async def fetch(self):
-    """Fetches updates from telegram and put it to the update queue."""
-    updates = await self.bot.getUpdates(min_id=self.last_update_id)
-    if not updates:
-      return
+  async def fetch(self, timeout: int = 0) -> Optional[int]:
+    """Fetches updates from telegram and put it to the update queue.
 
-    last_id = updates[-1]['update_id']
-    if last_id > self.last_update_id:
-      self.last_update_id = last_id
+    Returns the number of updates fetched, None if the fetching failed.
+    """
+    offset = self.last_update_id + 1 if self.last_update_id else None
+    updates = await self.bot.getUpdates(
+      min_id=self.last_update_id, offset=offset, timeout=timeout
+    )
+    if updates is None:
+      return None
 
     for update in updates:
       await self.queue.put(update)
+      # Only the queued updates are acknowledged by the next offset.
+      self.last_update_id = max(self.last_update_id, update['update_id'])
+    return len(updates)
+
+  async def poll(self):
+    """Keeps long polling telegram for updates."""
+    while True:
+      try:
+        num_updates = await self.fetch(timeout=self.timeout)
+      except Exception as e:
+        logging.error(f'Could not fetch telegram updates: {e}')
+        num_updates = None
+      # Without long polling, telegram answers right away.
+      if num_updates is None or (not num_updates and self.timeout <= 0):
+        await tornado.gen.sleep(self.retry_delay)
 
 
 class UpdateProcessor:
@@ -37,7 +68,13 @@ class UpdateProcessor:
   As of today, if it is the first time we see this user, and it comes with
   the proper token, then we register it and update the scheduler about it.
   Otherwise we simply do nothing.
+
+  The updates are processed concurrently by `messaging.telegram_processors`
+  workers.
   """
+
+  WORKERS = 4
+
   def __init__(self, config, db, queue, scheduler, tg_bot=None):
     self.config = config
     self.db = db
@@ -45,6 +82,9 @@ class UpdateProcessor:
     self.scheduler = scheduler
     self.bot = bot.TelegramBot(config) if tg_bot is None else tg_bot
     self.authenticator = authenticator.Authenticator(self.config, self.db)
+    self.workers = self.config.messaging.get(
+      'telegram_processors', self.WORKERS
+    )
 
     # The updater processor might register a user to the telegram messages.
     # For this we need to set a field in the db and to update a user we need
@@ -57,6 +97,10 @@ class UpdateProcessor:
 
   async def process(self):
     """Keep reading the update queue to deal with incoming telegram updates."""
+    await tornado.gen.multi([self.work() for _ in range(max(1, self.workers))])
+
+  async def work(self):
+    """Processes the updates of the queue one at a time."""
     async for update in self.queue:
       try:
         await self.process_update(update)
@@ -98,6 +142,9 @@ class UpdateProcessor:
           self.admin_id, user.user_id, {"telegram_chat_id": chatid}
         )
         if self.scheduler is not None:
+          # The authenticated user might come from cache: reload it.
+          user = self.db.get_user(user.user_id)
+          icu = self.db.get_icu(icu.icu_id)
           self.scheduler.schedule(user, icu, 30)
         # TODO(olivier): i18n this.
         await self.bot.send(chatid, 'You are now registered to ICUBAM')
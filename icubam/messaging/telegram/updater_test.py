@@ -1,4 +1,5 @@
 import json
+import tornado.gen
 import tornado.queues
 import tornado.testing
 
@@ -29,6 +30,41 @@ class UpdateFetcherTest(tornado.testing.AsyncTestCase):
     self.assertGreater(self.fetcher.last_update_id, 0)
     self.assertFalse(self.queue.empty())
 
+  @tornado.testing.gen_test
+  async def test_fetch_acknowledges_updates(self):
+    with open(UPDATES_FILE, 'r') as fp:
+      self.fetcher.bot.client.set_body(json.load(fp))
+
+    num_updates = await self.fetcher.fetch(timeout=30)
+    self.assertEqual(num_updates, self.queue.qsize())
+    url = self.fetcher.bot.client.requests[-1].url
+    self.assertIn('timeout=30', url)
+    self.assertNotIn('offset', url)
+
+    self.fetcher.bot.client.set_body({'ok': True, 'result': []})
+    self.assertEqual(await self.fetcher.fetch(timeout=30), 0)
+    request = self.fetcher.bot.client.requests[-1]
+    self.assertIn(f'offset={self.fetcher.last_update_id + 1}', request.url)
+    self.assertGreater(request.request_timeout, 30)
+
+  @tornado.testing.gen_test
+  async def test_fetch_waits_for_queue(self):
+    self.fetcher.queue = tornado.queues.Queue(maxsize=1)
+    with open(UPDATES_FILE, 'r') as fp:
+      updates = json.load(fp)
+    self.fetcher.bot.client.set_body(updates)
+    fetching = tornado.gen.convert_yielded(self.fetcher.fetch())
+    with self.assertRaises(tornado.gen.TimeoutError):
+      await tornado.gen.with_timeout(self.io_loop.time() + 0.05, fetching)
+    # Only the queued update is acknowledged.
+    first_id = updates['result'][0]['update_id']
+    self.assertEqual(self.fetcher.last_update_id, first_id)
+
+    num_updates = len(updates['result'])
+    for _ in range(num_updates):
+      await self.fetcher.queue.get()
+    self.assertEqual(await fetching, num_updates)
+
   @tornado.testing.gen_test
   async def test_fetch_fail(self):
     self.fetcher.bot.code = 404
@@ -78,6 +114,26 @@ class UpdateProcessorTest(tornado.testing.AsyncTestCase):
     msg_json = self.processor.bot.client.requests[-1].body
     self.assertIn('registered', msg_json.decode())
 
+  @tornado.testing.gen_test
+  async def test_process_concurrently(self):
+    running = []
+    max_running = 0
+
+    async def process_update(update):
+      nonlocal max_running
+      running.append(update)
+      max_running = max(max_running, len(running))
+      await tornado.gen.sleep(0.01)
+      running.remove(update)
+
+    self.processor.process_update = process_update
+    self.processor.workers = 3
+    self.io_loop.spawn_callback(self.processor.process)
+    for i in range(6):
+      await self.queue.put({'update_id': i})
+    await self.queue.join()
+    self.assertEqual(max_running, 3)
+
 
 if __name__ == '__main__':
   tornado.testing.main()
@@ -1,6 +1,5 @@
 import json
 import tornado.testing
-from unittest import mock
 
 from icubam import config
 from icubam.db import store
@@ -23,7 +22,6 @@ class TelegramWebookTest(tornado.testing.AsyncHTTPTestCase):
     self.tg_setup = integrator.TelegramSetup(
       self.config, self.db, scheduler=None, tg_bot=tg_bot
     )
-    self.tg_setup._start_periodic_fetching = mock.MagicMock(return_value=None)
     with open(self.UPDATES_FILE, 'r') as fp:
       self.update = json.load(fp)['result'][0]
     super().setUp()
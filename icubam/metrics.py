@@ -0,0 +1,351 @@
+"""Prometheus-style metrics of the servers, exported on /metrics.
+
+A small registry of counters, gauges and histograms, rendered in the text
+exposition format of Prometheus. The metrics are per process: a server runs
+in its own process and exports its own metrics (with several www workers,
+each worker exports those of the requests it served).
+"""
+import bisect
+import collections
+import contextlib
+import math
+import re
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from absl import logging
+from sqlalchemy import event
+from tornado.log import access_log
+
+# In seconds, from a fast query to a slow plot generation.
+BUCKETS = (
+  0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+  30.0
+)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+Labels = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, Labels, float]
+
+
+def _labels_key(labels: Dict) -> Labels:
+  return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_value(value: float) -> str:
+  if math.isinf(value):
+    return '+Inf' if value > 0 else '-Inf'
+  return repr(float(value))
+
+
+def _format_labels(labels: Labels) -> str:
+  if not labels:
+    return ''
+  escaped = (
+    '{}="{}"'.format(
+      k,
+      v.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+    ) for k, v in labels
+  )
+  return '{' + ','.join(escaped) + '}'
+
+
+class Metric:
+  TYPE = 'untyped'
+
+  def __init__(self, name: str, description: str):
+    self.name = name
+    self.description = description
+
+  def samples(self) -> Iterator[Sample]:
+    raise NotImplementedError()
+
+  def render(self) -> List[str]:
+    lines = [
+      f'# HELP {self.name} {self.description}',
+      f'# TYPE {self.name} {self.TYPE}',
+    ]
+    for name, labels, value in self.samples():
+      lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    return lines
+
+
+class Counter(Metric):
+  TYPE = 'counter'
+
+  def __init__(self, name: str, description: str):
+    super().__init__(name, description)
+    self._values: Dict[Labels, float] = collections.defaultdict(float)
+
+  def inc(self, amount: float = 1, **labels):
+    self._values[_labels_key(labels)] += amount
+
+  def get(self, **labels) -> float:
+    return self._values.get(_labels_key(labels), 0.0)
+
+  def samples(self) -> Iterator[Sample]:
+    for labels, value in self._values.items():
+      yield self.name, labels, value
+
+
+class Gauge(Metric):
+  """A value set directly or read from a function when rendered.
+
+  Functions may watch a counter of another object, e.g. the hits of a cache,
+  in which case the type of the gauge is set to counter.
+  """
+
+  TYPE = 'gauge'
+
+  def __init__(self, name: str, description: str, type: str = TYPE):
+    super().__init__(name, description)
+    self.TYPE = type
+    self._values: Dict[Labels, float] = {}
+    self._functions: Dict[Labels, Callable[[], float]] = {}
+
+  def set(self, value: float, **labels):
+    self._values[_labels_key(labels)] = value
+
+  def set_function(self, function: Callable[[], float], **labels):
+    self._functions[_labels_key(labels)] = function
+
+  def samples(self) -> Iterator[Sample]:
+    for labels, value in self._values.items():
+      yield self.name, labels, value
+    for labels, function in self._functions.items():
+      try:
+        yield self.name, labels, float(function())
+      except Exception as e:
+        # e.g. the size of a multiprocessing queue on some platforms.
+        logging.debug(f'Cannot read {self.name}{labels}: {e}')
+
+
+class Histogram(Metric):
+  TYPE = 'histogram'
+
+  def __init__(self, name: str, description: str, buckets=BUCKETS):
+    super().__init__(name, description)
+    self.buckets = tuple(sorted(buckets))
+    # By labels: the counts per bucket (the last one being +Inf) and the sum.
+    self._counts: Dict[Labels, List[int]] = {}
+    self._sums: Dict[Labels, float] = collections.defaultdict(float)
+
+  def observe(self, value: float, **labels):
+    key = _labels_key(labels)
+    counts = self._counts.get(key, None)
+    if counts is None:
+      counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+    counts[bisect.bisect_left(self.buckets, value)] += 1
+    self._sums[key] += value
+
+  @contextlib.contextmanager
+  def time(self, **labels):
+    """Observes the duration of the block."""
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.observe(time.perf_counter() - start, **labels)
+
+  def get_count(self, **labels) -> int:
+    return sum(self._counts.get(_labels_key(labels), []))
+
+  def samples(self) -> Iterator[Sample]:
+    for labels, counts in self._counts.items():
+      cumulative = 0
+      bounds = self.buckets + (math.inf, )
+      for bound, count in zip(bounds, counts):
+        cumulative += count
+        le = '+Inf' if math.isinf(bound) else repr(bound)
+        yield f'{self.name}_bucket', labels + (('le', le), ), cumulative
+      yield f'{self.name}_sum', labels, self._sums[labels]
+      yield f'{self.name}_count', labels, cumulative
+
+
+class Registry:
+  """The metrics of the process, by name."""
+  def __init__(self):
+    self._metrics: Dict[str, Metric] = collections.OrderedDict()
+
+  def _get(self, cls, name: str, *args, **kwargs) -> Metric:
+    metric = self._metrics.get(name, None)
+    if metric is None:
+      metric = self._metrics[name] = cls(name, *args, **kwargs)
+    elif not isinstance(metric, cls):
+      raise ValueError(f'{name} is already a {metric.TYPE}')
+    return metric
+
+  def counter(self, name: str, description: str) -> Counter:
+    return self._get(Counter, name, description)
+
+  def gauge(self, name: str, description: str, type: str = 'gauge') -> Gauge:
+    return self._get(Gauge, name, description, type=type)
+
+  def histogram(self, name: str, description: str, buckets=BUCKETS):
+    return self._get(Histogram, name, description, buckets=buckets)
+
+  def render(self) -> str:
+    lines = []
+    for metric in self._metrics.values():
+      lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+START_TIME = REGISTRY.gauge(
+  'icubam_start_time_seconds', 'Start time of the server, by server.'
+)
+WORKERS = REGISTRY.gauge(
+  'icubam_workers', 'Number of worker processes of the server, by server.'
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+  'icubam_request_duration_seconds',
+  'Duration of the requests, by handler route, method and status.'
+)
+DB_QUERY_SECONDS = REGISTRY.histogram(
+  'icubam_db_query_duration_seconds',
+  'Duration of the database queries, by engine and statement.'
+)
+QUEUE_SIZE = REGISTRY.gauge(
+  'icubam_queue_size', 'Number of items waiting in the queues, by queue.'
+)
+SCHEDULED_MESSAGES = REGISTRY.gauge(
+  'icubam_scheduled_messages', 'Number of messages scheduled to be sent.'
+)
+CACHE_HITS = REGISTRY.gauge(
+  'icubam_cache_hits_total', 'Number of cache hits, by cache.', 'counter'
+)
+CACHE_MISSES = REGISTRY.gauge(
+  'icubam_cache_misses_total', 'Number of cache misses, by cache.', 'counter'
+)
+CACHE_HIT_RATIO = REGISTRY.gauge(
+  'icubam_cache_hit_ratio', 'Ratio of the cache hits, by cache.'
+)
+PLOT_SECONDS = REGISTRY.histogram(
+  'icubam_plot_duration_seconds', 'Duration of the plot generations, by plot.'
+)
+
+
+def log_request(handler):
+  """Records the duration of a request, and logs it as tornado does.
+
+  To be set as the `log_function` of the applications.
+  """
+  status = handler.get_status()
+  request_time = handler.request.request_time()
+  route = getattr(handler, 'ROUTE', None) or type(handler).__name__
+  REQUEST_SECONDS.observe(
+    request_time, route=route, method=handler.request.method, status=status
+  )
+
+  if status < 400:
+    log_method = access_log.info
+  elif status < 500:
+    log_method = access_log.warning
+  else:
+    log_method = access_log.error
+  log_method(
+    "%d %s %.2fms", status, handler._request_summary(), 1000 * request_time
+  )
+
+
+def _statement_type(statement: str) -> str:
+  words = statement.split(None, 1)
+  verb = words[0].upper() if words else ''
+  return verb if verb in ('SELECT', 'INSERT', 'UPDATE', 'DELETE') else 'OTHER'
+
+
+def instrument_engine(engine, name: str):
+  """Records the duration of the queries run on the SQLAlchemy engine."""
+  def before(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+  def after(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start', None)
+    if not starts:
+      return
+    DB_QUERY_SECONDS.observe(
+      time.perf_counter() - starts.pop(),
+      engine=name,
+      statement=_statement_type(statement)
+    )
+
+  event.listen(engine, 'before_cursor_execute', before)
+  event.listen(engine, 'after_cursor_execute', after)
+
+
+def watch_queue(name: str, queue):
+  QUEUE_SIZE.set_function(queue.qsize, queue=name)
+
+
+def watch_cache(name: str, cache):
+  CACHE_HITS.set_function(lambda: cache.hits, cache=name)
+  CACHE_MISSES.set_function(lambda: cache.misses, cache=name)
+  CACHE_HIT_RATIO.set_function(lambda: cache.hit_ratio, cache=name)
+
+
+_SAMPLE_RE = re.compile(r'^([a-zA-Z_:][\w:]*)(?:\{(.*)\})? (\S+)$')
+_LABEL_RE = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def parse(text: str) -> List[Tuple[str, Dict[str, str], float]]:
+  """Parses the samples of metrics rendered in the text format."""
+  result = []
+  for line in text.splitlines():
+    match = _SAMPLE_RE.match(line.strip())
+    if line.startswith('#') or match is None:
+      continue
+    name, labels, value = match.groups()
+    labels = dict(_LABEL_RE.findall(labels or ''))
+    try:
+      result.append((name, labels, float(value)))
+    except ValueError:
+      continue
+  return result
+
+
+def summarize(text: str) -> Dict[str, str]:
+  """Returns a human readable summary of the metrics of a server."""
+  totals: Dict[str, float] = collections.defaultdict(float)
+  by_label: Dict[str, Dict[str, float]] = collections.defaultdict(dict)
+  for name, labels, value in parse(text):
+    if name.endswith('_bucket'):
+      continue
+    totals[name] += value
+    if name == QUEUE_SIZE.name:
+      by_label[name][labels.get('queue', '')] = value
+    elif name == CACHE_HIT_RATIO.name:
+      by_label[name][labels.get('cache', '')] = value
+
+  def mean_ms(name: str) -> Optional[str]:
+    count = totals.get(f'{name}_count', 0)
+    if not count:
+      return None
+    return f"{count:.0f}, {1000 * totals[f'{name}_sum'] / count:.1f}ms avg"
+
+  result = {
+    'Requests':
+    mean_ms(REQUEST_SECONDS.name),
+    'DB queries':
+    mean_ms(DB_QUERY_SECONDS.name),
+    'Plots':
+    mean_ms(PLOT_SECONDS.name),
+    'Queues':
+    ', '.join(
+      f'{queue}: {size:.0f}'
+      for queue, size in sorted(by_label[QUEUE_SIZE.name].items())
+    ),
+    'Cache hits':
+    ', '.join(
+      f'{cache}: {100 * ratio:.0f}%'
+      for cache, ratio in sorted(by_label[CACHE_HIT_RATIO.name].items())
+    ),
+  }
+  # Each worker exports its own metrics, the summary is only the one of the
+  # worker which answered.
+  workers = totals.get(WORKERS.name, 1)
+  if workers > 1:
+    result['Workers'] = f'{workers:.0f}, figures of a single worker'
+  if SCHEDULED_MESSAGES.name in totals:
+    result['Scheduled messages'] = f'{totals[SCHEDULED_MESSAGES.name]:.0f}'
+  return {k: v for k, v in result.items() if v}
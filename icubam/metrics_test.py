@@ -0,0 +1,130 @@
+from unittest import mock
+
+import tornado.queues
+import tornado.testing
+import tornado.web
+from absl.testing import absltest
+from sqlalchemy import create_engine
+
+from icubam import base_server, cache, metrics
+
+
+class MetricsTest(absltest.TestCase):
+  def setUp(self):
+    super().setUp()
+    self.registry = metrics.Registry()
+
+  def test_counter(self):
+    counter = self.registry.counter('test_total', 'A counter.')
+    counter.inc(route='/a')
+    counter.inc(2, route='/a')
+    counter.inc(route='/b"')
+    self.assertEqual(counter.get(route='/a'), 3)
+    self.assertEqual(
+      self.registry.render(), '# HELP test_total A counter.\n'
+      '# TYPE test_total counter\n'
+      'test_total{route="/a"} 3.0\n'
+      'test_total{route="/b\\""} 1.0\n'
+    )
+    self.assertIs(self.registry.counter('test_total', 'Other.'), counter)
+    with self.assertRaises(ValueError):
+      self.registry.gauge('test_total', 'A gauge.')
+
+  def test_histogram(self):
+    histogram = self.registry.histogram('test_seconds', 'Durations.', [1, 2])
+    for value in [0.5, 1, 1.5, 3]:
+      histogram.observe(value, route='/')
+    self.assertEqual(histogram.get_count(route='/'), 4)
+    samples = {(name, dict(labels).get('le')): value
+               for name, labels, value in histogram.samples()}
+    self.assertEqual(samples[('test_seconds_bucket', '1')], 2)
+    self.assertEqual(samples[('test_seconds_bucket', '2')], 3)
+    self.assertEqual(samples[('test_seconds_bucket', '+Inf')], 4)
+    self.assertEqual(samples[('test_seconds_sum', None)], 6)
+    self.assertEqual(samples[('test_seconds_count', None)], 4)
+
+    with histogram.time(route='/time'):
+      pass
+    self.assertEqual(histogram.get_count(route='/time'), 1)
+
+  def test_gauge_functions(self):
+    queue = tornado.queues.Queue()
+    queue.put_nowait(1)
+    gauge = self.registry.gauge('test_queue_size', 'Queues.')
+    gauge.set_function(queue.qsize, queue='q')
+    gauge.set_function(lambda: 1 / 0, queue='broken')
+    self.assertEqual(
+      list(gauge.samples()), [('test_queue_size', (('queue', 'q'), ), 1.0)]
+    )
+
+  def test_instrument_engine(self):
+    engine = create_engine('sqlite:///:memory:')
+    metrics.instrument_engine(engine, 'test')
+    before = metrics.DB_QUERY_SECONDS.get_count(
+      engine='test', statement='SELECT'
+    )
+    engine.execute('SELECT 1')
+    after = metrics.DB_QUERY_SECONDS.get_count(
+      engine='test', statement='SELECT'
+    )
+    self.assertEqual(after, before + 1)
+
+  def test_summarize(self):
+    test_cache = cache.TTLCache(ttl=10)
+    test_cache.put('key', 1)
+    test_cache.get('key')
+    test_cache.get('other')
+    metrics.watch_cache('test', test_cache)
+    metrics.REQUEST_SECONDS.observe(0.5, route='/test', method='GET')
+    text = metrics.REGISTRY.render()
+    samples = metrics.parse(text)
+    self.assertIn(('icubam_cache_hit_ratio', {'cache': 'test'}, 0.5), samples)
+
+    summary = metrics.summarize(text)
+    self.assertIn('test: 50%', summary['Cache hits'])
+    self.assertIn('Requests', summary)
+    self.assertEqual(metrics.summarize('# nothing'), {})
+
+  def test_summarize_workers(self):
+    registry = metrics.Registry()
+    workers = registry.gauge(metrics.WORKERS.name, 'Workers.')
+    workers.set(4, server='WWWServer')
+    summary = metrics.summarize(registry.render())
+    self.assertEqual(summary['Workers'], '4, figures of a single worker')
+    workers.set(1, server='WWWServer')
+    self.assertNotIn('Workers', metrics.summarize(registry.render()))
+
+
+class MetricsHandlerTest(tornado.testing.AsyncHTTPTestCase):
+  def get_app(self):
+    handler = base_server.MetricsHandler
+    return tornado.web.Application([
+      (handler.ROUTE, handler, {
+        'token': 'token'
+      })
+    ])
+
+  def test_local(self):
+    self.assertEqual(self.fetch(base_server.MetricsHandler.ROUTE).code, 200)
+
+  def test_proxied(self):
+    route = base_server.MetricsHandler.ROUTE
+    headers = {'X-Forwarded-For': '1.2.3.4'}
+    self.assertEqual(self.fetch(route, headers=headers).code, 403)
+    headers['Authorization'] = 'Bearer token'
+    self.assertEqual(self.fetch(route, headers=headers).code, 200)
+
+  def test_remote(self):
+    route = base_server.MetricsHandler.ROUTE
+    with mock.patch.object(
+      base_server.MetricsHandler, 'is_local', return_value=False
+    ):
+      self.assertEqual(self.fetch(route).code, 403)
+      response = self.fetch(route, headers={'Authorization': 'Bearer bad'})
+      self.assertEqual(response.code, 403)
+      response = self.fetch(route, headers={'Authorization': 'Bearer token'})
+      self.assertEqual(response.code, 200)
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -0,0 +1,121 @@
+"""Conditional and cached serving of the pages built from the bed counts."""
+import email.utils
+import hashlib
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Hashable, Optional
+
+from icubam import cache, metrics
+from icubam.db import store
+
+# Pages showing relative dates ("2 hours ago") are rendered again after that.
+TTL = 60  # in seconds.
+MAX_SIZE = 256
+
+
+def make_cache(config) -> cache.TTLCache:
+  """Returns the cache of rendered pages set by `server.page_cache_ttl`."""
+  result = cache.TTLCache(
+    ttl=config.server.get('page_cache_ttl', TTL), max_size=MAX_SIZE
+  )
+  metrics.watch_cache('pages', result)
+  return result
+
+
+class CachedPageMixin:
+  """Serves pages with an ETag derived from the version of their data.
+
+  Clients sending back the ETag (or a recent enough If-Modified-Since) get a
+  304 Not Modified without the page being built. Otherwise, the rendered body
+  is kept in the `page_cache` of the application settings, keyed by the
+  request, the locale, the data version and the current time bucket, so that
+  relative dates shown on the pages get refreshed every bucket. The bucket
+  lasts `server.page_cache_ttl` seconds, 0 disabling the cache.
+
+  The data version is more than a date (e.g. the number of ICUs drops when
+  one is removed), so the Last-Modified date of a page also accounts for the
+  time its version last changed, as seen by this process. Without a cache to
+  keep track of it, If-Modified-Since is ignored.
+  """
+  def get_page_cache(self) -> Optional[cache.TTLCache]:
+    return self.application.settings.get('page_cache', None)
+
+  def _bucket_seconds(self, page_cache) -> float:
+    if page_cache is not None and page_cache.is_on:
+      return page_cache.ttl
+    return TTL
+
+  def _version_changed_at(
+    self, page_cache: Optional[cache.TTLCache], page: Hashable,
+    version: store.DataVersion
+  ) -> Optional[datetime]:
+    """Returns when the page last got a new data version, None if unknown."""
+    if page_cache is None or not page_cache.is_on:
+      return None
+    key = ('version', page)
+    seen = page_cache.get(key, count=False)
+    if seen is None or seen[0] != version.key:
+      # After any Last-Modified date sent before, which are in seconds.
+      changed_at = datetime.utcfromtimestamp(int(time.time()) + 1)
+      if seen is not None:
+        changed_at = max(changed_at, seen[1] + timedelta(seconds=1))
+      seen = (version.key, changed_at)
+    # Put again to keep it for as long as the page is requested.
+    page_cache.put(key, seen)
+    return seen[1]
+
+  def _not_modified_since(self, last_modified: datetime) -> bool:
+    header = self.request.headers.get('If-Modified-Since', None)
+    if header is None or 'If-None-Match' in self.request.headers:
+      return False
+    try:
+      since = email.utils.parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+      return False
+    since = since.replace(tzinfo=None)
+    return last_modified.replace(microsecond=0) <= since
+
+  def serve_cached(
+    self,
+    version: store.DataVersion,
+    render: Callable[[], bytes],
+    variant: Hashable = None
+  ):
+    """Finishes the request with the page, rendered only if needed.
+
+    The variant tells apart pages rendered differently for the same request,
+    e.g. for different users.
+    """
+    page_cache = self.get_page_cache()
+    seconds = self._bucket_seconds(page_cache)
+    bucket = int(time.time() // seconds)
+    arguments = tuple(
+      sorted((k, tuple(v)) for k, v in self.request.query_arguments.items())
+    )
+    page = (self.request.path, arguments, self.locale.code, variant)
+    key = page + (version.key, bucket)
+    etag = hashlib.sha1(repr(key).encode()).hexdigest()
+    self.set_header('Etag', f'"{etag}"')
+    # The page changes with the time bucket even if the data does not.
+    last_modified = datetime.utcfromtimestamp(bucket * seconds)
+    if version.last_modified is not None:
+      last_modified = max(last_modified, version.last_modified)
+    changed_at = self._version_changed_at(page_cache, page, version)
+    if changed_at is not None:
+      last_modified = max(last_modified, changed_at)
+    self.set_header('Last-Modified', last_modified)
+    self.set_header('Cache-Control', 'private, no-cache')
+
+    not_modified_since = (
+      changed_at is not None and self._not_modified_since(last_modified)
+    )
+    if self.check_etag_header() or not_modified_since:
+      self.set_status(304)
+      return self.finish()
+
+    body = page_cache.get(key) if page_cache is not None else None
+    if body is None:
+      body = render()
+      if page_cache is not None:
+        page_cache.put(key, body)
+    return self.finish(body)
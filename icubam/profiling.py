@@ -0,0 +1,186 @@
+"""Opt-in profiling of the requests and logging of the slow queries.
+
+Both are set in the `profiling` section of the config:
+ - `sample_rate`: the percentage of the requests profiled with cProfile, 0
+   disabling it. The profiles are written to `dir`, where only the `keep` most
+   recent ones are kept, and can be downloaded by the admins from the
+   backoffice. Read them with pstats or snakeviz.
+ - `slow_query_ms`: the statements slower than that are logged, along with
+   the route of the handler running them, 0 disabling it.
+"""
+import contextvars
+import cProfile
+import dataclasses
+import datetime
+import os
+import random
+import re
+import time
+from typing import Any, List, Optional
+
+from absl import logging
+from sqlalchemy import event
+
+DIR = '/tmp/icubam_profiles'
+KEEP = 100
+SUFFIX = '.prof'
+# The longest statement logged, in characters.
+MAX_STATEMENT = 1000
+
+# The route of the handler of the request being served, if any.
+current_route: contextvars.ContextVar = contextvars.ContextVar(
+  'current_route', default=None
+)
+
+
+@dataclasses.dataclass
+class ProfileFile:
+  name: str
+  server: str
+  route: str
+  created: datetime.datetime
+  duration_ms: int
+  size: int
+
+
+class Profiler:
+  """Writes the profiles of a sample of the requests of a server."""
+  def __init__(
+    self,
+    directory: str,
+    server: str,
+    sample_rate: float = 0.0,
+    keep: int = KEEP
+  ):
+    self.directory = directory
+    self.server = server
+    self.sample_rate = sample_rate
+    self.keep = keep
+    # cProfile profiles a single request at a time.
+    self.active = False
+
+  def sample(self) -> bool:
+    return random.random() * 100 < self.sample_rate
+
+  def save(self, profile: cProfile.Profile, route: str, duration: float):
+    """Writes the profile and removes the oldest ones beyond `keep`."""
+    os.makedirs(self.directory, exist_ok=True)
+    slug = re.sub(r'[^\w.]+', '-', route).strip('-') or 'root'
+    name = '{:%Y%m%dT%H%M%S%f}_{}_{}_{}{}'.format(
+      datetime.datetime.utcnow(), self.server, int(1000 * duration), slug,
+      SUFFIX
+    )
+    path = os.path.join(self.directory, name)
+    profile.dump_stats(path)
+    logging.info(f'Profile of {route} written to {path}')
+
+    for old in list_profiles(self.directory)[self.keep:]:
+      try:
+        os.remove(os.path.join(self.directory, old.name))
+      except OSError:
+        pass
+
+
+def get_setting(config, key: str, default: Any) -> Any:
+  """Returns a setting of the optional `profiling` section of the config."""
+  value = config.conf.get('profiling', {}).get(key, None)
+  return default if value is None else value
+
+
+def make_profiler(config, server: str) -> Optional[Profiler]:
+  """Returns the profiler of the server, None if profiling is disabled."""
+  sample_rate = get_setting(config, 'sample_rate', 0)
+  if sample_rate <= 0:
+    return None
+  return Profiler(
+    get_setting(config, 'dir', DIR),
+    server,
+    sample_rate=sample_rate,
+    keep=get_setting(config, 'keep', KEEP)
+  )
+
+
+def list_profiles(directory: str) -> List[ProfileFile]:
+  """Returns the profiles written in the directory, most recent first."""
+  if not os.path.isdir(directory):
+    return []
+  result = []
+  for name in os.listdir(directory):
+    parts = name[:-len(SUFFIX)].split('_', 3)
+    if not name.endswith(SUFFIX) or len(parts) != 4:
+      continue
+    try:
+      created = datetime.datetime.strptime(parts[0], '%Y%m%dT%H%M%S%f')
+      size = os.path.getsize(os.path.join(directory, name))
+      duration_ms = int(parts[2])
+    except (ValueError, OSError):
+      continue
+    result.append(
+      ProfileFile(name, parts[1], parts[3], created, duration_ms, size)
+    )
+  return sorted(result, key=lambda p: p.created, reverse=True)
+
+
+class ProfilingMixin:
+  """Profiles a sample of the requests with the `profiler` of the settings.
+
+  The handler route is also recorded for the slow queries log. Since cProfile
+  profiles the whole thread, the other requests served concurrently while a
+  request is profiled show up in its profile.
+  """
+
+  _profile = None
+
+  def prepare(self):
+    route = getattr(self, 'ROUTE', None) or type(self).__name__
+    current_route.set(route)
+    profiler = self.settings.get('profiler', None)
+    if profiler is None or profiler.active or not profiler.sample():
+      return
+    profiler.active = True
+    self._profile = cProfile.Profile()
+    self._profile.enable()
+
+  def on_finish(self):
+    if self._profile is None:
+      return
+    self._profile.disable()
+    profiler = self.settings['profiler']
+    profiler.active = False
+    route = getattr(self, 'ROUTE', None) or type(self).__name__
+    profiler.save(self._profile, route, self.request.request_time())
+    self._profile = None
+
+
+def redact(parameters: Any) -> Any:
+  """Replaces the values of the parameters of a statement by their types."""
+  if isinstance(parameters, dict):
+    return {k: redact(v) for k, v in parameters.items()}
+  if isinstance(parameters, (list, tuple)):
+    return type(parameters)(redact(v) for v in parameters)
+  return type(parameters).__name__
+
+
+def log_slow_queries(engine, threshold_ms: float):
+  """Logs the statements run on the engine slower than the threshold."""
+  def before(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('slow_query_start', []).append(time.perf_counter())
+
+  def after(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('slow_query_start', None)
+    if not starts:
+      return
+    elapsed_ms = 1000 * (time.perf_counter() - starts.pop())
+    if elapsed_ms < threshold_ms:
+      return
+    if executemany and parameters:
+      redacted = f'{len(parameters)} x {redact(parameters[0])}'
+    else:
+      redacted = redact(parameters)
+    logging.warning(
+      f'Slow query ({elapsed_ms:.0f}ms) on {current_route.get()}: '
+      f'{statement[:MAX_STATEMENT]} {redacted}'
+    )
+
+  event.listen(engine, 'before_cursor_execute', before)
+  event.listen(engine, 'after_cursor_execute', after)
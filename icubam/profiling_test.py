@@ -0,0 +1,114 @@
+import cProfile
+import os
+import pstats
+import tempfile
+from unittest import mock
+
+import tornado.testing
+import tornado.web
+from absl.testing import absltest
+from sqlalchemy import create_engine
+
+from icubam import config, profiling
+
+
+class ProfiledHandler(profiling.ProfilingMixin, tornado.web.RequestHandler):
+  ROUTE = '/profiled'
+
+  def get(self):
+    self.write(profiling.current_route.get())
+
+
+class ProfilerTest(absltest.TestCase):
+  def setUp(self):
+    super().setUp()
+    directory = tempfile.TemporaryDirectory()
+    self.addCleanup(directory.cleanup)
+    self.directory = directory.name
+
+  def test_save(self):
+    profiler = profiling.Profiler(self.directory, 'www', keep=2)
+    for route in ['/a', '/b/c', '/']:
+      profile = cProfile.Profile()
+      profile.enable()
+      sum(range(10))
+      profile.disable()
+      profiler.save(profile, route, 0.25)
+
+    profiles = profiling.list_profiles(self.directory)
+    self.assertLen(profiles, 2)
+    self.assertEqual([p.route for p in profiles], ['root', 'b-c'])
+    self.assertEqual(profiles[0].server, 'www')
+    self.assertEqual(profiles[0].duration_ms, 250)
+    pstats.Stats(os.path.join(self.directory, profiles[0].name))
+
+  def test_list_profiles(self):
+    self.assertEqual(profiling.list_profiles('/does/not/exist'), [])
+    for name in ['notes.txt', 'bad_name.prof']:
+      with open(os.path.join(self.directory, name), 'w') as fp:
+        fp.write('')
+    self.assertEqual(profiling.list_profiles(self.directory), [])
+
+  def test_make_profiler(self):
+    cfg = config.Config('resources/test.toml')
+    self.assertIsNone(profiling.make_profiler(cfg, 'www'))
+    cfg.profiling.sample_rate = 10
+    profiler = profiling.make_profiler(cfg, 'www')
+    self.assertEqual(profiler.sample_rate, 10)
+    self.assertEqual(profiler.directory, cfg.profiling.dir)
+
+  def test_redact(self):
+    self.assertEqual(
+      profiling.redact((1, 'secret', None)), ('int', 'str', 'NoneType')
+    )
+    self.assertEqual(
+      profiling.redact({
+        'telephone': '+33600000000',
+        'ids': [1]
+      }), {
+        'telephone': 'str',
+        'ids': ['int']
+      }
+    )
+
+  def test_log_slow_queries(self):
+    engine = create_engine('sqlite:///:memory:')
+    profiling.log_slow_queries(engine, 0)
+    with self.assertLogs(level='WARNING') as logs:
+      engine.execute('SELECT ?', ('secret', ))
+    self.assertIn('SELECT ? (\'str\',)', logs.output[0])
+    self.assertNotIn('secret', logs.output[0])
+
+
+class ProfilingMixinTest(tornado.testing.AsyncHTTPTestCase):
+  def setUp(self):
+    self.directory = tempfile.TemporaryDirectory()
+    self.profiler = profiling.Profiler(
+      self.directory.name, 'test', sample_rate=100
+    )
+    super().setUp()
+
+  def tearDown(self):
+    super().tearDown()
+    self.directory.cleanup()
+
+  def get_app(self):
+    return tornado.web.Application([(ProfiledHandler.ROUTE, ProfiledHandler)],
+                                   profiler=self.profiler)
+
+  def test_profiled(self):
+    response = self.fetch(ProfiledHandler.ROUTE)
+    self.assertEqual(response.body.decode(), ProfiledHandler.ROUTE)
+    profiles = profiling.list_profiles(self.directory.name)
+    self.assertEqual(len(profiles), 1)
+    self.assertEqual(profiles[0].route, 'profiled')
+    self.assertFalse(self.profiler.active)
+
+  def test_not_sampled(self):
+    with mock.patch.object(self.profiler, 'sample', return_value=False):
+      self.fetch(ProfiledHandler.ROUTE)
+    self.assertEqual(profiling.list_profiles(self.directory.name), [])
+
+
+if __name__ == '__main__':
+  absltest.main()
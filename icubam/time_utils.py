@@ -65,6 +65,19 @@ def parse_hour(hour, sep=':') -> Tuple:
     return "", ""
 
 
+def parse_ts(ts):
+  """Returns the datetime of a timestamp or ISO date string, as is otherwise.
+
+  Raises:
+   ValueError: if the string is neither.
+  """
+  if not isinstance(ts, str):
+    return ts
+  if ts.isnumeric():
+    return datetime.datetime.fromtimestamp(int(ts))
+  return datetime.datetime.fromisoformat(ts)
+
+
 def get_next_timestamp(hours, ts=None):
   """Gets the timestamp of the next hour in the list based on ts (or now).
 
@@ -22,6 +22,18 @@ class TimeUtilsTest(absltest.TestCase):
     self.assertEqual(time_utils.parse_hour("wqw"), ("", ""))
     self.assertEqual(time_utils.parse_hour(23.12), (23.12))
 
+  def test_parse_ts(self):
+    ts = datetime.datetime(2020, 4, 1, 12).timestamp()
+    self.assertEqual(
+      time_utils.parse_ts(str(int(ts))), datetime.datetime(2020, 4, 1, 12)
+    )
+    self.assertEqual(
+      time_utils.parse_ts("2020-04-01"), datetime.datetime(2020, 4, 1)
+    )
+    self.assertIsNone(time_utils.parse_ts(None))
+    with self.assertRaises(ValueError):
+      time_utils.parse_ts("yesterday")
+
   def test_localewise_time_ago(self):
     ref = datetime.datetime(2020, 3, 27, 16, 30).timestamp()
     self.assertEqual(time_utils.localewise_time_ago(None, None, ref), 'never')
@@ -4,11 +4,11 @@ import os.path
 import tornado.locale
 import tornado.web
 
-from icubam import authenticator
+from icubam import authenticator, compression, profiling
 from icubam.db import store
 
 
-class BaseHandler(tornado.web.RequestHandler):
+class BaseHandler(profiling.ProfilingMixin, tornado.web.RequestHandler):
   """A base class for handlers."""
 
   COOKIE = 'id'
@@ -17,12 +17,19 @@ class BaseHandler(tornado.web.RequestHandler):
   def initialize(self, config, db_factory):
     self.config = config
     self.db = db_factory.create()
+    # Heavy read-only queries (maps, dashboards) go to the read engine.
+    self.read_db = db_factory.create_reader()
     self.user = None
     self.authenticator = authenticator.Authenticator(self.config, self.db)
 
   def get_template_path(self):
     return os.path.join(self.PATH, 'templates/')
 
+  def static_url(self, path, include_host=None, **kwargs):
+    """Returns the url of a static file, hashed so that it is cached long."""
+    folders = {'/static/': os.path.join(self.PATH, 'static')}
+    return compression.static_url(folders, path)
+
   def get_current_user(self):
     user_token = self.get_secure_cookie(self.COOKIE)
     if user_token is None:
@@ -71,13 +78,13 @@ class APIKeyProtectedHandler(BaseHandler):
       logging.info('no API_KEY')
       return
 
-    client = self.db.auth_external_client(key)
+    client = self.db.auth_external_client_profile(key)
     if client is None:
       logging.info(f'Unknown API key {key}')
       return None
 
     if client.access_type in self.ACCESS:
-      self.regions = client.regions
+      self.region_ids = client.region_ids
       return client
     else:
       logging.info('Unauthorized route.')
@@ -2,12 +2,14 @@ import os
 
 from absl import logging  # noqa: F401
 
+from icubam import page_cache
 from icubam.db import store
-from icubam.analytics import operational_dashboard
 from icubam.www.handlers import base
 
 
-class OperationalDashboardHandler(base.APIKeyProtectedHandler):
+class OperationalDashboardHandler(
+  page_cache.CachedPageMixin, base.APIKeyProtectedHandler
+):
 
   ROUTE = '/dashboard'
   # Problably better not to be equal to admin.
@@ -18,20 +20,30 @@ class OperationalDashboardHandler(base.APIKeyProtectedHandler):
   @base.authenticated(code=503)
   def get(self):
     """Serves a page with a table gathering current bedcount data with some extra information."""
+    # The visible ICUs depend on the regions of the client.
+    return self.serve_cached(
+      self.read_db.get_data_version(self.region_ids or None),
+      self.render_dashboard,
+      variant=self.current_user.external_client_id
+    )
+
+  def render_dashboard(self) -> bytes:
+    # Loads bokeh and pandas on the first dashboard only.
+    from icubam.analytics import operational_dashboard
+
     arg_region = self.get_query_argument('region', default=None)
-    locale = self.get_user_locale()
     kwargs = operational_dashboard.make(
       self.current_user.external_client_id,
-      self.db,
+      self.read_db,
       arg_region,
-      locale,
+      self.locale,
       self.config.analytics.extra_plots_dir,
       external=True
     )
 
     parent_path = '/'.join(os.path.split(self.PATH)[:-1])
     template_folder = os.path.join('/', parent_path, 'backoffice/templates/')
-    return self.render(
+    return self.render_string(
       os.path.join(template_folder, 'operational-dashboard.html'),
       backoffice_root=self.BACKOFFICE_PREFIX,
       api_key=self.get_query_argument('API_KEY', None),
@@ -1,9 +1,10 @@
+import tornado.escape
 import tornado.web
 
 import icubam
 from icubam.db import store
 from icubam.www.handlers import base
-from icubam import map_builder
+from icubam import icu_tree, map_builder, page_cache
 
 
 class HomeHandler(base.BaseHandler):
@@ -21,24 +22,25 @@ class HomeHandler(base.BaseHandler):
     else:
       return ""
 
-  @tornado.web.authenticated
-  def get(self):
-    locale = self.get_user_locale()
-    builder = map_builder.MapBuilder(self.config, self.db, locale)
-    data, center = builder.prepare_jsons(
-      None, center_icu=self.icu, level='dept'
-    )
+  def render_map(self):
+    """The data of the map is then fetched from the MapDataHandler."""
+    query = self.request.query
     return self.render(
       'index.html',
       API_KEY=self.config.GOOGLE_API_KEY,
-      center=center,
-      data=data,
+      data_url=f'{MapDataHandler.ROUTE}?{query}',
+      popup_route=MapPopupHandler.PREFIX,
+      query=query,
       version=icubam.__version__,
       disclaimer_url=self.get_disclaimer_url()
     )
 
+  @tornado.web.authenticated
+  def get(self):
+    return self.render_map()
+
 
-class MapByAPIHandler(base.APIKeyProtectedHandler):
+class MapByAPIHandler(HomeHandler, base.APIKeyProtectedHandler):
   """Same as HomeHandler but accessed with an API KEY"""
 
   ROUTE = '/map'
@@ -46,28 +48,79 @@ class MapByAPIHandler(base.APIKeyProtectedHandler):
 
   def initialize(self, config, db_factory):
     super().initialize(config, db_factory)
-    self.regions = None
+    self.region_ids = None
+
+  @base.authenticated(code=503)
+  def get(self):
+    return self.render_map()
 
-  def get_disclaimer_url(self):
-    """To show a disclaimer link if defined in configuration."""
-    if self.config.server.has_key('disclaimer'):
-      return "<a href='/disclaimer'>disclaimer</a>"
-    else:
-      return ""
+
+class MapDataHandler(page_cache.CachedPageMixin, base.APIKeyProtectedHandler):
+  """Serves the clusters of the maps, either with an API KEY or a cookie."""
+
+  ROUTE = '/map/data.json'
+  ACCESS = MapByAPIHandler.ACCESS
+
+  def initialize(self, config, db_factory):
+    super().initialize(config, db_factory)
+    self.icu = None
+    self.region_ids = None
+
+  def get_current_user(self):
+    if self.get_query_argument('API_KEY', None) is None:
+      return base.BaseHandler.get_current_user(self)
+    return super().get_current_user()
+
+  def get_map_args(self):
+    regions = self.region_ids if self.region_ids else None
+    level = self.get_query_argument('level', 'dept')
+    if level not in icu_tree.ICUTree.LEVELS:
+      raise tornado.web.HTTPError(400, f'Unknown level {level}')
+    return regions, level
+
+  def get_builder(self):
+    return map_builder.MapBuilder(self.config, self.read_db, self.locale)
+
+  def render_data(self, regions, level) -> bytes:
+    data = self.get_builder().prepare_data(self.icu, regions, level)
+    return tornado.escape.json_encode(data).encode()
 
   @base.authenticated(code=503)
   def get(self):
-    locale = self.get_user_locale()
-    builder = map_builder.MapBuilder(self.config, self.db, locale)
-    regions = [r.region_id for r in self.regions] if self.regions else None
-    data, center = builder.prepare_jsons(
-      None, center_icu=None, regions=regions, level='dept'
+    regions, level = self.get_map_args()
+    self.set_header('Content-Type', 'application/json')
+    # The map is centered on the ICU of the user, if any.
+    variant = (
+      None if regions is None else tuple(sorted(regions)),
+      None if self.icu is None else self.icu.icu_id
     )
-    return self.render(
-      'index.html',
-      API_KEY=self.config.GOOGLE_API_KEY,
-      center=center,
-      data=data,
-      version=icubam.__version__,
-      disclaimer_url=self.get_disclaimer_url()
+    return self.serve_cached(
+      self.read_db.get_data_version(regions),
+      lambda: self.render_data(regions, level),
+      variant=variant
+    )
+
+
+class MapPopupHandler(MapDataHandler):
+  """Renders the popup of a single cluster of the map."""
+
+  PREFIX = '/map/popup/'
+  ROUTE = PREFIX + r'([^/]+)'
+
+  def render_popup(self, cluster_id, regions, level) -> bytes:
+    covid = self.get_query_argument('covid', '1') != '0'
+    popup = self.get_builder().prepare_popup(
+      cluster_id, covid=covid, regions=regions, level=level
+    )
+    if popup is None:
+      raise tornado.web.HTTPError(404, f'Unknown cluster {cluster_id}')
+    return popup
+
+  @base.authenticated(code=503)
+  def get(self, cluster_id):
+    regions, level = self.get_map_args()
+    return self.serve_cached(
+      self.read_db.get_data_version(regions),
+      lambda: self.render_popup(cluster_id, regions, level),
+      variant=None if regions is None else tuple(sorted(regions))
     )
@@ -1,8 +1,9 @@
 import os.path
-import tornado.web
 
+from icubam import compression
 
-class NoCacheStaticFileHandler(tornado.web.StaticFileHandler):
+
+class StaticFileHandler(compression.StaticFileHandler):
   ROUTE = r"/static/(.*)"
   PATH = "static/"
 
@@ -1,22 +1,38 @@
+import multiprocessing
 import os.path
 
+import tornado.httpserver
+import tornado.ioloop
 import tornado.locale
+import tornado.netutil
+import tornado.process
 import tornado.web
 from absl import logging  # noqa: F401
 from tornado import queues
 
-from icubam import base_server, sentry
+from icubam import (
+  base_server, compression, metrics, page_cache, profiling, sentry
+)
 from icubam.db import queue_writer
 from icubam.www.handlers import consent, db, error, disclaimer, home, static, update
 from icubam.www.handlers.version import VersionHandler
 
 
 class WWWServer(base_server.BaseServer):
-  """Serves and manipulates the ICUBAM data."""
-  def __init__(self, config, port=None):
+  """Serves and manipulates the ICUBAM data.
+
+  With several workers, set by `server.workers` or the `workers` argument,
+  the requests are served by that many processes sharing the port, while a
+  single other process writes the bed counts they receive.
+  """
+  def __init__(self, config, port=None, workers=None):
     sentry.maybe_init_sentry(config, server_name='www')
     super().__init__(config, port)
     self.port = port if port is not None else self.config.server.port
+    if workers is None:
+      workers = self.config.server.get('workers', 1)
+    self.workers = workers if isinstance(workers, int) else 1
+    metrics.WORKERS.set(self.workers, server=self.__class__.__name__)
     self.writing_queue = queues.Queue()
     self.callbacks = [
       queue_writer.QueueWriter(self.writing_queue, self.db_factory).process
@@ -25,7 +41,7 @@ class WWWServer(base_server.BaseServer):
 
   def make_routes(self):
     self.routes.append((
-      r'/(favicon.ico)', tornado.web.StaticFileHandler, {
+      r'/(favicon.ico)', compression.StaticFileHandler, {
         'path': os.path.join(self.path, 'static')
       }
     ))
@@ -39,6 +55,8 @@ class WWWServer(base_server.BaseServer):
     self.add_handler(update.UpdateHandler, **kwargs)
     self.add_handler(home.HomeHandler, **kwargs)
     self.add_handler(home.MapByAPIHandler, **kwargs)
+    self.add_handler(home.MapDataHandler, **kwargs)
+    self.add_handler(home.MapPopupHandler, **kwargs)
     self.add_handler(db.OperationalDashboardHandler, **kwargs)
     self.add_handler(VersionHandler, **kwargs)
     self.add_handler(consent.ConsentHandler, **kwargs)
@@ -55,17 +73,71 @@ class WWWServer(base_server.BaseServer):
       parent = os.path.join('/', '/'.join(os.path.split(self.path)[:-1]))
       bo_path = os.path.join(parent, 'backoffice/static/dist')
       self.routes.append((
-        '/static/dist/(.*)', tornado.web.StaticFileHandler, {
+        '/static/dist/(.*)', compression.StaticFileHandler, {
           'path': bo_path
         }
       ))
 
-    self.add_handler(static.NoCacheStaticFileHandler, root=self.path)
+    self.add_handler(static.StaticFileHandler, root=self.path)
 
   def make_app(self, cookie_secret=None):
     if cookie_secret is None:
       cookie_secret = self.config.SECRET_COOKIE
     self.make_routes()
-    settings = {"cookie_secret": cookie_secret, "login_url": "/error"}
+    settings = {
+      "cookie_secret": cookie_secret,
+      "login_url": "/error",
+      "page_cache": page_cache.make_cache(self.config),
+      "profiler": profiling.make_profiler(self.config, "www"),
+      "log_function": metrics.log_request,
+    }
     tornado.locale.load_translations(os.path.join(self.path, "translations"))
-    return tornado.web.Application(self.routes, **settings)
+    return tornado.web.Application(
+      self.routes,
+      transforms=compression.get_transforms(self.config),
+      **settings
+    )
+
+  def run(self):
+    if self.workers <= 1:
+      return super().run()
+
+    logging.info(
+      f"WWWServer running on port {self.port}, {self.workers} workers"
+    )
+    sockets = tornado.netutil.bind_sockets(self.port)
+    process_queue = multiprocessing.Queue()
+    # Restarts the processes which die unexpectedly.
+    task_id = tornado.process.fork_processes(self.workers + 1)
+    self.db_factory.dispose()
+    io_loop = tornado.ioloop.IOLoop.current()
+    self.stop_with_parent(io_loop)
+    if task_id == 0:
+      for sock in sockets:
+        sock.close()
+      self.snapshot.register(tornado.ioloop)
+      writer = queue_writer.ProcessQueueWriter(process_queue, self.db_factory)
+      self.callbacks = [writer.process]
+    else:
+      server = tornado.httpserver.HTTPServer(self.make_app())
+      server.add_sockets(sockets)
+      self.callbacks = [
+        queue_writer.QueueForwarder(self.writing_queue, process_queue).process
+      ]
+    for callback_obj in self.callbacks:
+      io_loop.spawn_callback(callback_obj)
+    io_loop.start()
+    if task_id == 0:
+      # Releases the executor thread waiting for an item, to exit.
+      process_queue.put(None)
+
+  def stop_with_parent(self, io_loop, every=1.0):
+    """Stops the IOLoop of a forked process once its parent is gone."""
+    parent = os.getppid()
+
+    def check():
+      if os.getppid() != parent:
+        logging.info(f'Parent process {parent} exited, stopping.')
+        io_loop.stop()
+
+    tornado.ioloop.PeriodicCallback(check, every * 1000).start()
@@ -1,8 +1,9 @@
+import dataclasses
 import json
 from unittest import mock
 
 import tornado.testing
-from icubam import config
+from icubam import base_server, config, map_builder
 from icubam.db import store
 from icubam.www import server
 from icubam.www import token
@@ -34,6 +35,13 @@ class TestWWWServer(tornado.testing.AsyncHTTPTestCase):
   def get_app(self):
     return self.server.make_app(cookie_secret='secret')
 
+  def test_workers(self):
+    self.assertEqual(self.server.workers, 1)
+    self.config.server.workers = 4
+    self.assertEqual(server.WWWServer(self.config, port=8888).workers, 4)
+    workers = server.WWWServer(self.config, port=8888, workers=2).workers
+    self.assertEqual(workers, 2)
+
   def test_homepage_without_cookie(self):
     response = self.fetch(home.HomeHandler.ROUTE)
     self.assertEqual(response.code, 401)
@@ -44,6 +52,8 @@ class TestWWWServer(tornado.testing.AsyncHTTPTestCase):
       m.return_value = 'anything'
       response = self.fetch(home.HomeHandler.ROUTE, method='GET')
     self.assertEqual(response.code, 200)
+    # Static files are hashed, so that they can be cached long.
+    self.assertIn(b'/static/map.js?v=', response.body)
 
   def test_update_form(self):
     response = self.fetch(update.UpdateHandler.ROUTE)
@@ -70,6 +80,19 @@ class TestWWWServer(tornado.testing.AsyncHTTPTestCase):
       {'version', 'git-hash', 'bed_counts.last_modified'}
     )
 
+  def test_metrics(self):
+    self.fetch(VersionHandler.ROUTE)
+    response = self.fetch(base_server.MetricsHandler.ROUTE)
+    self.assertEqual(response.code, 200)
+    self.assertIn('text/plain', response.headers['Content-Type'])
+    body = response.body.decode()
+    self.assertIn(
+      'icubam_request_duration_seconds_count{'
+      f'method="GET",route="{VersionHandler.ROUTE}",status="200"}}', body
+    )
+    self.assertIn('icubam_db_query_duration_seconds_count', body)
+    self.assertIn('icubam_queue_size{queue="bed_counts"}', body)
+
   def test_map(self):
     # No key
     route = home.MapByAPIHandler.ROUTE
@@ -112,6 +135,86 @@ class TestWWWServer(tornado.testing.AsyncHTTPTestCase):
     response = self.fetch(url, method="GET")
     self.assertEqual(response.code, 200)
 
+  def add_map_client(self):
+    access_maps = store.ExternalClient(
+      name='maps-key', access_type=store.AccessTypes.MAP
+    )
+    _, access_key = self.db.add_external_client(self.admin_id, access_maps)
+    return access_key.key
+
+  def test_map_data(self):
+    self.db.update_bed_count_for_icu(
+      self.admin_id,
+      store.BedCount(icu_id=self.icu_id, n_covid_occ=1, n_covid_free=2)
+    )
+    route = home.MapDataHandler.ROUTE
+    response = self.fetch(route)
+    self.assertEqual(response.code, 503)
+
+    url = f'{route}?API_KEY={self.add_map_client()}'
+    response = self.fetch(url)
+    self.assertEqual(response.code, 200)
+    data = json.loads(response.body)
+    self.assertEqual(set(data), {'center', 'clusters'})
+    self.assertEqual(set(data['clusters']), {'true', 'false'})
+    cluster = data['clusters']['true'][0]
+    self.assertEqual(cluster['label'], 'icu')
+    self.assertEqual(cluster['free'], 2)
+    self.assertNotIn('popup', cluster)
+
+    # With a cookie instead.
+    with mock.patch.object(base.BaseHandler, 'get_current_user') as m:
+      m.return_value = self.user
+      response = self.fetch(route + '?level=unknown')
+      self.assertEqual(response.code, 400)
+      popup_url = home.MapPopupHandler.PREFIX + cluster['id']
+      response = self.fetch(popup_url + '?covid=0')
+      self.assertEqual(response.code, 200)
+      self.assertIn(b'infowindow-icu', response.body)
+      response = self.fetch(home.MapPopupHandler.PREFIX + 'unknown')
+      self.assertEqual(response.code, 404)
+
+  def test_map_not_modified(self):
+    url = f'{home.MapDataHandler.ROUTE}?API_KEY={self.add_map_client()}'
+    response = self.fetch(url)
+    self.assertEqual(response.code, 200)
+    etag = response.headers['Etag']
+    self.assertIn('Last-Modified', response.headers)
+
+    with mock.patch.object(map_builder.MapBuilder, 'prepare_data') as m:
+      response = self.fetch(url, headers={'If-None-Match': etag})
+      self.assertEqual(response.code, 304)
+      # Served from the cache.
+      response = self.fetch(url)
+      self.assertEqual(response.code, 200)
+      self.assertEqual(response.headers['Etag'], etag)
+      m.assert_not_called()
+
+    # New data, new version.
+    self.db.update_bed_count_for_icu(
+      self.admin_id, store.BedCount(icu_id=self.icu_id, n_covid_occ=1)
+    )
+    response = self.fetch(url, headers={'If-None-Match': etag})
+    self.assertEqual(response.code, 200)
+    self.assertNotEqual(response.headers['Etag'], etag)
+
+    since = {'If-Modified-Since': response.headers['Last-Modified']}
+    response = self.fetch(url, headers=since)
+    self.assertEqual(response.code, 304)
+
+    # An ICU is removed: the last modification date does not change.
+    get_data_version = store.Store.get_data_version
+
+    def fewer_icus(db, *args, **kwargs):
+      version = get_data_version(db, *args, **kwargs)
+      return dataclasses.replace(version, num_icus=version.num_icus - 1)
+
+    with mock.patch.object(
+      store.Store, 'get_data_version', autospec=True, side_effect=fewer_icus
+    ):
+      response = self.fetch(url, headers=since)
+    self.assertEqual(response.code, 200)
+
   def test_disclaimer_page(self):
     """Test the route is reachable."""
     response = self.fetch(disclaimer.DisclaimerHandler.ROUTE)
@@ -32,11 +32,78 @@ function toggleAll() {
   for (i = 0; i < dc.length; i++) {
     if ((!showed.has(dc[i].label) && all_showed) ||
       (!all_showed && (showed.has(dc[i].label)))) {
-      togglePopup(dc[i].label, dc[i].color)
+      showPopup(dc[i])
     }
   }
 }
 
+function popupKey(obj) {
+  return covid + '/' + obj.id
+}
+
+// Loads the detailed popup of a cluster the first time it is shown.
+function showPopup(obj) {
+  const key = popupKey(obj)
+  if (key in popups) {
+    togglePopup(obj.label, obj.color)
+    return
+  }
+  const url = popupRoute + encodeURIComponent(obj.id) + '?' + mapQuery +
+    '&covid=' + (covid ? 1 : 0)
+  fetch(url, { credentials: 'same-origin' })
+    .then(response => {
+      if (!response.ok) throw new Error(response.statusText)
+      return response.text()
+    })
+    .then(html => {
+      popups[key] = html
+      var box = document.getElementById('infowindow-' + obj.label)
+      if (box !== null) {
+        // Keeps the element the Popup was built around, and its classes.
+        var loaded = document.createElement('template')
+        loaded.innerHTML = html.trim()
+        box.innerHTML = loaded.content.firstElementChild.innerHTML
+        togglePopup(obj.label, obj.color)
+      }
+    })
+    .catch(error => console.log('Could not load popup: ' + error))
+}
+
+// The compact view of a cluster, shown until its popup is loaded.
+function clusterBox(obj) {
+  var box = document.createElement('div')
+  box.id = 'infowindow-' + obj.label
+  box.className = 'box-border'
+  box.addEventListener('click', () => showPopup(obj))
+  var table = document.createElement('table')
+  table.className = 'bed-table'
+  var row = table.insertRow()
+  row.className = 'bed-row'
+  var name = row.insertCell()
+  name.className = 'report-number modal-icu-name'
+  name.textContent = obj.label
+  var free = row.insertCell()
+  free.className = 'report-number'
+  free.style.backgroundColor = obj.color
+  free.textContent = obj.free
+  box.appendChild(table)
+  return box
+}
+
+function loadMap() {
+  fetch(dataUrl, { credentials: 'same-origin' })
+    .then(response => {
+      if (!response.ok) throw new Error(response.statusText)
+      return response.json()
+    })
+    .then(result => {
+      data = result.clusters
+      center = result.center
+      plotMap(data[covid], center, covid)
+    })
+    .catch(error => console.log('Could not load map: ' + error))
+}
+
 function CenterControl(
   controlDiv, map, displayAllText, displayAllAltText, toggleFn) {
   // Set CSS for the control border.
@@ -98,7 +165,12 @@ function addMarker(obj, map) {
 
 function addPopup(obj, map, Popup) {
   var div = document.getElementById('map')
-  div.insertAdjacentHTML('beforeend', obj.popup);
+  const key = popupKey(obj)
+  if (key in popups) {
+    div.insertAdjacentHTML('beforeend', popups[key]);
+  } else {
+    div.appendChild(clusterBox(obj))
+  }
   var content = div.lastElementChild
   popup = new Popup(new google.maps.LatLng(obj.lat, obj.long), content)
   popup.setMap(map);
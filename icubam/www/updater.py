@@ -1,4 +1,6 @@
 from absl import logging  # noqa: F401
+from typing import Dict, Iterable, Tuple
+
 from icubam import authenticator
 from icubam import time_utils
 from icubam.db import store
@@ -31,11 +33,24 @@ class Updater:
      icu_id: the icu id of the target icu.
      update: should we update the token in the db in case it is stale.
     """
-    return "{}{}?id={}".format(
-      self.config.server.base_url, self.ROUTE.strip('/'),
+    return self.make_url(
       self.authenticator.get_or_new_token(user_id, icu_id, update=update)
     )
 
+  def get_urls(
+    self,
+    user_icu_ids: Iterable[Tuple[int, int]],
+    update: bool = False
+  ) -> Dict[Tuple[int, int], str]:
+    """Same as get_url for many (user_id, icu_id) pairs at once."""
+    tokens = self.authenticator.get_or_new_tokens(user_icu_ids, update=update)
+    return {key: self.make_url(token) for key, token in tokens.items()}
+
+  def make_url(self, token: str) -> str:
+    return "{}{}?id={}".format(
+      self.config.server.base_url, self.ROUTE.strip('/'), token
+    )
+
   def get_icu_data_by_id(self, icu_id, locale=None, def_val=0):
     """Returns the dictionary of counts for the given icu."""
     bed_count = self.db.get_bed_count_for_icu(icu_id)
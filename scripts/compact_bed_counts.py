@@ -0,0 +1,57 @@
+"""Compacts the bed counts history, archiving the deleted rows.
+
+The bed counts older than `db.retention_days` days (or --days) are reduced to
+the last one of each burst of updates of an ICU, after being archived in
+`db.archive_dir` (or --archive_dir). Meant to be run periodically, e.g.:
+
+  python -m scripts.compact_bed_counts --vacuum
+"""
+import datetime
+
+from absl import app
+from absl import flags
+from absl import logging
+from sqlalchemy import create_engine
+
+from icubam import config
+from icubam.db import retention, store
+
+flags.DEFINE_string("config", config.DEFAULT_CONFIG_PATH, "Config file.")
+flags.DEFINE_string("dotenv_path", config.DEFAULT_DOTENV_PATH, "Config file.")
+flags.DEFINE_integer(
+  "days", None, "Age of the compacted bed counts, in days. "
+  "Defaults to db.retention_days in the config."
+)
+flags.DEFINE_string(
+  "archive_dir", None, "Directory of the archives of the deleted bed counts. "
+  "Defaults to db.archive_dir in the config."
+)
+flags.DEFINE_bool("vacuum", False, "Shrinks the database file afterwards.")
+FLAGS = flags.FLAGS
+
+
+def main(unused_argv):
+  cfg = config.Config(FLAGS.config, env_path=FLAGS.dotenv_path)
+  days = FLAGS.days if FLAGS.days is not None else cfg.db.retention_days
+  if not isinstance(days, int) or days <= 0:
+    logging.error("Set a positive --days or db.retention_days.")
+    return
+  archive_dir = FLAGS.archive_dir or cfg.db.archive_dir
+  if not isinstance(archive_dir, str):
+    logging.error("Set --archive_dir or db.archive_dir.")
+    return
+
+  db = store.create_store_factory_for_sqlite_db(cfg).create()
+  admins = db.get_admins()
+  if not admins:
+    logging.error("No admin in the database to compact the bed counts as.")
+    return
+  count = retention.compact_bed_counts(
+    db, admins[0].user_id, datetime.timedelta(days=days), archive_dir
+  )
+  if FLAGS.vacuum and count:
+    create_engine("sqlite:///" + cfg.db.sqlite_path).execute("VACUUM")
+
+
+if __name__ == '__main__':
+  app.run(main)
@@ -0,0 +1,30 @@
+"""Writes the precompressed variants of the static files, before deploying."""
+import os.path
+
+from absl import app
+from absl import flags
+from absl import logging
+
+from icubam import compression
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'icubam')
+flags.DEFINE_multi_string(
+  'folder', [
+    os.path.join(ROOT, 'www', 'static'),
+    os.path.join(ROOT, 'backoffice', 'static'),
+  ], 'Folders of the static files to compress.'
+)
+flags.DEFINE_integer(
+  'min_size', compression.MIN_SIZE, 'Files smaller than this are skipped.'
+)
+FLAGS = flags.FLAGS
+
+
+def main(unused_argv):
+  for folder in FLAGS.folder:
+    written = compression.precompress(folder, min_size=FLAGS.min_size)
+    logging.info(f'Wrote {written} compressed files in {folder}.')
+
+
+if __name__ == '__main__':
+  app.run(main)
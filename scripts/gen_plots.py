@@ -33,7 +33,9 @@ def main(argv):
     cfg.analytics.extra_plots_dir = FLAGS.output_dir
 
   db = store.create_store_factory_for_sqlite_db(cfg).create()
-  plot_generator = generator.PlotGenerator(cfg, db, dataset.Dataset(db))
+  plot_generator = generator.PlotGenerator(
+    cfg, db, dataset.Dataset(db, writer=db)
+  )
   eventloop = asyncio.new_event_loop()
   if FLAGS.plot_name is not None:
     plots = [FLAGS.plot_name]
@@ -1,12 +1,30 @@
-"""Populates store with fake data."""
+"""Populates store with fake data.
+
+By default, adds a few ICUs of Paris with a short history. With --national,
+generates regions, ICUs, users, tokens, external clients and months of bed
+counts, at the scale of a country, from a fixed seed:
+
+  python -m scripts.populate_db_fake --national --regions=13 --days=180
+"""
+import time
+
 from absl import app
 from absl import flags
+from absl import logging
 from icubam import config
 import icubam.db.store as db_store
-from icubam.db.fake import populate_store_fake
+from icubam.db import fake
 
 flags.DEFINE_string("config", config.DEFAULT_CONFIG_PATH, "Config file.")
 flags.DEFINE_string("dotenv_path", config.DEFAULT_DOTENV_PATH, "Config file.")
+flags.DEFINE_bool("national", False, "Generates a national-scale dataset.")
+flags.DEFINE_integer("regions", 13, "Number of regions.")
+flags.DEFINE_integer("icus_per_region", 50, "Number of ICUs per region.")
+flags.DEFINE_integer("users_per_icu", 4, "Number of users per ICU.")
+flags.DEFINE_integer("clients", 10, "Number of external clients.")
+flags.DEFINE_integer("days", 120, "Number of days of bed counts.")
+flags.DEFINE_integer("counts_per_day", 4, "Number of bed counts per day.")
+flags.DEFINE_integer("seed", 0, "Seed of the generated data.")
 FLAGS = flags.FLAGS
 
 
@@ -15,7 +33,26 @@ def main(unused_argv):
   store_factory = db_store.create_store_factory_for_sqlite_db(cfg)
   store = store_factory.create()
 
-  populate_store_fake(store)
+  if not FLAGS.national:
+    return fake.populate_store_fake(store)
+
+  start = time.perf_counter()
+  data = fake.populate_store_national(
+    store,
+    num_regions=FLAGS.regions,
+    icus_per_region=FLAGS.icus_per_region,
+    users_per_icu=FLAGS.users_per_icu,
+    num_clients=FLAGS.clients,
+    days=FLAGS.days,
+    counts_per_day=FLAGS.counts_per_day,
+    seed=FLAGS.seed
+  )
+  logging.info(
+    f"Generated {data.num_bed_counts} bed counts in "
+    f"{time.perf_counter() - start:.1f}s."
+  )
+  for name, key in data.access_keys.items():
+    print(f"{name}: {key}")
 
 
 if __name__ == '__main__':
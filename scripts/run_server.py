@@ -13,12 +13,16 @@ flags.DEFINE_string(
   'Optionally specifies the .env path.'
 )
 flags.DEFINE_string('server', 'www', 'File for the db.')
+flags.DEFINE_integer(
+  'workers', None, 'Number of processes of the www server, '
+  'defaults to server.workers in the config.'
+)
 FLAGS = flags.FLAGS
 
 
 def main(argv):
   cfg = config.Config(FLAGS.config, env_path=FLAGS.dotenv_path)
-  run_server(cfg, server=FLAGS.server, port=FLAGS.port)
+  run_server(cfg, server=FLAGS.server, port=FLAGS.port, workers=FLAGS.workers)
 
 
 if __name__ == '__main__':